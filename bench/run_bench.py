@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+run_bench.py
+- 합성 코퍼스(bench/corpus.py)로 scan_file / scan_hwp / scan_docx / sanitize(run_job) 처리량과 최대 RSS 측정
+- 항목마다 별도 프로세스에서 실행 (최대 RSS 가 앞 항목 영향을 받지 않게)
+- 기준선 저장/비교: 처리량이 tolerance 이상 떨어지거나 RSS 가 그만큼 늘면 REGRESSION, 종료 코드 1
+- 사용법:
+    python bench/run_bench.py [--profile default] [--repeat 3] [--save bench/baseline.json]
+    python bench/run_bench.py --baseline bench/baseline.json [--tolerance 0.15]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import corpus  # noqa: E402
+
+BENCHES = ("scan_file", "scan_hwp", "scan_docx", "sanitize")
+# 비교 대상 지표: (키, 클수록 좋은가)
+METRICS = (("files_per_s", True), ("mb_per_s", True), ("peak_rss_mb", False))
+
+
+def _peak_rss_mb() -> Optional[float]:
+    # 리눅스 ru_maxrss 는 fork/exec 전 부모의 최대값을 물려받으므로 VmHWM(이 프로세스 이미지 기준)을 우선
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # 리눅스는 KiB, 맥은 바이트
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+# --- 자식 프로세스: 항목 하나 실행 ---
+def _child(bench: str, corpus_dir: Path, repeat: int) -> Dict:
+    os.environ.setdefault("DETECT_LOG", "0")
+    os.environ["DETECT_CACHE"] = "0"   # 결과 캐시가 측정을 가리지 않게
+    sys.path.insert(0, str(ROOT / "detect_core"))
+    sys.path.insert(0, str(ROOT / "llm_cleaner"))
+    import logging
+    logging.disable(logging.WARNING)
+
+    man = json.loads((corpus_dir / corpus.MANIFEST).read_text(encoding="utf-8"))["files"]
+    kinds = {"scan_hwp": ("hwp",), "scan_docx": ("docx",)}.get(bench, ("hwp", "docx"))
+    files = [f for f in man if f["kind"] in kinds]
+    paths = [corpus_dir / f["name"] for f in files]
+
+    mismatches: List[str] = []
+    if bench == "scan_file":
+        import file_scanner
+        import rules
+
+        def run_one(f, p):
+            res = file_scanner.scan_file(p.read_bytes(), f["name"], use_cache=False)
+            got = sorted(rules.key_from_label(d["type"]) or "?" for d in res["detections"])
+            if got != sorted(f["expect"]):
+                mismatches.append(f"{f['name']}: expect={f['expect']} got={got}")
+    elif bench == "scan_hwp":
+        import hwp_detect
+
+        def run_one(f, p):
+            hwp_detect.scan_hwp(str(p))
+    elif bench == "scan_docx":
+        import doc_detect
+
+        def run_one(f, p):
+            doc_detect.scan_docx(str(p))
+    else:
+        import file_scanner
+        import ai_cleaner
+        # 탐지 결과 → run_job (앱과 같은 경로: 컨테이너 적중은 스트림/파트 단위로 다시 쓴다).
+        # 탐지는 측정에서 뺀다
+        work = Path(tempfile.mkdtemp(prefix="bench_sanitize_"))
+        detections = {}
+        for f, p in zip(files, paths):
+            detections[f["name"]] = file_scanner.scan_file(p.read_bytes(), f["name"], use_cache=False)["detections"]
+
+        def run_one(f, p):
+            # 마스크 치환(LLM 미사용): 파일 읽기/패치/쓰기 처리량만 본다
+            res = ai_cleaner.run_job({"in": str(p), "out": str(work / f["name"]), "detections": detections[f["name"]],
+                                      "mask": "***", "no_ai": True})
+            # 적중이 있는데 하나도 고치지 않았으면 복사만 잰 것 → 결과 불일치로 보고
+            if bool(res["patched"]) != bool(f["expect"]):
+                mismatches.append(f"{f['name']}: expect={f['expect']} patched={res['patched']}")
+
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for f, p in zip(files, paths):
+            run_one(f, p)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    total = sum(f["bytes"] for f in files)
+    rss = _peak_rss_mb()
+    return {
+        "files": len(files),
+        "bytes": total,
+        "seconds": round(best, 4),
+        "files_per_s": round(len(files) / best, 2) if best else None,
+        "mb_per_s": round(total / (1 << 20) / best, 2) if best else None,
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "mismatches": sorted(set(mismatches)),
+    }
+
+
+def _run_child(bench: str, corpus_dir: Path, repeat: int) -> Dict:
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", bench,
+           "--corpus", str(corpus_dir), "--repeat", str(repeat)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr or "").strip()[-800:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# --- 기준선 비교 ---
+def compare(cur: Dict, base: Dict, tolerance: float) -> List[str]:
+    """REGRESSION 항목 목록 (비교 표는 출력)"""
+    bad = []
+    print(f"\n{'bench':<14} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for bench, res in cur["results"].items():
+        old = base.get("results", {}).get(bench)
+        if not old or "error" in res or "error" in old:
+            continue
+        for key, higher_better in METRICS:
+            a, b = old.get(key), res.get(key)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_better else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                bad.append(f"{bench}.{key}")
+            print(f"{bench:<14} {key:<12} {a:>10} {b:>10} {change * 100:>+7.1f}%{flag}")
+    if base.get("env") != cur.get("env"):
+        print("note: baseline was recorded on a different environment:", base.get("env"))
+    return bad
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profile", default="default", choices=corpus.PROFILES)
+    ap.add_argument("--corpus", default=None, help="코퍼스 디렉터리 (기본: 임시 디렉터리에 생성/재사용)")
+    ap.add_argument("--repeat", type=int, default=3, help="반복 횟수 (가장 빠른 회차 사용)")
+    ap.add_argument("--only", default=None, help="쉼표 구분 항목 (" + ",".join(BENCHES) + ")")
+    ap.add_argument("--save", default=None, help="결과를 기준선 JSON 으로 저장")
+    ap.add_argument("--baseline", default=None, help="비교할 기준선 JSON")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="허용 악화 비율 (기본 15%%)")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    corpus_dir = Path(args.corpus or Path(tempfile.gettempdir()) / f"texnel_bench_{args.profile}")
+    if args.child:
+        print(json.dumps(_child(args.child, corpus_dir, args.repeat)))
+        sys.exit(0)
+
+    files = corpus.generate(corpus_dir, args.profile)
+    print(f"corpus {corpus_dir} profile={args.profile} files={len(files)} "
+          f"size={sum(f['bytes'] for f in files) / (1 << 20):.1f} MiB")
+
+    benches = args.only.split(",") if args.only else list(BENCHES)
+    results = {}
+    failed = False
+    for bench in benches:
+        res = _run_child(bench, corpus_dir, args.repeat)
+        results[bench] = res
+        if "error" in res:
+            failed = True
+            print(f"{bench:<14} ERROR {res['error']}")
+            continue
+        print(f"{bench:<14} files={res['files']:<3} {res['files_per_s']:>8} files/s "
+              f"{res['mb_per_s']:>8} MB/s  peak_rss={res['peak_rss_mb']} MB")
+        for m in res["mismatches"]:
+            failed = True
+            print(f"  MISMATCH {m}")
+
+    current = {
+        "profile": args.profile,
+        "env": {"python": platform.python_version(), "machine": platform.machine(),
+                "system": platform.system(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.save:
+        Path(args.save).write_text(json.dumps(current, indent=2), encoding="utf-8")
+        print(f"saved {args.save}")
+    if args.baseline:
+        base = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if base.get("profile") != args.profile:
+            print(f"note: baseline profile={base.get('profile')} current={args.profile}")
+        bad = compare(current, base, args.tolerance)
+        if bad:
+            print("REGRESSION:", ", ".join(bad))
+            failed = True
+    sys.exit(1 if failed else 0)
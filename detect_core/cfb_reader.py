@@ -0,0 +1,275 @@
+# cfb_reader.py
+"""
+OLE/CFB(Compound File Binary) 스트리밍 리더
+- 헤더/FAT/디렉터리만 메모리에 올리고, 스트림 내용은 섹터 단위로 순차 읽기
+- HWP 5.x 컨테이너(BinData/BodyText 등) 분석용, 쓰기 미지원
+"""
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+CFB_SIGNATURE = b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1"
+
+MAXREGSECT = 0xFFFFFFFA
+ENDOFCHAIN = 0xFFFFFFFE
+FREESECT = 0xFFFFFFFF
+NOSTREAM = 0xFFFFFFFF
+
+TYPE_STORAGE = 1
+TYPE_STREAM = 2
+TYPE_ROOT = 5
+
+_HEADER_SIZE = 512
+_DIR_ENTRY_SIZE = 128
+
+
+class CfbError(ValueError):
+    """CFB 구조가 깨졌거나 CFB 파일이 아님"""
+
+
+@dataclass
+class CfbEntry:
+    sid: int      # 디렉터리 엔트리 번호
+    name: str
+    path: str     # "BinData/BIN0001.OLE" 처럼 스토리지 경로 포함
+    type: int
+    start: int    # 시작 섹터 (미니 스트림이면 미니 섹터)
+    size: int
+
+    @property
+    def is_stream(self) -> bool:
+        return self.type == TYPE_STREAM
+
+
+def is_cfb(head: bytes) -> bool:
+    return head[:8] == CFB_SIGNATURE
+
+
+def _u32_array(raw: bytes) -> array:
+    arr = array("I")
+    arr.frombytes(raw[: len(raw) - len(raw) % 4])
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+class CfbReader:
+    """
+    seek 가능한 바이너리 파일 객체 위에서 동작하는 읽기 전용 CFB 파서.
+    메모리 사용: FAT(섹터 수 * 4바이트) + 디렉터리 + MiniFAT. 스트림 본문은 chunk 단위로만 읽는다.
+    """
+
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+        fp.seek(0)
+        hdr = fp.read(_HEADER_SIZE)
+        if len(hdr) < _HEADER_SIZE or not is_cfb(hdr):
+            raise CfbError("not a compound file")
+
+        _minor, major, _bom, sector_shift, mini_shift = struct.unpack_from("<HHHHH", hdr, 24)
+        (_n_dir, n_fat, first_dir, _txn, cutoff,
+         first_minifat, n_minifat, first_difat, n_difat) = struct.unpack_from("<9I", hdr, 40)
+        if sector_shift not in (9, 12) or mini_shift != 6:
+            raise CfbError(f"unsupported sector shift {sector_shift}/{mini_shift}")
+
+        self.major = major
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_shift
+        self.mini_cutoff = cutoff
+        fp.seek(0, 2)
+        self.file_size = fp.tell()
+
+        self.fat = self._load_fat(hdr, n_fat, first_difat, n_difat)
+        self.entries = self._load_directory(first_dir)
+        root = self.entries[0] if self.entries else None
+        if root is None or root.type != TYPE_ROOT:
+            raise CfbError("missing root entry")
+        self.root = root
+        self.minifat = self._load_stream_u32(first_minifat, n_minifat) if n_minifat else array("I")
+        self._ministream_sectors: List[int] = []
+
+    # ---- 저수준 섹터 I/O ----
+    def sector_offset(self, sid: int) -> int:
+        return (sid + 1) * self.sector_size
+
+    def _read_sector(self, sid: int) -> bytes:
+        self.fp.seek(self.sector_offset(sid))
+        data = self.fp.read(self.sector_size)
+        if len(data) < self.sector_size:
+            data += b"\x00" * (self.sector_size - len(data))  # 잘린 파일 허용
+        return data
+
+    def chain(self, start: int, fat: array = None) -> Iterator[int]:
+        """FAT 체인 순회 (순환/범위 초과 방어)"""
+        fat = self.fat if fat is None else fat
+        sid = start
+        seen = 0
+        limit = len(fat)
+        while sid <= MAXREGSECT:
+            if sid >= limit or seen > limit:
+                raise CfbError(f"broken sector chain at {sid}")
+            yield sid
+            seen += 1
+            sid = fat[sid]
+
+    def _load_fat(self, hdr: bytes, n_fat: int, first_difat: int, n_difat: int) -> array:
+        difat = list(_u32_array(hdr[76:_HEADER_SIZE]))
+        sid = first_difat
+        per = self.sector_size // 4 - 1
+        for _ in range(n_difat):
+            if sid > MAXREGSECT:
+                break
+            raw = _u32_array(self._read_sector(sid))
+            difat.extend(raw[:per])
+            sid = raw[per]
+        fat = array("I")
+        for fsid in difat[:n_fat]:
+            if fsid > MAXREGSECT:
+                continue
+            fat.extend(_u32_array(self._read_sector(fsid)))
+        return fat
+
+    def _load_stream_u32(self, start: int, n_sectors: int) -> array:
+        out = array("I")
+        for i, sid in enumerate(self.chain(start)):
+            if i >= n_sectors:
+                break
+            out.extend(_u32_array(self._read_sector(sid)))
+        return out
+
+    def _load_directory(self, first_dir: int) -> List[CfbEntry]:
+        raw_entries = []
+        for sid in self.chain(first_dir):
+            sec = self._read_sector(sid)
+            for i in range(0, self.sector_size, _DIR_ENTRY_SIZE):
+                raw_entries.append(sec[i:i + _DIR_ENTRY_SIZE])
+
+        parsed: Dict[int, tuple] = {}
+        for idx, e in enumerate(raw_entries):
+            name_len, etype = struct.unpack_from("<HB", e, 64)
+            if etype not in (TYPE_STORAGE, TYPE_STREAM, TYPE_ROOT):
+                continue
+            left, right, child = struct.unpack_from("<III", e, 68)
+            start, size = struct.unpack_from("<IQ", e, 116)
+            if self.major == 3:
+                size &= 0xFFFFFFFF
+            name = e[:max(0, min(name_len, 64) - 2)].decode("utf-16-le", "replace")
+            parsed[idx] = (name, etype, left, right, child, start, size)
+
+        # 레드-블랙 트리(형제: left/right, 자식: child) 순회로 경로 구성
+        entries: List[CfbEntry] = []
+        if 0 not in parsed:
+            return entries
+        name, etype, _l, _r, child, start, size = parsed[0]
+        entries.append(CfbEntry(0, name, "", etype, start, size))
+        stack = [(child, "")]
+        visited = {0}
+        while stack:
+            idx, prefix = stack.pop()
+            if idx == NOSTREAM or idx in visited or idx not in parsed:
+                continue
+            visited.add(idx)
+            name, etype, left, right, child, start, size = parsed[idx]
+            path = f"{prefix}{name}"
+            entries.append(CfbEntry(idx, name, path, etype, start, size))
+            stack.append((left, prefix))
+            stack.append((right, prefix))
+            if etype == TYPE_STORAGE:
+                stack.append((child, path + "/"))
+        return entries
+
+    # ---- 공개 API ----
+    def streams(self) -> List[CfbEntry]:
+        """모든 스트림 엔트리 (경로순)"""
+        return sorted((e for e in self.entries if e.is_stream), key=lambda e: e.path)
+
+    def find(self, path: str) -> CfbEntry:
+        for e in self.entries:
+            if e.path == path and e.is_stream:
+                return e
+        raise KeyError(path)
+
+    def is_mini(self, entry: CfbEntry) -> bool:
+        return entry.type != TYPE_ROOT and entry.size < self.mini_cutoff
+
+    def iter_stream(self, entry: CfbEntry, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        """
+        스트림 본문을 chunk 단위로 순차 반환.
+        연속 섹터는 한 번의 read 로 묶어 읽는다.
+        """
+        remaining = entry.size
+        if remaining <= 0:
+            return
+        if self.is_mini(entry):
+            yield self._read_mini(entry)
+            return
+
+        ssz = self.sector_size
+        max_run = max(1, chunk_size // ssz)
+        run_start = None
+        run_len = 0
+        for sid in self.chain(entry.start):
+            if run_start is not None and sid == run_start + run_len and run_len < max_run:
+                run_len += 1
+                continue
+            if run_start is not None:
+                data = self._read_run(run_start, run_len, remaining)
+                remaining -= len(data)
+                yield data
+                if remaining <= 0:
+                    return
+            run_start, run_len = sid, 1
+        if run_start is not None and remaining > 0:
+            yield self._read_run(run_start, run_len, remaining)
+
+    def stream_runs(self, entry: CfbEntry) -> List[Tuple[int, int]]:
+        """
+        일반(비-미니) 스트림이 차지하는 파일 구간 [(파일 오프셋, 길이), ...] (연속 섹터는 하나로 합침).
+        미니 스트림, 빈 스트림, 파일 끝을 넘는 구간이 있으면 [] (호출자는 iter_stream 사용).
+        """
+        if entry.size <= 0 or self.is_mini(entry):
+            return []
+        ssz = self.sector_size
+        runs: List[Tuple[int, int]] = []
+        remaining = entry.size
+        for sid in self.chain(entry.start):
+            take = min(ssz, remaining)
+            off = self.sector_offset(sid)
+            if runs and runs[-1][0] + runs[-1][1] == off:
+                runs[-1] = (runs[-1][0], runs[-1][1] + take)
+            else:
+                runs.append((off, take))
+            remaining -= take
+            if remaining <= 0:
+                break
+        if remaining > 0 or runs[-1][0] + runs[-1][1] > self.file_size:
+            return []
+        return runs
+
+    def read_stream(self, path: str) -> bytes:
+        """작은 스트림(FileHeader 등) 전체 읽기"""
+        return b"".join(self.iter_stream(self.find(path)))
+
+    def _read_run(self, sid: int, count: int, remaining: int) -> bytes:
+        n = min(count * self.sector_size, remaining)
+        self.fp.seek(self.sector_offset(sid))
+        return self.fp.read(n)
+
+    def _read_mini(self, entry: CfbEntry) -> bytes:
+        if not self._ministream_sectors:
+            self._ministream_sectors = list(self.chain(self.root.start))
+        ssz = self.sector_size
+        mss = self.mini_sector_size
+        out = bytearray()
+        for msid in self.chain(entry.start, self.minifat):
+            pos = msid * mss
+            idx, within = divmod(pos, ssz)
+            if idx >= len(self._ministream_sectors):
+                raise CfbError(f"mini sector {msid} outside mini stream")
+            self.fp.seek(self.sector_offset(self._ministream_sectors[idx]) + within)
+            out += self.fp.read(mss)
+            if len(out) >= entry.size:
+                break
+        return bytes(out[:entry.size])
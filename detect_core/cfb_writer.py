@@ -0,0 +1,244 @@
+# cfb_writer.py
+"""
+OLE/CFB(Compound File Binary) 스트리밍 라이터 (cfb_reader 의 짝)
+- v3, 512B 섹터, 4096 미만 스트림은 미니 스트림, FAT 가 109 섹터를 넘으면 DIFAT 섹터 사용
+- 레이아웃(FAT/디렉터리)은 스트림 크기만으로 먼저 정하고, 본문은 스트림마다 chunk 로 받아 바로 기록
+  → 큰 스트림(BinData 등)을 메모리에 올리지 않는다. 미니 스트림(4 KiB 미만 합)만 메모리에 모음
+- 섹터 배치: 헤더 | FAT | DIFAT | 디렉터리 | MiniFAT | 미니 스트림 | 일반 스트림(입력 순서)
+"""
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from cfb_reader import (CFB_SIGNATURE, ENDOFCHAIN, FREESECT, NOSTREAM, TYPE_ROOT, TYPE_STORAGE,
+                        TYPE_STREAM, CfbError)
+
+FATSECT = 0xFFFFFFFD
+DIFSECT = 0xFFFFFFFC
+
+_SSZ = 512
+_MSS = 64
+_CUTOFF = 4096
+_PER_FAT = _SSZ // 4          # FAT 섹터 하나가 가리키는 섹터 수
+_PER_DIFAT = _PER_FAT - 1     # DIFAT 섹터 하나에 담기는 FAT 섹터 번호 수 (마지막 칸은 다음 DIFAT)
+_RED, _BLACK = 0, 1   # 디렉터리 엔트리 색 (레드-블랙 트리)
+
+
+class StreamSource(NamedTuple):
+    path: str                                # "BinData/BIN0001.OLE"
+    size: int                                # 기록할 바이트 수 (chunks 합과 같아야 함)
+    chunks: Callable[[], Iterable[bytes]]    # 기록 시점에 한 번 호출
+
+
+def _nsec(n: int, size: int = _SSZ) -> int:
+    return (n + size - 1) // size
+
+
+def _cfb_key(name: str):
+    # CFB 디렉터리 트리 정렬 규칙: 길이 먼저, 그다음 대문자 비교
+    return len(name), name.upper()
+
+
+def _u32_bytes(arr: array) -> bytes:
+    if sys.byteorder != "little":
+        arr = array("I", arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+class _Node:
+    __slots__ = ("name", "type", "children", "src", "start", "size", "left", "right", "child", "color")
+
+    def __init__(self, name: str, etype: int, src: Optional[StreamSource] = None):
+        self.name = name
+        self.type = etype
+        self.children: List[int] = []
+        self.src = src
+        self.start = ENDOFCHAIN
+        self.size = src.size if src is not None else 0
+        self.left = self.right = self.child = NOSTREAM
+        self.color = _BLACK
+
+
+def _read_exact(src: StreamSource) -> Iterable[bytes]:
+    """chunks 를 그대로 넘기되 합계가 선언한 size 와 다르면 CfbError"""
+    left = src.size
+    for chunk in src.chunks():
+        if not chunk:
+            continue
+        if len(chunk) > left:
+            raise CfbError(f"stream {src.path} longer than declared size {src.size}")
+        left -= len(chunk)
+        yield chunk
+    if left:
+        raise CfbError(f"stream {src.path} shorter than declared size {src.size}")
+
+
+def write_cfb(out: BinaryIO, streams: Iterable[StreamSource], storages: Iterable[str] = ()) -> int:
+    """
+    streams 를 CFB 로 out 에 순차 기록하고 기록한 바이트 수를 돌려준다.
+    storages 는 스트림이 없어도 남길 스토리지 경로 (원본의 빈 스토리지 보존용).
+    """
+    nodes = [_Node("Root Entry", TYPE_ROOT)]
+    index: Dict[str, int] = {"": 0}
+
+    def storage(path: str) -> int:
+        if path in index:
+            return index[path]
+        parent, _, name = path.rpartition("/")
+        pid = storage(parent)
+        nodes.append(_Node(name, TYPE_STORAGE))
+        index[path] = len(nodes) - 1
+        nodes[pid].children.append(index[path])
+        return index[path]
+
+    for path in storages:
+        if path:
+            storage(path)
+    for src in streams:
+        parent, _, name = src.path.rpartition("/")
+        if not name or src.path in index:
+            raise CfbError(f"bad or duplicate stream path {src.path!r}")
+        pid = storage(parent)
+        nodes.append(_Node(name, TYPE_STREAM, src))
+        index[src.path] = len(nodes) - 1
+        nodes[pid].children.append(index[src.path])
+
+    # 미니 스트림(작은 스트림 본문은 여기서 읽어 둔다) / 일반 스트림 분리
+    mini = bytearray()
+    minifat = array("I")
+    big: List[_Node] = []
+    for n in nodes:
+        if n.src is None:
+            continue
+        if n.size >= _CUTOFF:
+            big.append(n)
+            continue
+        cnt = _nsec(n.size, _MSS)
+        if not cnt:
+            continue
+        n.start = len(mini) // _MSS
+        minifat.extend(n.start + k + 1 for k in range(cnt - 1))
+        minifat.append(ENDOFCHAIN)
+        mini += b"".join(_read_exact(n.src))
+        mini += b"\0" * (cnt * _MSS - n.size)
+
+    n_dir = _nsec(len(nodes) * 128)
+    n_minifat = _nsec(len(minifat) * 4)
+    n_mini = _nsec(len(mini))
+    n_big = sum(_nsec(n.size) for n in big)
+    rest = n_dir + n_minifat + n_mini + n_big
+    n_fat = 1
+    while True:
+        n_difat = _nsec(n_fat - 109, _PER_DIFAT) if n_fat > 109 else 0
+        if n_fat * _PER_FAT >= n_fat + n_difat + rest:
+            break
+        n_fat += 1
+
+    fat = array("I", [FREESECT]) * (n_fat * _PER_FAT)
+    fat_sids = list(range(n_fat))
+    difat_sids = list(range(n_fat, n_fat + n_difat))
+    for s in fat_sids:
+        fat[s] = FATSECT
+    for s in difat_sids:
+        fat[s] = DIFSECT
+    cur = n_fat + n_difat
+
+    def alloc(count: int) -> int:
+        nonlocal cur
+        if count == 0:
+            return ENDOFCHAIN
+        start = cur
+        for k in range(count - 1):
+            fat[cur + k] = cur + k + 1
+        fat[cur + count - 1] = ENDOFCHAIN
+        cur += count
+        return start
+
+    dir_start = alloc(n_dir)
+    minifat_start = alloc(n_minifat)
+    nodes[0].start = alloc(n_mini)
+    nodes[0].size = len(mini)
+    for n in big:
+        n.start = alloc(_nsec(n.size))
+
+    # 형제들은 이름순 균형 이진 트리. 가장 깊은 층만 빨강으로 칠하면 모든 경로의 검정 수가 같다(레드-블랙 조건)
+    def build(ids: List[int], depth: int, leaves: List) -> int:
+        if not ids:
+            return NOSTREAM
+        mid = len(ids) // 2
+        n = nodes[ids[mid]]
+        n.left = build(ids[:mid], depth + 1, leaves)
+        n.right = build(ids[mid + 1:], depth + 1, leaves)
+        leaves.append((depth, n))
+        return ids[mid]
+
+    for n in nodes:
+        ordered = sorted(n.children, key=lambda i: _cfb_key(nodes[i].name))
+        placed: List = []
+        n.child = build(ordered, 0, placed)
+        if placed:
+            deepest = max(d for d, _ in placed)
+            full = (1 << (deepest + 1)) - 1 == len(placed)
+            for d, m in placed:
+                if d == deepest and not full:
+                    m.color = _RED
+
+    # ---- 기록 ----
+    hdr = bytearray(_SSZ)
+    hdr[0:8] = CFB_SIGNATURE
+    struct.pack_into("<HHHHH", hdr, 24, 0x3E, 3, 0xFFFE, 9, 6)
+    struct.pack_into("<9I", hdr, 40, 0, n_fat, dir_start, 0, _CUTOFF,
+                     minifat_start, n_minifat,
+                     difat_sids[0] if difat_sids else ENDOFCHAIN, n_difat)
+    head_difat = fat_sids[:109] + [FREESECT] * (109 - min(109, n_fat))
+    struct.pack_into("<109I", hdr, 76, *head_difat)
+    written = 0
+
+    def put(data: bytes) -> None:
+        nonlocal written
+        out.write(data)
+        written += len(data)
+
+    def pad(n: int, fill: bytes = b"\0") -> None:
+        rem = n % _SSZ
+        if rem:
+            put(fill * (_SSZ - rem))
+
+    put(bytes(hdr))
+    put(_u32_bytes(fat))
+    rest_fat = fat_sids[109:]
+    for i in range(n_difat):
+        part = array("I", rest_fat[i * _PER_DIFAT:(i + 1) * _PER_DIFAT])
+        part.extend([FREESECT] * (_PER_DIFAT - len(part)))
+        part.append(difat_sids[i + 1] if i + 1 < n_difat else ENDOFCHAIN)
+        put(_u32_bytes(part))
+
+    d = bytearray()
+    for n in nodes:
+        name = n.name.encode("utf-16-le") + b"\0\0"
+        if len(name) > 64:
+            raise CfbError(f"entry name too long: {n.name!r}")
+        e = bytearray(128)
+        e[0:len(name)] = name
+        struct.pack_into("<HBB", e, 64, len(name), n.type, n.color)
+        struct.pack_into("<III", e, 68, n.left, n.right, n.child)
+        if n.type == TYPE_STORAGE:
+            start = 0
+        else:
+            start = n.start if n.size or n.type == TYPE_ROOT else ENDOFCHAIN
+        struct.pack_into("<IQ", e, 116, start, n.size)
+        d += e
+    put(bytes(d))
+    pad(len(d))
+    mf = _u32_bytes(minifat)
+    put(mf)
+    pad(len(mf), b"\xff")
+    put(bytes(mini))
+    pad(len(mini))
+    for n in big:
+        for chunk in _read_exact(n.src):
+            put(chunk)
+        pad(n.size)
+    return written
@@ -0,0 +1,87 @@
+# detection.py
+"""
+탐지 결과 레코드 (디텍터 → file_scanner → 클린업 공용)
+- Detection: 규칙 키 + 라벨/keyword/intent + 적중 위치 전부(Hit 목록)
+- Hit      : 위치 하나. offset/length 는 stream(HWP CFB 스트림, 압축이면 푼 뒤 기준) 또는 원시 파일 기준,
+             DOCX 는 part(zip 멤버) + match(찾은 문자열)로 위치를 나타낸다 (offset 없음)
+- match    : 적중한 바이트. 바이너리는 latin1 로 옮긴 문자열(바이트 1:1), UTF-16 텍스트 스트림은 디코드한 문자열
+- JSON 으로는 to_dict() 형태가 오간다. 예전 소비자(UI/클린업)가 쓰던 attack/keyword/intent 와
+  첫 적중의 offset/stream/length 는 그대로 두고 rule/hits/truncated 를 더한다
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# 규칙 하나가 보고하는 적중 수 상한 (넘으면 truncated=True, 나머지는 클린업이 스트림에서 같은 토큰을 찾아 보완)
+MAX_HITS = max(1, int(os.getenv("DETECT_MAX_HITS", "256") or 256))
+
+
+@dataclass
+class Hit:
+    offset: Optional[int]            # stream(없으면 원시 파일) 기준 바이트 오프셋, DOCX 는 None
+    length: int                      # 치환/삭제할 바이트 수 (PE 는 이미지 디스크상 크기)
+    stream: Optional[str] = None     # HWP CFB 스트림 경로
+    part: Optional[str] = None       # DOCX zip 멤버 이름
+    match: Optional[str] = None      # 적중 바이트 (위 설명)
+    meta: Dict[str, Any] = field(default_factory=dict)   # 규칙별 부가 정보 (PE machine 등)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        if self.offset is not None:
+            out["offset"] = self.offset
+        out["length"] = self.length
+        if self.stream:
+            out["stream"] = self.stream
+        if self.part:
+            out["part"] = self.part
+        if self.match is not None:
+            out["match"] = self.match
+        out.update(self.meta)
+        return out
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Hit":
+        meta = {k: v for k, v in d.items() if k not in ("offset", "length", "stream", "part", "match")}
+        off = d.get("offset")
+        match = d.get("match")
+        length = d.get("length")
+        if not isinstance(length, int):
+            length = len(match) if isinstance(match, str) else 0
+        return cls(off if isinstance(off, int) else None, length, d.get("stream"), d.get("part"), match, meta)
+
+
+@dataclass
+class Detection:
+    rule: str                        # 규칙 키 (rules.ATTACK_LABELS_* 의 키)
+    attack: str                      # 표시 라벨
+    keyword: str                     # 표시용 토큰 ("MZ at BinData/X@12 (hits=2)" 등)
+    intent: str
+    hits: List[Hit] = field(default_factory=list)
+    truncated: bool = False          # MAX_HITS 에 도달 (더 있을 수 있음)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"attack": self.attack, "keyword": self.keyword, "intent": self.intent,
+                               "rule": self.rule}
+        if self.hits:
+            first = self.hits[0]
+            for k in ("stream", "offset", "length"):
+                v = getattr(first, k)
+                if v is not None:
+                    out[k] = v
+        out["hits"] = [h.to_dict() for h in self.hits]
+        if self.truncated:
+            out["truncated"] = True
+        return out
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], rule: Optional[str] = None) -> "Detection":
+        """JSON(to_dict 또는 file_scanner 정규화 결과) → Detection. hits 가 없는 예전 결과면 빈 hits"""
+        hits = [Hit.from_dict(h) for h in d.get("hits") or [] if isinstance(h, dict)]
+        return cls(
+            d.get("rule") or rule or "",
+            d.get("attack") or d.get("type") or "",
+            str(d.get("keyword") or ""),
+            d.get("intent") or d.get("summary") or "",
+            hits,
+            bool(d.get("truncated")),
+        )
@@ -1,3 +1,5 @@
+import io
+import itertools
 import os
 import zipfile
 import xml.etree.ElementTree as ET
@@ -5,10 +7,16 @@ import re
 import json
 import sys
 import logging
+import time
 import traceback
-from typing import Optional
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
 from pathlib import Path
 
+import metrics
+import rules
+from detection import MAX_HITS, Detection, Hit
+
 _logger = logging.getLogger("doc_detect")
 if not _logger.handlers:
     log_level = logging.DEBUG if os.getenv("DETECT_LOG", "1") != "0" else logging.INFO
@@ -22,34 +30,12 @@ def _log_start():
     except Exception:
         _logger.debug("pre-log failed", exc_info=True)
 
-# 추가: DOCX 전용 공격 라벨(영/한)
-ATTACK_LABELS_EN = {
-    "VBA": "DOCX: Macro (VBA)",
-    "TEMPLATE": "DOCX: External Template",
-    "DDE": "DOCX: Dynamic Data Exchange",
-    "CMD": "DOCX: Suspicious Command",
-}
-ATTACK_LABELS_KO = {
-    "VBA": "DOCX: 매크로(VBA)",
-    "TEMPLATE": "DOCX: 외부 템플릿",
-    "DDE": "DOCX: DDE 포함",
-    "CMD": "DOCX: 의심 명령 호출",
-}
-
-def _label(key: str) -> str:
-    eng = ATTACK_LABELS_EN.get(key, key)
-    kor = ATTACK_LABELS_KO.get(key, key)
-    return f"{eng} / {kor}"
-
-def _attack_key_from_label(attack: str) -> Optional[str]:
-    """attack 라벨(영/한 혼합 문자열)에서 키(VBA/TEMPLATE/DDE/CMD) 역추출"""
-    for k, en in ATTACK_LABELS_EN.items():
-        if attack.startswith(en):
-            return k
-    for k, ko in ATTACK_LABELS_KO.items():
-        if ko in attack:
-            return k
-    return None
+# 규칙 집합 버전: 규칙이나 결과 형식이 바뀌면 올린다 (scan_cache 키에 포함 → 예전 캐시 자동 무효화)
+RULESET_VERSION = "2026.10.4"
+
+# 공격 라벨(영/한)은 rules 레지스트리 한 곳에서 관리
+_label = rules.label
+_attack_key_from_label = rules.key_from_label
 
 def _summarize_intent(attack: str, snippet: str) -> str:
     # try:
@@ -80,151 +66,502 @@ def _summarize_intent(attack: str, snippet: str) -> str:
 
 
 
-def _read_xml(z: zipfile.ZipFile, path: str) -> ET.Element:
-    with z.open(path) as f:
-        return ET.fromstring(f.read())
+def _open_zip(src) -> zipfile.ZipFile:
+    """경로 / 메모리 바이트(bytes·bytearray·memoryview) / 파일 객체(read+seek) 모두 ZipFile로 연다"""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return zipfile.ZipFile(io.BytesIO(src))
+    return zipfile.ZipFile(src)  # 경로와 파일 객체는 zipfile 이 그대로 처리
 
-# ---- 1) VBA: vbaProject.bin 존재하면 바로 악성 ----
-def doc_vba(file_path: str):
+def _src_name(src) -> str:
+    """로그용 입력 표시 (바이트 입력이면 크기만)"""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(src)}>"
+    if hasattr(src, "read"):
+        return f"<stream:{getattr(src, 'name', type(src).__name__)}>"
+    return str(src)
+
+# 본문 텍스트/필드가 들어가는 XML 파트 (DDE/CMD 검사 대상)
+_TEXT_PARTS = [
+    "word/document.xml","word/comments.xml","word/footnotes.xml","word/endnotes.xml",
+    "word/header1.xml","word/header2.xml","word/header3.xml",
+    "word/footer1.xml","word/footer2.xml","word/footer3.xml",
+]
+
+# 이 크기(압축 해제 기준) 이상인 파트는 ElementTree 를 만들지 않고 스트리밍으로 검사
+STREAM_THRESHOLD = int(os.getenv("DOCX_STREAM_THRESHOLD", str(16 * 1024 * 1024)))
+_STREAM_READ = 1 << 16   # zip 멤버에서 한 번에 읽어 파서에 넣는 크기
+_STREAM_TAIL = 256       # 노드 경계에 걸친 토큰 매칭용으로 유지하는 직전 텍스트 길이
+
+def _local(tag) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+class DocxContext:
+    """
+    scan_docx 한 번에 공유되는 DOCX 컨텍스트.
+    아카이브는 한 번만 열고, 각 파트는 최대 한 번만 압축 해제/파싱해서 모든 규칙이 재사용한다.
+    max_hits: 규칙마다 모을 적중 수 (verdict 모드는 1 → 첫 적중에서 멈춤)
+    """
+
+    def __init__(self, src, stream_threshold: Optional[int] = None, max_hits: Optional[int] = None):
+        self.src = src
+        self.zip = _open_zip(src)
+        self.names = set(self.zip.namelist())
+        self.stream_threshold = STREAM_THRESHOLD if stream_threshold is None else stream_threshold
+        self.max_hits = MAX_HITS if max_hits is None else max(1, max_hits)
+        self._xml: dict = {}
+        self._streamed: dict = {}
+        # 계측: 압축 해제/파싱한 파트 수와 그 크기 (metrics)
+        self.parts_parsed = 0
+        self.bytes_parsed = 0
+
+    def has(self, name: str) -> bool:
+        return name in self.names
+
+    def is_large(self, name: str) -> bool:
+        """압축 해제 크기가 임계값 이상이면 트리 대신 스트리밍 모드로 검사"""
+        return self.zip.getinfo(name).file_size >= self.stream_threshold
+
+    def stream_scan(self, name: str) -> "_PartStream":
+        """대형 파트를 XMLPullParser 로 한 번 훑어 DDE/CMD 토큰을 찾는다. 결과는 캐시"""
+        res = self._streamed.get(name)
+        if res is None:
+            res = _PartStream(self.max_hits)
+            res.run(self.zip, name)
+            self._streamed[name] = res
+            self._count(name)
+        return res
+
+    def xml(self, name: str) -> ET.Element:
+        """파트를 파싱한 루트 (없으면 KeyError). 결과는 캐시"""
+        root = self._xml.get(name)
+        if root is None:
+            if name not in self.names:
+                raise KeyError(name)
+            with self.zip.open(name) as f:
+                root = ET.fromstring(f.read())
+            self._xml[name] = root
+            self._count(name)
+        return root
+
+    def _count(self, name: str) -> None:
+        self.parts_parsed += 1
+        self.bytes_parsed += self.zip.getinfo(name).file_size
+
+    def close(self) -> None:
+        self._xml.clear()
+        self._streamed.clear()
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@contextmanager
+def _as_ctx(src):
+    """규칙 입력 정규화: 공유 DocxContext 면 그대로(닫지 않음), 경로/바이트면 새로 열고 닫는다"""
+    if isinstance(src, DocxContext):
+        yield src
+        return
+    with DocxContext(src) as ctx:
+        yield ctx
+
+# ---- 규칙 공통: _find_* 는 Found(keyword, intent 용 스니펫, 적중 위치) 또는 None 만 돌려주고,
+#      라벨/intent 문자열은 전체 결과가 필요할 때(_rule)만 만든다 (verdict 모드는 건너뜀) ----
+class Found(NamedTuple):
+    keyword: str        # 첫 적중 토큰 (표시/verdict 용)
+    snippet: str        # intent 문구용 주변 텍스트
+    hits: List[Hit]     # 적중 전부 (ctx.max_hits 까지). DOCX 는 part + match 로 위치를 나타낸다
+
+def _text_hit(part: str, match: str) -> Hit:
+    return Hit(None, len(match.encode("utf-8")), part=part, match=match)
+
+def _rule(key: str, finder, src):
     try:
-        with zipfile.ZipFile(file_path) as z:
-            try:
-                z.getinfo("word/vbaProject.bin")  # 존재만 확인
-            except KeyError:
-                return None
-            attack = _label("VBA")
-            keyword = "word/vbaProject.bin"
-            intent  = _summarize_intent(attack, keyword)
-            return {"attack": attack, "keyword": keyword, "intent": intent}
+        with _as_ctx(src) as ctx:
+            found = finder(ctx)
+            cap = ctx.max_hits
     except Exception:
         return None
+    if not found:
+        return None
+    attack = _label(key)
+    det = Detection(key, attack, found.keyword, _summarize_intent(attack, found.snippet),
+                    found.hits, len(found.hits) >= cap)
+    return det.to_dict()
 
-# ---- 2) External Template: attachedTemplate + 외부 Target이면 바로 악성 ----
-def doc_template(file_path: str):
-    REL_TAG = ".//{*}Relationship"
-    ATTACHED_TEMPLATE_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/attachedTemplate"
-    REL_PATHS = [
-        "word/_rels/settings.xml.rels",
-        "word/_rels/document.xml.rels",
-    ]
-    try:
-        with zipfile.ZipFile(file_path) as z:
-            for rel_path in REL_PATHS:
-                try:
-                    with z.open(rel_path) as f:
-                        root = ET.fromstring(f.read())
-                except KeyError:
-                    continue
-                for rel in root.findall(REL_TAG):
-                    if rel.get("Type", "") != ATTACHED_TEMPLATE_TYPE:
-                        continue
-                    target = (rel.get("Target", "") or "").strip()
-                    mode   = (rel.get("TargetMode", "") or "").strip()
-                    if mode.lower() == "external" or target.startswith(("http://","https://","file://","\\\\","//")):
-                        attack = _label("TEMPLATE")
-                        keyword = target or "external-template"
-                        intent  = _summarize_intent(attack, f"{target} mode={mode or 'N/A'}")
-                        return {"attack": attack, "keyword": keyword, "intent": intent}
-    except Exception:
+# ---- 1) VBA: vbaProject.bin 존재하면 바로 악성 ----
+def _find_vba(ctx: DocxContext) -> Optional[Found]:
+    if not ctx.has("word/vbaProject.bin"):  # 존재만 확인
         return None
-    return None
+    part = "word/vbaProject.bin"
+    return Found(part, part, [Hit(None, ctx.zip.getinfo(part).file_size, part=part)])
+
+def doc_vba(file_path):
+    return _rule("VBA", _find_vba, file_path)
+
+# ---- 2) External Template: attachedTemplate + 외부 Target이면 바로 악성 ----
+_REL_TAG = ".//{*}Relationship"
+_ATTACHED_TEMPLATE_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/attachedTemplate"
+_REL_PATHS = [
+    "word/_rels/settings.xml.rels",
+    "word/_rels/document.xml.rels",
+]
+
+def _find_template(ctx: DocxContext) -> Optional[Found]:
+    first = None
+    hits: List[Hit] = []
+    for rel_path in _REL_PATHS:
+        try:
+            root = ctx.xml(rel_path)
+        except KeyError:
+            continue
+        for rel in root.findall(_REL_TAG):
+            if rel.get("Type", "") != _ATTACHED_TEMPLATE_TYPE:
+                continue
+            target = (rel.get("Target", "") or "").strip()
+            mode   = (rel.get("TargetMode", "") or "").strip()
+            if mode.lower() == "external" or target.startswith(("http://","https://","file://","\\\\","//")):
+                if first is None:
+                    first = (target or "external-template", f"{target} mode={mode or 'N/A'}")
+                hits.append(_text_hit(rel_path, target))
+                if len(hits) >= ctx.max_hits:
+                    return Found(*first, hits)
+    return Found(*first, hits) if first else None
+
+def doc_template(file_path):
+    return _rule("TEMPLATE", _find_template, file_path)
 
 # ---- 3) DDE/DDEAUTO: 토큰 보이면 바로 악성 ----
 _RX_DDE = re.compile(r"\bDDE(?:AUTO)?\b", re.I)
-def doc_dde(file_path: str):
-    try:
-        with zipfile.ZipFile(file_path) as z:
-            for part in [
-                "word/document.xml","word/comments.xml","word/footnotes.xml","word/endnotes.xml",
-                "word/header1.xml","word/header2.xml","word/header3.xml",
-                "word/footer1.xml","word/footer2.xml","word/footer3.xml",
-            ]:
-                try:
-                    root = _read_xml(z, part)
-                except KeyError:
-                    continue
-                # fldSimple @instr
-                for fld in root.findall(".//{*}fldSimple"):
-                    for v in (fld.attrib or {}).values():
-                        if isinstance(v, str):
-                            m = _RX_DDE.search(v)
-                            if m:
-                                attack  = _label("DDE")
-                                keyword = m.group(0).upper()
-                                intent  = _summarize_intent(attack, v[:220])
-                                return {"attack": attack, "keyword": keyword, "intent": intent}
-                # instrText 조각
-                buf = "".join((n.text or "") for n in root.findall(".//{*}instrText"))
-                m = _RX_DDE.search(buf)
-                if m:
-                    attack  = _label("DDE")
-                    keyword = m.group(0).upper()
-                    intent  = _summarize_intent(attack, buf[:220])
-                    return {"attack": attack, "keyword": keyword, "intent": intent}
-    except Exception:
-        return None
-    return None
+
+def _find_dde(ctx: DocxContext) -> Optional[Found]:
+    first = None
+    hits: List[Hit] = []
+
+    def add(part: str, match: str, snippet: str) -> bool:
+        """적중 추가, 상한에 닿으면 True"""
+        nonlocal first
+        if first is None:
+            first = (match.upper(), snippet)
+        hits.append(_text_hit(part, match))
+        return len(hits) >= ctx.max_hits
+
+    for part in _TEXT_PARTS:
+        if not ctx.has(part):
+            continue
+        if ctx.is_large(part):
+            res = ctx.stream_scan(part)
+            for match in res.dde:
+                if add(part, match, res.dde_snippet):
+                    return Found(*first, hits)
+            continue
+        root = ctx.xml(part)
+        # fldSimple @instr
+        for fld in root.findall(".//{*}fldSimple"):
+            for v in (fld.attrib or {}).values():
+                if isinstance(v, str):
+                    for m in _RX_DDE.finditer(v):
+                        if add(part, m.group(0), v[:220]):
+                            return Found(*first, hits)
+        # instrText 조각
+        buf = "".join((n.text or "") for n in root.findall(".//{*}instrText"))
+        for m in _RX_DDE.finditer(buf):
+            if add(part, m.group(0), buf[:220]):
+                return Found(*first, hits)
+    return Found(*first, hits) if first else None
+
+def doc_dde(file_path):
+    return _rule("DDE", _find_dde, file_path)
 
 # ---- 4) 의심 명령 키워드: 핵심 토큰 하나라도 보이면 바로 악성 ----
+# (토큰 이름, 패턴) - 하나의 정규식(이름 그룹 alternation)으로 합쳐 텍스트를 한 번만 훑는다.
+# 앞의 (?=[...]) 는 토큰 첫 글자 사전 필터라서, 단어 시작 위치 대부분을 alternation 시도 없이 건너뛴다.
 _SUSPICIOUS = [
-    r"\bpowershell(?:\.exe)?\b", r"\bcmd(?:\.exe)?\s*/c\b",
-    r"\brundll32(?:\.exe)?\b", r"\bregsvr32(?:\.exe)?\b",
-    r"\bwscript(?:\.exe)?\b",  r"\bcscript(?:\.exe)?\b",
-    r"\bmshta(?:\.exe)?\b",    r"\bbitsadmin(?:\.exe)?\b",
-    r"\bcertutil(?:\.exe)?\b",
+    ("powershell", r"powershell(?:\.exe)?\b"), ("cmd", r"cmd(?:\.exe)?\s*/c\b"),
+    ("rundll32", r"rundll32(?:\.exe)?\b"),     ("regsvr32", r"regsvr32(?:\.exe)?\b"),
+    ("wscript", r"wscript(?:\.exe)?\b"),       ("cscript", r"cscript(?:\.exe)?\b"),
+    ("mshta", r"mshta(?:\.exe)?\b"),           ("bitsadmin", r"bitsadmin(?:\.exe)?\b"),
+    ("certutil", r"certutil(?:\.exe)?\b"),
 ]
-_SUSPICIOUS_RX = [re.compile(p, re.I) for p in _SUSPICIOUS]
+_SUSPICIOUS_RX = re.compile(
+    r"\b(?=[" + "".join(sorted({p[0] for _, p in _SUSPICIOUS})) + "])(?:"
+    + "|".join(f"(?P<{name}>{p})" for name, p in _SUSPICIOUS)
+    + ")",
+    re.I,
+)
 
-def doc_cmd(file_path: str):
-    try:
-        with zipfile.ZipFile(file_path) as z:
-            for part in [
-                "word/document.xml","word/comments.xml","word/footnotes.xml","word/endnotes.xml",
-                "word/header1.xml","word/header2.xml","word/header3.xml",
-                "word/footer1.xml","word/footer2.xml","word/footer3.xml",
-            ]:
-                try:
-                    root = _read_xml(z, part)
-                except KeyError:
-                    continue
-                # 전체 텍스트 플랫하게 긁어서 토큰 매칭
-                texts = []
-                for node in root.iter():
-                    if node.text: texts.append(node.text)
-                    if node.tail: texts.append(node.tail)
-                whole = " ".join(texts)
-                for rx in _SUSPICIOUS_RX:
-                    m = rx.search(whole)
-                    if m:
-                        attack  = _label("CMD")
-                        keyword = m.group(0)
-                        intent  = _summarize_intent(attack, keyword)
-                        return {"attack": attack, "keyword": keyword, "intent": intent}
-    except Exception:
+def _match_cmd(text: str):
+    """가장 앞쪽 의심 토큰 매치 (m.lastgroup 이 토큰 이름)"""
+    return _SUSPICIOUS_RX.search(text)
+
+class _PartStream:
+    """
+    대형 XML 파트 스트리밍 검사 (XMLPullParser).
+    - fldSimple@instr / instrText 조각에서 DDE, 전체 텍스트에서 의심 명령 토큰을 점진적으로 찾는다
+    - 처리한 요소는 즉시 clear/제거해서 트리가 쌓이지 않음 → 파트 크기와 무관하게 메모리 일정
+    - DDE/CMD 가 모두 limit 개씩 나오면 바로 중단
+    """
+    __slots__ = ("limit", "dde_fld", "dde_instr", "fld_snippet", "cmd", "done", "_stack", "_tail",
+                 "_pending", "_pending_len", "_instr_tail", "_instr_seen", "_instr_head")
+
+    def __init__(self, limit: int = 1):
+        self.limit = limit
+        # 찾은 DDE 토큰 (원문 대소문자). 트리 모드처럼 fldSimple@instr 적중 다음에 instrText 적중 (dde)
+        self.dde_fld: List[str] = []
+        self.dde_instr: List[str] = []
+        self.fld_snippet = ""        # 첫 fldSimple DDE 의 instr 값
+        self.cmd: List[str] = []     # 찾은 의심 명령 토큰
+        self.done = False        # 파트 끝까지 읽었는지
+        self._stack = []         # [elem, text 처리 여부, tail 을 아직 안 본 자식]
+        self._tail = ""          # 직전 배치의 끝부분 (경계 걸친 토큰용)
+        self._pending = []       # 아직 매칭하지 않은 텍스트 조각 (배치 단위로 정규식 실행)
+        self._pending_len = 0
+        self._instr_tail = ""
+        self._instr_seen = 0     # _instr_tail 중 매치를 이미 확정한 앞부분 길이
+        self._instr_head = ""
+
+    def run(self, z: zipfile.ZipFile, name: str) -> None:
+        parser = ET.XMLPullParser(events=("start", "end"))
+        with z.open(name) as f:
+            while True:
+                data = f.read(_STREAM_READ)
+                if data:
+                    parser.feed(data)
+                else:
+                    parser.close()
+                for ev, elem in parser.read_events():
+                    if ev == "start":
+                        self._start(elem)
+                    else:
+                        self._end(elem)
+                if not data:
+                    self._flush_instr()
+                    self._flush()
+                    break
+                if self._pending_len >= _STREAM_READ:
+                    self._flush()
+                # instrText 적중은 fldSimple 적중 뒤에 오므로, fldSimple 이 상한을 채워야 결과가 확정된다
+                if len(self.dde_fld) >= self.limit and len(self.cmd) >= self.limit:
+                    return
+        self.done = True
+
+    def _start(self, elem) -> None:
+        # 파서는 받은 chunk 를 이미 다 읽었으므로 parent 에는 아직 이벤트를 처리하지 않은 뒤 형제도 들어 있다
+        # → 처리 순서는 트리 모양이 아니라 frame 에 적어 둔 상태로 판단
+        if self._stack:
+            frame = self._stack[-1]
+            parent = frame[0]
+            if not frame[1]:
+                # 첫 자식이 시작되면 부모 text 는 확정
+                self._on_text(parent, parent.text)
+                frame[1] = True
+            # 앞 형제는 tail 까지 확정 → 처리 후 제거
+            if frame[2] is not None:
+                self._close_child(frame)
+        if len(self.dde_fld) < self.limit and _local(elem.tag) == "fldSimple":
+            for v in elem.attrib.values():
+                for m in _RX_DDE.finditer(v):
+                    if not self.dde_fld:
+                        self.fld_snippet = v[:220]
+                    if len(self.dde_fld) < self.limit:
+                        self.dde_fld.append(m.group(0))
+        self._stack.append([elem, False, None])   # [요소, text 처리 여부, 끝났지만 tail 을 아직 안 본 자식]
+
+    def _end(self, elem) -> None:
+        frame = self._stack.pop()
+        if not frame[1]:
+            self._on_text(elem, elem.text)
+        if frame[2] is not None:
+            self._close_child(frame)
+        # clear() 는 tail 도 지운다. tail 은 다음 형제/부모 끝에서 처리하므로 남겨 둔다
+        tail = elem.tail
+        elem.clear()
+        if tail:
+            elem.tail = tail
+        if self._stack:
+            self._stack[-1][2] = elem
+
+    def _close_child(self, frame) -> None:
+        child = frame[2]
+        frame[2] = None
+        self._on_text(None, child.tail)
+        parent = frame[0]
+        if len(parent) and parent[0] is child:
+            del parent[0]
+
+    def _on_text(self, elem, text: Optional[str]) -> None:
+        if not text:
+            return
+        if elem is not None and len(self.dde_instr) < self.limit and _local(elem.tag) == "instrText":
+            # instrText 조각은 이어 붙여서 검사 (DD + E 처럼 쪼개진 경우)
+            if len(self._instr_head) < 220:
+                self._instr_head += text[:220 - len(self._instr_head)]
+            window = self._instr_tail + text
+            seen = self._instr_seen
+            for m in _RX_DDE.finditer(window, seen):
+                # 창 끝에 닿은 매치는 다음 조각에서 길어질 수 있다 (DDE + AUTO) → 다음 조각/파트 끝에서 확정
+                if m.end() == len(window):
+                    break
+                self._add_instr(m.group(0))
+                seen = m.end()
+            self._instr_tail = window[-_STREAM_TAIL:]
+            self._instr_seen = max(0, seen - (len(window) - len(self._instr_tail)))
+        if len(self.cmd) < self.limit:
+            self._pending.append(text)
+            self._pending_len += len(text)
+
+    def _flush_instr(self) -> None:
+        """파트 끝: 마지막 instrText 조각 끝에 걸려 보류한 DDE 매치를 확정"""
+        if self._instr_tail:
+            for m in _RX_DDE.finditer(self._instr_tail, self._instr_seen):
+                self._add_instr(m.group(0))
+
+    def _add_instr(self, match: str) -> None:
+        if len(self.dde_instr) < self.limit:
+            self.dde_instr.append(match)
+
+    @property
+    def dde(self) -> List[str]:
+        return (self.dde_fld + self.dde_instr)[:self.limit]
+
+    @property
+    def dde_snippet(self) -> str:
+        """첫 DDE 의 주변 텍스트 (트리 모드와 같이 fldSimple 이면 instr 값, 아니면 instrText 앞부분)"""
+        return self.fld_snippet if self.dde_fld else self._instr_head
+
+    def _flush(self) -> None:
+        """모아둔 텍스트 조각을 한 번에 매칭 (트리 모드처럼 조각 사이는 공백으로 연결)"""
+        if not self._pending or len(self.cmd) >= self.limit:
+            return
+        seen = len(self._tail)   # 꼬리 안에서 끝나는 매치는 앞 배치에서 이미 셌다
+        if self._tail:
+            self._pending.insert(0, self._tail)
+        window = " ".join(self._pending)
+        self._pending.clear()
+        self._pending_len = 0
+        for m in _SUSPICIOUS_RX.finditer(window):
+            if m.end() > seen:
+                self.cmd.append(m.group(0))
+                if len(self.cmd) >= self.limit:
+                    break
+        self._tail = window[-_STREAM_TAIL:]
+
+def _doc_texts(root: ET.Element) -> List[str]:
+    """
+    text/tail 조각을 문서 순서(text → 자식들 → tail)로. 스트리밍 검사(_PartStream)와
+    클린업의 XML 텍스트 노드 순서와 같다 (root.iter() 는 자식보다 tail 을 먼저 낸다)
+    """
+    out = []
+    stack = [(root, False)]
+    while stack:
+        node, closed = stack.pop()
+        if closed:
+            if node.tail:
+                out.append(node.tail)
+            continue
+        if node.text:
+            out.append(node.text)
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(node))
+    return out
+
+def _find_cmd(ctx: DocxContext) -> Optional[Found]:
+    hits: List[Hit] = []
+    for part in _TEXT_PARTS:
+        if not ctx.has(part):
+            continue
+        if ctx.is_large(part):
+            # 대형 파트: 트리/전체 문자열 없이 스트리밍 검사
+            found = ctx.stream_scan(part).cmd
+        else:
+            root = ctx.xml(part)
+            # 전체 텍스트 플랫하게 긁어서 토큰 매칭
+            found = [m.group(0) for m in itertools.islice(
+                _SUSPICIOUS_RX.finditer(" ".join(_doc_texts(root))), ctx.max_hits - len(hits))]
+        hits.extend(_text_hit(part, k) for k in found[:ctx.max_hits - len(hits)])
+        if len(hits) >= ctx.max_hits:
+            break
+    if not hits:
         return None
-    return None
+    return Found(hits[0].match, hits[0].match, hits)
+
+def doc_cmd(file_path):
+    return _rule("CMD", _find_cmd, file_path)
+
+# ---- 규칙 등록: 실행 순서(비용)와 필요 입력은 rules 레지스트리가 관리 ----
+rules.register("docx", "VBA", doc_vba, rules.COST_META, (rules.NEED_ZIP_DIR,), _find_vba)
+rules.register("docx", "TEMPLATE", doc_template, rules.COST_PART, (rules.NEED_ZIP_RELS,), _find_template)
+rules.register("docx", "DDE", doc_dde, rules.COST_TEXT, (rules.NEED_TEXT_PARTS,), _find_dde)
+rules.register("docx", "CMD", doc_cmd, rules.COST_TEXT, (rules.NEED_TEXT_PARTS,), _find_cmd)
 
 # ---- 메인: 파일 경로 하나 넣고 빠르게 테스트 ----
-def scan_docx(file_path: str):
-    checks = [doc_vba, doc_template, doc_dde, doc_cmd]
+def scan_docx(file_path):
+    plan = rules.plan("docx")
     findings = []
-    for fn in checks:
-        try:
-            _logger.debug("run %s", fn.__name__)
-            res = fn(file_path)
-            _logger.debug("%s -> %s", fn.__name__, "HIT" if res else "MISS")
-            if res:
-                findings.append(res)
-        except Exception:
-            _logger.exception("%s error", fn.__name__)
-            continue
-    _logger.info("scan done file=%s hits=%d", file_path, len(findings))
+    # 아카이브는 한 번만 열고, 파싱한 파트는 모든 규칙이 공유
+    t0 = time.perf_counter()
+    try:
+        ctx = DocxContext(file_path)
+    except Exception as e:
+        _logger.warning("not a readable docx file=%s (%s)", _src_name(file_path), e)
+        return findings
+    metrics.record_rule("docx", "open", time.perf_counter() - t0, None)
+    with ctx:
+        for rule in plan:
+            fn = rule.func
+            res = None
+            parts, nbytes = ctx.parts_parsed, ctx.bytes_parsed
+            t0 = time.perf_counter()
+            try:
+                _logger.debug("run %s", fn.__name__)
+                res = fn(ctx)
+                _logger.debug("%s -> %s", fn.__name__, "HIT" if res else "MISS")
+                if res:
+                    findings.append(res)
+            except Exception:
+                _logger.exception("%s error", fn.__name__)
+            # 파트는 처음 필요한 규칙이 파싱하고 이후 규칙은 캐시를 쓰므로, 비용은 그 규칙에 잡힌다
+            metrics.record_rule("docx", rule.key, time.perf_counter() - t0, bool(res),
+                                ctx.bytes_parsed - nbytes, ctx.parts_parsed - parts)
+    _logger.info("scan done file=%s hits=%d", _src_name(file_path), len(findings))
     try:
         sys.stderr.flush()
     except Exception:
         pass
     return findings
 
+# ---- verdict 모드: 악성/정상 판정만 필요할 때 (메일 게이트웨이 등) ----
+# 켜진 규칙을 싼 것부터(rules.plan) 돌리고 첫 적중에서 멈춘다. 라벨/intent 문자열은 만들지 않는다.
+def verdict_docx(file_path) -> Dict:
+    """
+    {"malicious": bool, "rule": 적중 규칙 키 또는 None, "keyword": 적중 토큰}
+    아카이브를 못 열면 예외를 그대로 올리고, 적중 없이 규칙이 실패했으면 "error" 를 붙인다
+    (정상으로 판정해 캐시/색인되지 않게)
+    """
+    t0 = time.perf_counter()
+    ctx = DocxContext(file_path, max_hits=1)
+    metrics.record_rule("docx", "open", time.perf_counter() - t0, None)
+    failed = []
+    with ctx:
+        for rule in rules.plan("docx"):
+            hit = None
+            parts, nbytes = ctx.parts_parsed, ctx.bytes_parsed
+            t0 = time.perf_counter()
+            try:
+                hit = rule.finder(ctx)
+            except Exception as e:
+                _logger.exception("%s error", rule.name)
+                failed.append(f"{rule.key}: {e}")
+            metrics.record_rule("docx", rule.key, time.perf_counter() - t0, bool(hit),
+                                ctx.bytes_parsed - nbytes, ctx.parts_parsed - parts)
+            if hit:
+                return {"malicious": True, "rule": rule.key, "keyword": hit.keyword}
+    if failed:
+        return {"malicious": False, "rule": None, "error": "; ".join(failed)}
+    return {"malicious": False, "rule": None}
+
 if __name__ == "__main__":
     _log_start()
     try:
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 import base64
+import contextlib
 import json
 import os
 import sys
+import shutil
 import subprocess
 import tempfile
+import zipfile
 from pathlib import Path
-from typing import Iterable, List, Dict, Tuple, Optional, Any
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 # 로깅(옵션)
 import logging
@@ -24,12 +27,75 @@ DETECTOR_SCRIPTS = {
 }
 SUPPORTED = {"hwp", "docx"}
 
+# 인프로세스 엔진: 디텍터 모듈을 한 번만 import 해서 바이트를 직접 넘긴다.
+# DETECT_ISOLATE=1 이면 예전처럼 파일마다 서브프로세스로 격리 실행.
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+import hwp_detect  # noqa: E402
+import doc_detect  # noqa: E402
+import scan_cache  # noqa: E402
+import metrics  # noqa: E402
+import rules  # noqa: E402
+import cfb_reader  # noqa: E402
+import scan_index  # noqa: E402
+
+DETECTORS = {
+    "hwp": hwp_detect.scan_hwp,
+    "docx": doc_detect.scan_docx,
+}
+# verdict 모드: 악성/정상만 (싼 규칙부터, 첫 적중에서 멈춤, 라벨/intent 생략)
+VERDICTS = {
+    "hwp": hwp_detect.verdict_hwp,
+    "docx": doc_detect.verdict_docx,
+}
+RULESET_VERSIONS = {
+    "hwp": hwp_detect.RULESET_VERSION,
+    "docx": doc_detect.RULESET_VERSION,
+}
+ISOLATE_DEFAULT = os.getenv("DETECT_ISOLATE", "0") == "1"
+
+
+def _cache_version(kind: str) -> str:
+    """ 캐시 키용 버전: 규칙 집합 버전 + 켜진 규칙 목록 (배포별로 규칙을 꺼도 결과가 섞이지 않게) """
+    return f"{RULESET_VERSIONS[kind]}+{rules.signature(kind)}"
+
 
 def _which_detector(filename: str) -> Optional[str]:
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
     return ext if ext in SUPPORTED else None
 
 
+# 매직 바이트 판별 (디렉터리 스캔용: 확장자가 없거나 틀린 파일도 찾는다)
+_HWP_SIGNATURE = b"HWP Document File"
+_ZIP_MAGIC = b"PK\x03\x04"
+
+
+def sniff_kind(fp: BinaryIO) -> Optional[str]:
+    """
+    파일 객체의 앞부분/목차만 읽어 포맷 판별 → "hwp" / "docx" / None
+    - OLE(CFB) 헤더 + FileHeader 스트림이 HWP 서명 → hwp (헤더/FAT/디렉터리만 읽음)
+    - PK zip 이고 word/ 멤버가 있음 → docx (중앙 디렉터리만 읽음)
+    .doc/.xls 같은 다른 OLE 문서, 일반 zip 은 None. 읽은 뒤 처음 위치로 되돌린다
+    """
+    try:
+        fp.seek(0)
+        head = fp.read(8)
+        if cfb_reader.is_cfb(head):
+            fp.seek(0)
+            cfb = cfb_reader.CfbReader(fp)
+            return "hwp" if cfb.read_stream("FileHeader").startswith(_HWP_SIGNATURE) else None
+        if head.startswith(_ZIP_MAGIC):
+            fp.seek(0)
+            with zipfile.ZipFile(fp) as z:
+                return "docx" if any(n.startswith("word/") for n in z.namelist()) else None
+    except (KeyError, ValueError, zipfile.BadZipFile, EOFError):
+        # 깨진 컨테이너는 판별 불가 (호출자가 확장자로 대신 판단)
+        return None
+    finally:
+        fp.seek(0)
+    return None
+
+
 def _run_detector(script: Path, file_path: Path, timeout: int = 120) -> Any:
     """
     지정된 스크립트를 서브프로세스로 실행하여 stdout(JSON)을 파싱해 반환.
@@ -73,10 +139,44 @@ def _run_detector(script: Path, file_path: Path, timeout: int = 120) -> Any:
         return [{"keyword": ln} for ln in lines]
 
 
+def _run_inprocess(kind: str, file_bytes: "ScanInput") -> Any:
+    """ 이미 import 된 디텍터 함수를 메모리 입력에 대해 바로 실행 (프로세스/임시파일 없음) """
+    LOGGER.debug("inprocess detector kind=%s", kind)
+    return DETECTORS[kind](file_bytes)
+
+
+def _run_isolated(kind: str, file_bytes: "ScanInput", timeout: int = 120) -> Any:
+    """ 격리 모드: 임시 파일에 저장 후 디텍터 스크립트를 서브프로세스로 실행 """
+    script = DETECTOR_SCRIPTS[kind]
+    # 디텍터 스크립트는 경로 기반이므로 여기서만 파일 생성
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{kind}") as tf:
+        if hasattr(file_bytes, "read"):
+            file_bytes.seek(0)
+            shutil.copyfileobj(file_bytes, tf)
+        else:
+            tf.write(file_bytes)
+        tmp_path = Path(tf.name)
+    try:
+        return _run_detector(script, tmp_path, timeout=timeout)
+    finally:
+        try:
+            os.remove(tmp_path)
+            LOGGER.debug("temp removed %s", tmp_path)
+        except Exception:
+            LOGGER.debug("temp remove failed %s", tmp_path, exc_info=True)
+
+
+# 스캔 입력: 메모리 바이트 또는 seek 가능한 파일 객체 (디스크를 거치지 않음)
+ScanInput = Union[bytes, bytearray, memoryview, BinaryIO]
+
+# 디텍터의 Detection 레코드(detection.py) 필드 중 표시용 외에 그대로 넘기는 것
+LOCATION_KEYS = ("rule", "stream", "part", "offset", "length", "hits", "truncated")
+
+
 def _normalize_detections(payload: Any) -> List[Dict[str, Any]]:
     """
     업스트림 출력(payload)을 표준 포맷으로 정규화:
-    [{ id, type, keyword, summary }]
+    [{ id, type, keyword, summary, (rule), (stream), (offset), (length), (hits), ... }]
     """
     if isinstance(payload, list):
         source = payload
@@ -91,42 +191,81 @@ def _normalize_detections(payload: Any) -> List[Dict[str, Any]]:
     for idx, item in enumerate(source, start=1):
         if not isinstance(item, dict):
             item = {"keyword": str(item)}
-        out.append({
+        det = {
             "id": item.get("id", idx),
             "type": item.get("type") or item.get("category") or item.get("attack") or "unknown",
             "keyword": item.get("keyword") or item.get("key") or item.get("match") or "",
             "summary": item.get("summary") or item.get("message") or item.get("desc") or item.get("intent") or "",
-        })
+        }
+        # 규칙 키/위치 정보(있으면 유지): offset/stream/length 는 첫 적중(예전 소비자용),
+        # hits 는 같은 규칙의 모든 적중 [{offset, length, stream|part, match}] → 클린업이 그대로 사용
+        for k in LOCATION_KEYS:
+            if k in item:
+                det[k] = item[k]
+        out.append(det)
     return out
 
 
-def scan_file(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+def scan_file(file_bytes: ScanInput, filename: str, isolate: Optional[bool] = None,
+              use_cache: bool = True, with_metrics: Optional[bool] = None,
+              kind: Optional[str] = None, digest: Optional[str] = None) -> Dict[str, Any]:
     """
-    단일 파일 스캔. 반환 형식:
+    단일 파일 스캔. file_bytes 는 bytes / memoryview / 파일 객체(read+seek) 모두 가능. 반환 형식:
     {
       "filename": "...",
-      "detections": [ {id,type,keyword,summary}, ... ],
-      "has_detection": bool
+      "detections": [ {id,type,keyword,summary,rule,hits,...}, ... ],
+      "has_detection": bool,
+      ("metrics": {규칙별 시간/바이트/파트/적중, cache_hit})
     }
+    isolate=True 이면 디텍터를 서브프로세스로 격리 실행 (기본: DETECT_ISOLATE 환경변수)
+    같은 내용(해시)+같은 규칙 버전이면 scan_cache 결과를 그대로 돌려준다 (use_cache=False 로 우회)
+    with_metrics=True 이면 이번 스캔의 계측값을 결과에 싣는다 (기본: DETECT_METRICS_IN_RESULT)
+    kind/digest 는 디렉터리 스캔처럼 포맷(매직 바이트)과 내용 해시를 이미 구한 호출자용 (없으면 확장자/직접 해시)
     """
     LOGGER.info("scan start filename=%s", filename)
-    kind = _which_detector(filename)
+    kind = kind or _which_detector(filename)
     if not kind:
         LOGGER.warning("unsupported extension filename=%s", filename)
         return {"filename": filename, "detections": [], "has_detection": False, "error": "unsupported_extension"}
 
-    script = DETECTOR_SCRIPTS[kind]
+    if isolate is None:
+        isolate = ISOLATE_DEFAULT
+    if with_metrics is None:
+        with_metrics = metrics.IN_RESULT_DEFAULT
+
+    with metrics.collect(kind) as stats:
+        result = _scan_file(kind, file_bytes, filename, isolate, use_cache, stats, digest)
+    if with_metrics:
+        result["metrics"] = stats.as_dict()
+    return result
 
-    # 임시 파일 저장 후 스캐너에 경로 전달 (디텍터는 경로 기반이므로 여기서만 파일 생성)
-    suffix = f".{kind}"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tf:
-        tf.write(file_bytes)
-        tmp_path = Path(tf.name)
+
+def _scan_file(kind: str, file_bytes: ScanInput, filename: str, isolate: bool,
+               use_cache: bool, stats: "metrics.ScanStats", digest: Optional[str] = None) -> Dict[str, Any]:
+    cache = scan_cache.default_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        key = scan_cache.content_key(file_bytes, kind, _cache_version(kind), digest)
+        hit = cache.get(key)
+        stats.cache_hit = hit is not None
+        if hit is not None:
+            LOGGER.info("scan cache hit filename=%s kind=%s", filename, kind)
+            return {
+                "filename": filename,
+                "detections": [dict(d) for d in hit["detections"]],
+                "has_detection": hit["has_detection"],
+            }
 
     try:
-        raw = _run_detector(script, tmp_path)
+        if isolate:
+            raw = _run_isolated(kind, file_bytes)
+        else:
+            raw = _run_inprocess(kind, file_bytes)
         dets = _normalize_detections(raw)
         LOGGER.info("scan done filename=%s kind=%s detections=%d", filename, kind, len(dets))
+        if cache is not None:
+            # 실패 결과는 저장하지 않는다 (다음에 다시 시도)
+            cache.put(key, {"detections": dets, "has_detection": len(dets) > 0})
         return {
             "filename": filename,
             "detections": dets,
@@ -140,23 +279,413 @@ def scan_file(file_bytes: bytes, filename: str) -> Dict[str, Any]:
             "has_detection": False,
             "error": str(e),
         }
+
+
+def scan_verdict(file_bytes: ScanInput, filename: str, use_cache: bool = True,
+                 with_metrics: Optional[bool] = None, kind: Optional[str] = None,
+                 digest: Optional[str] = None) -> Dict[str, Any]:
+    """
+    판정만 필요한 경우(메일 게이트웨이 등)의 빠른 스캔. 반환 형식:
+    { "filename": "...", "malicious": bool, "rule": "VBA" 등 규칙 키 또는 None, ("keyword"), ("metrics") }
+    항상 인프로세스로 실행. 캐시는 전체 결과와 따로 verdict 키로 저장. kind/digest 는 scan_file 과 같음.
+    """
+    kind = kind or _which_detector(filename)
+    if not kind:
+        return {"filename": filename, "malicious": False, "rule": None, "error": "unsupported_extension"}
+    if with_metrics is None:
+        with_metrics = metrics.IN_RESULT_DEFAULT
+
+    with metrics.collect(kind) as stats:
+        result = _scan_verdict(kind, file_bytes, filename, use_cache, stats, digest)
+    if with_metrics:
+        result["metrics"] = stats.as_dict()
+    return result
+
+
+def _scan_verdict(kind: str, file_bytes: ScanInput, filename: str, use_cache: bool,
+                  stats: "metrics.ScanStats", digest: Optional[str] = None) -> Dict[str, Any]:
+    cache = scan_cache.default_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        key = scan_cache.content_key(file_bytes, f"{kind}:verdict", _cache_version(kind), digest)
+        hit = cache.get(key)
+        stats.cache_hit = hit is not None
+        if hit is not None:
+            return {"filename": filename, **hit}
+
+    try:
+        verdict = VERDICTS[kind](file_bytes)
+    except Exception as e:
+        LOGGER.exception("verdict failed filename=%s", filename)
+        return {"filename": filename, "malicious": False, "rule": None, "error": str(e)}
+    LOGGER.info("verdict filename=%s kind=%s malicious=%s rule=%s",
+                filename, kind, verdict["malicious"], verdict["rule"])
+    # 규칙이 실패한 판정(error)은 저장하지 않는다 (다음에 다시 시도)
+    if cache is not None and not verdict.get("error"):
+        cache.put(key, verdict)
+    return {"filename": filename, **verdict}
+
+
+# --- 배치 스캔 (프로세스 풀) ---
+# DETECT_WORKERS: 워커 수 (기본 CPU 수)
+# DETECT_FILE_TIMEOUT: 파일당 제한 시간(초). 초과 시 풀을 재시작하고 해당 파일은 timeout 결과.
+#   0 이하면 제한 없음 (이때만 워커 1개는 풀 없이 순차 인프로세스. 멈춘 디텍터를 끊으려면 별도 프로세스가 필요)
+DEFAULT_WORKERS = int(os.getenv("DETECT_WORKERS", "0")) or (os.cpu_count() or 1)
+DEFAULT_FILE_TIMEOUT = float(os.getenv("DETECT_FILE_TIMEOUT", "120"))
+
+FileSource = Union[bytes, bytearray, memoryview, str, os.PathLike]
+
+
+@contextlib.contextmanager
+def _open_input(src: FileSource):
+    """
+    bytes 는 그대로, 경로면 (워커 안에서) 파일을 연다.
+    파일 전체를 읽지 않고 파일 객체를 넘기므로 디텍터가 mmap/chunk 로 직접 읽는다.
+    """
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        yield src
+        return
+    with open(src, "rb") as f:
+        yield f
+
+
+def _scan_worker(name: str, src: FileSource, verdict: bool = False,
+                 with_metrics: Optional[bool] = None) -> Dict[str, Any]:
+    """ 풀 워커 진입점 (최상위 함수여야 pickle 가능) """
+    with _open_input(src) as data:
+        if verdict:
+            return scan_verdict(data, name, with_metrics=with_metrics)
+        return scan_file(data, name, with_metrics=with_metrics)
+
+
+def _merge_worker_metrics(res: Dict[str, Any], keep: bool) -> Dict[str, Any]:
+    """ 풀 워커가 결과에 실어 보낸 계측값을 부모 레지스트리에 합친다 (keep=False 면 결과에서 뺌) """
+    stats = res.get("metrics") if keep else res.pop("metrics", None)
+    if stats:
+        metrics.REGISTRY.merge(stats)
+        metrics.maybe_write_textfile()
+    return res
+
+
+def _error_result(filename: str, error: str, verdict: bool = False) -> Dict[str, Any]:
+    if verdict:
+        return {"filename": filename, "malicious": False, "rule": None, "error": error}
+    return {"filename": filename, "detections": [], "has_detection": False, "error": error}
+
+
+def _pool_init() -> None:
+    # 워커 로그는 부모와 섞이지 않게 경고 이상만
+    LOGGER.setLevel(logging.WARNING)
+    # 계측 파일은 워커 수치를 합친 부모만 쓴다
+    metrics.disable_export()
+
+
+def _new_pool(workers: int):
+    # 플랫폼 기본 시작 방식 (리눅스 fork / 윈도우·맥 spawn)
+    import multiprocessing
+    return multiprocessing.Pool(workers, initializer=_pool_init)
+
+
+def scan_files(
+    files: Iterable[Tuple[str, FileSource]],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    max_inflight: Optional[int] = None,
+    verdict: bool = False,
+    with_metrics: Optional[bool] = None,
+) -> List[Dict[str, Any]]:
+    """
+    여러 파일 스캔. 입력: [(filename, bytes 또는 경로), ...] (제너레이터 가능, 필요할 때만 꺼냄)
+    반환: 입력 순서 그대로의 scan_file(...) 결과 리스트 (끝나는 대로 받으려면 iter_scan_files)
+
+    프로세스 풀(workers 개)에서 실행.
+    - 동시에 풀에 올라가는 파일은 max_inflight(기본 workers) 개로 제한 → 메모리 상한
+    - 파일당 timeout 초과 시 {"error": "timeout"} 결과를 넣고 풀을 재시작(멈춘 워커 회수)
+    - timeout<=0(제한 없음)이고 workers=1 이면 풀 없이 순차 인프로세스
+    경로를 넘기면 파일 읽기도 워커에서 하므로 부모는 바이트를 들고 있지 않는다.
+    verdict=True 면 각 파일에 scan_verdict(...) 를 쓴다.
+    with_metrics=True 면 각 결과에 "metrics" 를 싣는다. 워커의 계측값은 어느 쪽이든 부모 레지스트리로 합쳐진다.
+    """
+    results = dict(iter_scan_files(files, workers, timeout, max_inflight, verdict, with_metrics))
+    return [results[i] for i in range(len(results))]
+
+
+def iter_scan_files(
+    files: Iterable[Tuple[str, Any]],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    max_inflight: Optional[int] = None,
+    verdict: bool = False,
+    with_metrics: Optional[bool] = None,
+    worker=None,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    scan_files 의 제너레이터판: (입력 순번, 결과) 를 끝나는 순서대로 낸다 (순차 실행이면 입력 순서)
+    worker 는 풀에서 돌릴 최상위 함수 worker(name, src, verdict, with_metrics) (기본 _scan_worker)
+    중간에 그만 받으면(close) 풀을 정리한다
+    """
+    worker = worker or _scan_worker
+    workers = DEFAULT_WORKERS if workers is None else max(1, workers)
+    if with_metrics is None:
+        with_metrics = metrics.IN_RESULT_DEFAULT
+    timeout = DEFAULT_FILE_TIMEOUT if timeout is None else timeout
+    max_inflight = max(workers, max_inflight or workers)
+
+    it = iter(files)
+    if workers == 1 and timeout <= 0:
+        for idx, (name, src) in enumerate(it):
+            yield idx, _scan_one_safe(name, src, verdict, with_metrics, worker)
+        return
+
+    import math
+    import queue
+    import time
+
+    inflight: Dict[int, Tuple[str, Any, float, int]] = {}  # idx -> (name, src, deadline, epoch)
+    done_q: "queue.Queue[Tuple[int, int, Any, Optional[BaseException]]]" = queue.Queue()
+    epoch = 0  # 풀 세대: 재시작 전 풀의 늦은 콜백은 무시
+    pool = _new_pool(workers)
+    next_idx = 0
+    exhausted = False
+
+    def submit(idx: int, name: str, src: Any) -> None:
+        ep = epoch
+        inflight[idx] = (name, src, time.monotonic() + timeout if timeout > 0 else math.inf, ep)
+        pool.apply_async(
+            worker, (name, src, verdict, True),
+            callback=lambda r, i=idx, e=ep: done_q.put((i, e, r, None)),
+            error_callback=lambda ex, i=idx, e=ep: done_q.put((i, e, None, ex)),
+        )
+
+    try:
+        while True:
+            # 창(window)이 빌 때만 다음 파일을 꺼낸다
+            while not exhausted and len(inflight) < max_inflight:
+                try:
+                    name, src = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                submit(next_idx, name, src)
+                next_idx += 1
+            if not inflight:
+                break
+
+            first = min(d for _, _, d, _ in inflight.values())
+            wait = None if first == math.inf else max(0.0, first - time.monotonic())
+            try:
+                idx, ep, res, exc = done_q.get(timeout=wait)
+            except queue.Empty:
+                # 제한 시간 초과: 해당 파일 timeout 처리 후 풀 재시작, 나머지는 다시 제출
+                now = time.monotonic()
+                expired = [i for i, (_, _, d, _) in inflight.items() if d <= now]
+                timed_out = []
+                for i in expired:
+                    name = inflight.pop(i)[0]
+                    LOGGER.warning("scan timeout filename=%s (%.0fs)", name, timeout)
+                    timed_out.append((i, _error_result(name, "timeout", verdict)))
+                pool.terminate()
+                epoch += 1
+                pool = _new_pool(workers)
+                for i, (name, src, _, _) in sorted(inflight.items()):
+                    submit(i, name, src)
+                yield from timed_out
+                continue
+
+            if ep != epoch or idx not in inflight:
+                continue
+            name = inflight.pop(idx)[0]
+            if exc is not None:
+                LOGGER.error("scan worker failed filename=%s: %s", name, exc)
+                yield idx, _error_result(name, str(exc), verdict)
+            else:
+                yield idx, _merge_worker_metrics(res, with_metrics)
     finally:
+        pool.terminate()
+        pool.join()
+
+
+def _scan_one_safe(name: str, src: FileSource, verdict: bool = False,
+                   with_metrics: Optional[bool] = None, worker=None) -> Dict[str, Any]:
+    try:
+        return (worker or _scan_worker)(name, src, verdict, with_metrics)
+    except OSError as e:
+        LOGGER.error("read failed filename=%s: %s", name, e)
+        return _error_result(name, str(e), verdict)
+
+
+# --- 디렉터리 스캔 (--tree): os.scandir 로 느긋하게 훑고, 바뀐 파일만 워커로 ---
+# walk_tree(경로, stat) → 색인 비교(크기/mtime 이 같으면 파일을 열지 않음) → iter_scan_files(_tree_worker) → 색인 갱신
+# 포맷은 확장자 대신 매직 바이트로 판별 (sniff_kind, 판별 못 하면 확장자 → 예전처럼 원시 .hwp 도 스캔)
+class TreeJob(NamedTuple):
+    path: str
+    prev_sha256: Optional[str]   # 같은 규칙 버전으로 스캔한 색인 결과의 해시 → 내용이 같으면 스캔 생략
+
+
+def walk_tree(roots: Iterable[Union[str, os.PathLike]],
+              follow_symlinks: bool = False) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    디렉터리를 os.scandir 로 깊이 우선 순회하며 일반 파일의 (경로, stat) 을 하나씩 낸다 (목록을 미리 만들지 않음)
+    root 가 파일이면 그 파일 하나. 읽을 수 없는 디렉터리/파일은 경고 후 건너뛴다
+    follow_symlinks=True 면 링크도 따라가되 같은 디렉터리(dev, inode)는 한 번만
+    """
+    seen_dirs = set()
+    stack: List[str] = []
+    for root in roots:
+        root = os.fspath(root)
         try:
-            os.remove(tmp_path)
-            LOGGER.debug("temp removed %s", tmp_path)
-        except Exception:
-            LOGGER.debug("temp remove failed %s", tmp_path, exc_info=True)
+            st = os.stat(root, follow_symlinks=follow_symlinks)
+        except OSError as e:
+            LOGGER.warning("tree root unreadable path=%s: %s", root, e)
+            continue
+        if os.path.isdir(root):
+            stack.append(root)
+        else:
+            yield root, st
+        while stack:
+            d = stack.pop()
+            if follow_symlinks:
+                try:
+                    dst = os.stat(d)
+                except OSError:
+                    continue
+                if (dst.st_dev, dst.st_ino) in seen_dirs:
+                    continue
+                seen_dirs.add((dst.st_dev, dst.st_ino))
+            try:
+                it = os.scandir(d)
+            except OSError as e:
+                LOGGER.warning("tree dir unreadable path=%s: %s", d, e)
+                continue
+            with it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=follow_symlinks):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=follow_symlinks):
+                            yield entry.path, entry.stat(follow_symlinks=follow_symlinks)
+                    except OSError as e:
+                        LOGGER.warning("tree entry unreadable path=%s: %s", entry.path, e)
 
 
-def scan_files(files: Iterable[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+def _tree_worker(name: str, job: TreeJob, verdict: bool = False,
+                 with_metrics: Optional[bool] = None) -> Dict[str, Any]:
     """
-    여러 파일 스캔. 입력: [(filename, bytes), ...]
-    반환: 각 파일에 대한 scan_file(...) 결과 리스트
+    풀 워커 진입점 (디렉터리 스캔). 판별/해시/스캔을 모두 워커에서 → 부모는 stat 과 색인만 본다
+    결과에 "kind"(None 이면 문서 아님), "sha256" 을 싣고, 내용이 색인과 같으면 스캔 없이 "same_content": True
     """
-    results: List[Dict[str, Any]] = []
-    for name, data in files:
-        results.append(scan_file(data, name))
-    return results
+    with open(job.path, "rb") as f:
+        kind = sniff_kind(f) or _which_detector(name)
+        if not kind:
+            return {"filename": name, "kind": None}
+        digest = scan_cache.file_digest(f)
+        if digest == job.prev_sha256:
+            return {"filename": name, "kind": kind, "sha256": digest, "same_content": True}
+        scan_one = scan_verdict if verdict else scan_file
+        res = scan_one(f, name, with_metrics=with_metrics, kind=kind, digest=digest)
+    res["kind"] = kind
+    res["sha256"] = digest
+    return res
+
+
+def scan_tree(
+    roots: Iterable[Union[str, os.PathLike]],
+    index: Optional["scan_index.ScanIndex"] = None,
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    verdict: bool = False,
+    with_metrics: Optional[bool] = None,
+    include_unchanged: bool = False,
+    follow_symlinks: bool = False,
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    디렉터리(들) 아래 문서를 스캔해 결과를 끝나는 대로 하나씩 낸다:
+    { "path": "...", "status": "new" | "changed" | "unchanged" | "error", scan_file(또는 scan_verdict) 결과 필드 }
+    - index(scan_index.ScanIndex, 없으면 이번 실행용 메모리 색인)에 크기/mtime/해시/결과를 남겨
+      다음 실행에서는 바뀐 파일만 연다. 크기/mtime 만 바뀌고 내용이 같으면 "unchanged"
+    - 기본은 새로 스캔한 파일만 낸다. include_unchanged=True 면 색인 결과도 "unchanged" 로 낸다
+      (색인 결과는 다음 스캔 결과가 나올 때 함께 나가므로, 바뀐 파일이 드물면 그 사이에 쌓인다)
+    - 문서가 아닌 파일은 내지 않고 색인에만 기록. 읽기 실패/시간 초과는 "error" 로 내고 색인에서 지워 다음에 다시 시도
+    stats 를 넘기면 seen/scanned/unchanged/skipped/errors 개수를 채운다
+    """
+    import collections
+    import itertools
+
+    mode = "verdict" if verdict else "full"
+    own_index = index is None
+    if own_index:
+        index = scan_index.ScanIndex(None, mode)
+    elif index.mode != mode:
+        raise ValueError(f"index mode {index.mode!r} does not match scan mode {mode!r}")
+    if stats is None:
+        stats = {}
+    for k in ("seen", "scanned", "unchanged", "skipped", "errors"):
+        stats.setdefault(k, 0)
+    versions = {k: _cache_version(k) for k in SUPPORTED}
+    pending: Dict[int, Tuple[TreeJob, os.stat_result, Optional["scan_index.IndexEntry"]]] = {}
+    ready: "collections.deque[Dict[str, Any]]" = collections.deque()
+    seq = itertools.count()
+
+    def record(path: str, status: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        return {"path": path, "status": status, "filename": os.path.basename(path), **result}
+
+    def jobs() -> Iterator[Tuple[str, TreeJob]]:
+        for path, st in walk_tree(roots, follow_symlinks):
+            stats["seen"] += 1
+            prev = index.get(path)
+            valid = prev is not None and (prev.kind is None or prev.version == versions.get(prev.kind))
+            if valid and prev.size == st.st_size and prev.mtime_ns == st.st_mtime_ns:
+                if prev.kind is None:
+                    stats["skipped"] += 1
+                else:
+                    stats["unchanged"] += 1
+                    if include_unchanged:
+                        ready.append(record(path, "unchanged", prev.result or {}))
+                continue
+            reuse = valid and prev.kind is not None and prev.result is not None
+            job = TreeJob(path, prev.sha256 if reuse else None)
+            pending[next(seq)] = (job, st, prev)   # iter_scan_files 가 꺼낸 순서대로 매기는 순번과 같다
+            yield os.path.basename(path), job
+
+    try:
+        with contextlib.closing(iter_scan_files(jobs(), workers, timeout, verdict=verdict,
+                                                with_metrics=with_metrics, worker=_tree_worker)) as results:
+            for idx, res in results:
+                while ready:
+                    yield ready.popleft()
+                job, st, prev = pending.pop(idx)
+                kind = res.pop("kind", None)
+                digest = res.pop("sha256", None)
+                res.pop("filename", None)
+                if res.get("error"):
+                    stats["errors"] += 1
+                    index.forget(job.path)
+                    yield record(job.path, "error", res)
+                    continue
+                if kind is None:
+                    stats["skipped"] += 1
+                    index.put(job.path, scan_index.IndexEntry(st.st_size, st.st_mtime_ns, None, None, "", None))
+                    continue
+                if res.pop("same_content", False):
+                    stats["unchanged"] += 1
+                    index.put(job.path, scan_index.IndexEntry(
+                        st.st_size, st.st_mtime_ns, digest, kind, prev.version, prev.result))
+                    if include_unchanged:
+                        yield record(job.path, "unchanged", prev.result or {})
+                    continue
+                stats["scanned"] += 1
+                stored = {k: v for k, v in res.items() if k != "metrics"}
+                index.put(job.path, scan_index.IndexEntry(
+                    st.st_size, st.st_mtime_ns, digest, kind, versions[kind], stored))
+                yield record(job.path, "changed" if prev is not None and prev.kind else "new", res)
+        while ready:
+            yield ready.popleft()
+    finally:
+        if own_index:
+            index.close()
+        else:
+            index.commit()
 
 
 def to_front_single(result: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -226,10 +755,261 @@ def _decode_files_from_json(obj: Any) -> List[Tuple[str, bytes]]:
     return out
 
 
+# --- 프레임 전송 (--stdin-frames / --serve --frames): base64 없이 원본 바이트 그대로 ---
+# 프레임 = [헤더 길이 u32 big-endian][헤더 JSON(UTF-8)][본문 header["size"] 바이트(없으면 0)]
+# 요청 헤더는 줄 단위 JSON 요청과 같은 필드 ({"id", "name", "verdict", ...}) + "size", 본문이 파일 바이트.
+# 응답도 같은 형식의 프레임 (본문 없음). 파일은 하나씩 읽어 바로 스캔하므로
+# 메모리는 (동시 처리 수 × 가장 큰 파일) 로 제한된다. 입력 끝(EOF)이 배치 끝.
+FRAME_HEADER_MAX = 1 << 20
+
+
+class FrameError(ValueError):
+    """프레임 스트림이 깨짐 (이후 바이트는 해석할 수 없음)"""
+
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    buf = f.read(n)
+    if buf is None:
+        buf = b""
+    if len(buf) == n:
+        return buf
+    parts = [buf]
+    got = len(buf)
+    while got < n:
+        chunk = f.read(n - got)
+        if not chunk:
+            raise FrameError(f"truncated frame: expected {n} bytes, got {got}")
+        parts.append(chunk)
+        got += len(chunk)
+    return b"".join(parts)
+
+
+def read_frame(f: BinaryIO) -> Optional[Tuple[Dict[str, Any], Optional[bytes]]]:
+    """프레임 하나 → (헤더, 본문 또는 None). 프레임 경계에서 EOF 면 None"""
+    head = f.read(4)
+    if not head:
+        return None
+    if len(head) < 4:
+        head += _read_exact(f, 4 - len(head))
+    n = int.from_bytes(head, "big")
+    if n > FRAME_HEADER_MAX:
+        raise FrameError(f"frame header too large: {n}")
+    try:
+        header = json.loads(_read_exact(f, n).decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise FrameError(f"bad frame header: {e}")
+    if not isinstance(header, dict):
+        raise FrameError("frame header must be an object")
+    size = header.get("size") or 0
+    if not isinstance(size, int) or size < 0:
+        raise FrameError(f"bad frame size: {size!r}")
+    return header, (_read_exact(f, size) if size else None)
+
+
+def write_frame(f: BinaryIO, header: Dict[str, Any], payload: bytes = b"") -> None:
+    if payload:
+        header = {**header, "size": len(payload)}
+    data = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    f.write(len(data).to_bytes(4, "big") + data)
+    if payload:
+        f.write(payload)
+    f.flush()
+
+
+def _iter_lines(stdin) -> Iterator[Tuple[Optional[Dict[str, Any]], Optional[bytes], Optional[Exception]]]:
+    """줄 단위 JSON 요청 → (요청, None, 파싱 오류)"""
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None, None
+        except Exception as e:
+            yield None, None, e
+
+
+def _iter_frames(stdin) -> Iterator[Tuple[Optional[Dict[str, Any]], Optional[bytes], Optional[Exception]]]:
+    """프레임 요청 → (헤더, 본문, 오류). 깨진 프레임이면 오류 하나를 내고 끝 (경계를 잃었으므로)"""
+    while True:
+        try:
+            frame = read_frame(stdin)
+        except FrameError as e:
+            yield None, None, e
+            return
+        if frame is None:
+            return
+        yield frame[0], frame[1], None
+        frame = None   # 다음 파일을 읽기 전에 앞 파일 바이트를 놓는다
+
+
+# --- 상주 모드 (--serve): 줄 단위 JSON 요청/응답 (--frames 면 위 프레임 형식) ---
+# 요청: {"id": ..., "name": "a.hwp", "path": "..."} 또는 {"id": ..., "name": "...", "bytes_b64": "..."}
+#       (프레임이면 파일 바이트는 base64 대신 프레임 본문)
+#       "verdict": true 를 붙이면 scan_verdict 결과(악성/정상 판정만)
+#       "metrics": true 를 붙이면 결과에 이번 스캔 계측값 포함
+#       {"id": ..., "op": "ping"} 은 즉시 {"id": ..., "pong": true}
+#       {"id": ..., "op": "metrics"} 는 누적 계측 {"id": ..., "metrics": {...}, "prometheus": "텍스트"}
+# 응답: {"id": ..., "result": {scan_file 결과}} / 실패 시 {"id": ..., "error": "..."}
+# workers>1 이면 프로세스 풀에서 처리하므로 응답 순서는 요청 순서와 다를 수 있다 (id 로 매칭).
+# 풀에 동시에 올라가는 요청은 max_inflight(기본 workers) 개까지, 그 동안 다음 요청은 읽지 않는다.
+def _request_source(req: Dict[str, Any], payload: Optional[bytes] = None) -> Tuple[str, FileSource]:
+    b64 = req.get("bytes_b64") or req.get("b64") or req.get("data_b64")
+    path = req.get("path")
+    name = req.get("name") or req.get("filename") or (Path(path).name if path else None)
+    if not name:
+        raise ValueError("missing name")
+    if payload is not None:
+        return name, payload
+    if b64:
+        return name, base64.b64decode(b64)
+    if path:
+        return name, path
+    raise ValueError("missing path or bytes_b64")
+
+
+def serve(stdin=None, stdout=None, workers: Optional[int] = None, frames: bool = False,
+          max_inflight: Optional[int] = None, verdict: bool = False) -> None:
+    """
+    stdin 이 닫힐 때까지 요청을 처리. 진행 중인 스캔은 끝까지 응답한 뒤 종료
+    frames=True 면 프레임 형식 (stdin/stdout 은 바이너리 스트림, 기본 sys.stdin.buffer/sys.stdout.buffer)
+    verdict 는 요청에 "verdict" 가 없을 때의 기본값
+    """
+    import threading
+    if frames:
+        stdin = stdin or sys.stdin.buffer
+        stdout = stdout or sys.stdout.buffer
+    else:
+        stdin = stdin or sys.stdin
+        stdout = stdout or sys.stdout
+    workers = DEFAULT_WORKERS if workers is None else max(1, workers)
+    slots = threading.BoundedSemaphore(max(workers, max_inflight or workers))
+    lock = threading.Lock()
+
+    def reply(obj: Dict[str, Any]) -> None:
+        with lock:
+            if frames:
+                write_frame(stdout, obj)
+                return
+            stdout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            stdout.flush()
+
+    def finish(obj: Dict[str, Any]) -> None:
+        slots.release()
+        reply(obj)
+
+    pool = _new_pool(workers) if workers > 1 else None
+    verdict_default = verdict
+    LOGGER.info("serve start workers=%d frames=%s", workers, frames)
+    try:
+        requests = _iter_frames(stdin) if frames else _iter_lines(stdin)
+        for seq, (req, payload, err) in enumerate(requests, start=1):
+            rid = None
+            try:
+                if err is not None:
+                    raise err
+                # 프레임 배치(--stdin-frames)는 id 없이 보내도 되게 순번을 id 로
+                rid = req.get("id", seq if frames else None)
+                if req.get("op") == "ping":
+                    reply({"id": rid, "pong": True})
+                    continue
+                if req.get("op") == "metrics":
+                    reply({"id": rid, "metrics": metrics.REGISTRY.snapshot(),
+                           "prometheus": metrics.REGISTRY.prometheus_text()})
+                    continue
+                name, src = _request_source(req, payload)
+                del payload
+                verdict = bool(req.get("verdict", verdict_default))
+                want_metrics = bool(req.get("metrics", metrics.IN_RESULT_DEFAULT))
+            except Exception as e:
+                reply({"id": rid, "error": str(e)})
+                continue
+
+            if pool is None:
+                reply({"id": rid, "result": _scan_one_safe(name, src, verdict, want_metrics)})
+            else:
+                # 빈 자리가 날 때까지 다음 요청(파일 바이트)을 읽지 않는다 → 메모리 상한
+                slots.acquire()
+                pool.apply_async(
+                    _scan_worker, (name, src, verdict, True),
+                    callback=lambda r, i=rid, k=want_metrics: finish(
+                        {"id": i, "result": _merge_worker_metrics(r, k)}),
+                    error_callback=lambda ex, i=rid: finish({"id": i, "error": str(ex)}),
+                )
+            del src
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        metrics.maybe_write_textfile(force=True)
+        LOGGER.info("serve stop")
+
+
+def _pop_option(args: List[str], flag: str) -> Optional[str]:
+    """ "--flag 값" 을 args 에서 빼고 값 반환 """
+    if flag in args:
+        i = args.index(flag)
+        if i + 1 < len(args):
+            val = args[i + 1]
+            del args[i:i + 2]
+            return val
+        del args[i]
+    return None
+
+
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+
     args = [s for s in sys.argv[1:] if s]
+    # 배치 옵션: --workers N, --timeout SEC (미지정 시 DETECT_WORKERS / DETECT_FILE_TIMEOUT)
+    _w = _pop_option(args, "--workers")
+    _t = _pop_option(args, "--timeout")
+    # --verdict: 전체 탐지 목록 대신 악성/정상 판정만 (모드 1~3 공통)
+    VERDICT = "--verdict" in args
+    # --metrics: 각 결과에 규칙별 계측값 포함 (DETECT_METRICS_IN_RESULT=1 과 같음)
+    if "--metrics" in args:
+        metrics.IN_RESULT_DEFAULT = True
+    args = [a for a in args if a not in ("--verdict", "--metrics")]
+    BATCH_OPTS = {"workers": int(_w) if _w else None, "timeout": float(_t) if _t else None,
+                  "verdict": VERDICT}
+    scan_one = scan_verdict if VERDICT else scan_file
+
+    # 모드 0: --serve (상주 데몬, 줄 단위 JSON. --frames 면 프레임)
+    if args and args[0] == "--serve":
+        serve(workers=BATCH_OPTS["workers"], frames="--frames" in args, verdict=VERDICT)
+        sys.exit(0)
 
-    # 모드 1: --stdin-json
+    # 모드 1': --stdin-frames (프레임 배치: 파일마다 받는 즉시 스캔, 결과 프레임을 파일마다 바로 출력)
+    if args and args[0] == "--stdin-frames":
+        serve(workers=BATCH_OPTS["workers"], frames=True, verdict=VERDICT)
+        sys.exit(0)
+
+    # 모드 1'': --tree DIR... [--index 색인.db] [--all] [--follow-symlinks]
+    # 디렉터리 재귀 스캔. 결과를 파일마다 한 줄 JSON 으로 끝나는 대로 출력하고, 마지막 줄은 {"summary": {...}}
+    # --index (또는 DETECT_INDEX_DB) 를 주면 다음 실행에서는 바뀐 파일만 스캔. --all 이면 바뀌지 않은 파일 결과도 출력
+    if args and args[0] == "--tree":
+        _idx = _pop_option(args, "--index")
+        flags = {"--all", "--follow-symlinks"}
+        roots = [a for a in args[1:] if a not in flags]
+        if not roots:
+            print(json.dumps({"error": "missing directory for --tree"}, ensure_ascii=False))
+            sys.exit(2)
+        counts: Dict[str, int] = {}
+        try:
+            with scan_index.open_index(_idx, "verdict" if VERDICT else "full") as index:
+                for rec in scan_tree(roots, index, BATCH_OPTS["workers"], BATCH_OPTS["timeout"], VERDICT,
+                                     include_unchanged="--all" in args,
+                                     follow_symlinks="--follow-symlinks" in args, stats=counts):
+                    sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    sys.stdout.flush()
+            print(json.dumps({"summary": counts}, ensure_ascii=False))
+            sys.exit(0)
+        except Exception as e:
+            LOGGER.exception("tree mode failed")
+            print(json.dumps({"error": str(e)}, ensure_ascii=False))
+            sys.exit(1)
+
+    # 모드 1: --stdin-json (예전 형식: 배치 전체를 base64 JSON 하나로. 큰 배치는 --stdin-frames 권장)
     if args and args[0] == "--stdin-json":
         try:
             obj = _read_stdin_json()
@@ -240,10 +1020,10 @@ if __name__ == "__main__":
 
             if len(files) == 1:
                 name, data = files[0]
-                res = scan_file(data, name)
+                res = scan_one(data, name)
                 print(json.dumps(res, ensure_ascii=False))
             else:
-                res = scan_files(files)
+                res = scan_files(files, **BATCH_OPTS)
                 print(json.dumps(res, ensure_ascii=False))
             sys.exit(0)
         except Exception as e:
@@ -259,7 +1039,7 @@ if __name__ == "__main__":
         name = args[1]
         try:
             data = _read_all_stdin_bytes()
-            res = scan_file(data, name)
+            res = scan_one(data, name)
             print(json.dumps(res, ensure_ascii=False))
             sys.exit(0)
         except Exception as e:
@@ -273,10 +1053,6 @@ if __name__ == "__main__":
         print("[]")
         sys.exit(0)
 
-    def read_bytes(p: Path) -> bytes:
-        with open(p, "rb") as f:
-            return f.read()
-
     # 인자 파싱: "path::orig" 지원
     pairs: List[Tuple[str, Path]] = []  # (orig_name, path)
     for s in raw_args:
@@ -290,11 +1066,12 @@ if __name__ == "__main__":
     try:
         if len(pairs) == 1:
             orig, p = pairs[0]
-            res = scan_file(read_bytes(p), orig)
+            with _open_input(p) as data:
+                res = scan_one(data, orig)
             print(json.dumps(res, ensure_ascii=False))
         else:
-            files = [(orig, read_bytes(p)) for (orig, p) in pairs]
-            res = scan_files(files)
+            # 경로만 넘기고 읽기는 워커에서 (부모가 전체 바이트를 들고 있지 않음)
+            res = scan_files(pairs, **BATCH_OPTS)
             print(json.dumps(res, ensure_ascii=False))
     except Exception as e:
         LOGGER.exception("path mode failed")
@@ -1,40 +1,32 @@
 # scan_hwp_detect.py
+import bisect
+import codecs
+import contextlib
+import io
 import os
 import re
 import json
+import struct
 import sys
+import zlib
 import logging
+import mmap
+import time
 import traceback
-from typing import Optional, List, Dict
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from pathlib import Path
 
-# --- 공격 라벨 (영문/한글 동시 표기) ---
-ATTACK_LABELS_EN = {
-    "PE_MZ": "HWP: Embedded PE (MZ)",
-    "EPS_PS": "HWP: EPS/PostScript",
-    "DOUBLE_EXT": "HWP: Double-Extension Attachment",
-    "RAW_IP": "HWP: Raw-IP Link",
-}
-ATTACK_LABELS_KO = {
-    "PE_MZ": "HWP: BinData 내 실행파일(MZ) 삽입",
-    "EPS_PS": "HWP: EPS/PS(PostScript) 포함",
-    "DOUBLE_EXT": "HWP: 이중 확장자 첨부파일",
-    "RAW_IP": "HWP: 원시 IP 기반 외부 링크",
-}
+import cfb_reader
+import metrics
+import rules
+from detection import MAX_HITS, Detection, Hit
 
-def _label(key: str) -> str:
-    eng = ATTACK_LABELS_EN.get(key, key)
-    kor = ATTACK_LABELS_KO.get(key, key)
-    return f"{eng} / {kor}"
-
-def _attack_key_from_label(attack: str) -> Optional[str]:
-    for k, en in ATTACK_LABELS_EN.items():
-        if attack.startswith(en):
-            return k
-    for k, ko in ATTACK_LABELS_KO.items():
-        if ko in attack:
-            return k
-    return None
+# 규칙 집합 버전: 규칙이나 결과 형식이 바뀌면 올린다 (scan_cache 키에 포함 → 예전 캐시 자동 무효화)
+RULESET_VERSION = "2026.10.7"
+
+# --- 공격 라벨(영/한)은 rules 레지스트리 한 곳에서 관리 ---
+_label = rules.label
+_attack_key_from_label = rules.key_from_label
 
 # --- intent 하드코딩 ---
 def _summarize_intent(attack: str, snippet: str) -> str:
@@ -50,98 +42,743 @@ def _summarize_intent(attack: str, snippet: str) -> str:
     else:
         return f"{attack} 탐지 결과, '{snippet}'을(를) 통해 악성 행위를 수행할 의도가 의심됩니다."
 
-# --- 헬퍼: 바이너리 읽기 ---
-def _read_bytes(path: str) -> bytes:
-    with open(path, "rb") as f:
-        return f.read()
+# --- 헬퍼: 입력 열기 (경로 또는 이미 메모리에 있는 바이트) ---
+def _is_filelike(src) -> bool:
+    return hasattr(src, "read") and hasattr(src, "seek")
 
-# --- 1) BinData 내 PE(MZ) 실행파일 삽입 검출(바이너리 시그니처 휴리스틱) ---
-def hwp_pe_mz(file_path: str) -> Optional[Dict]:
+def _open_source(src):
+    """
+    경로 / bytes·bytearray·memoryview / 파일 객체(read+seek) 모두 받는다.
+    호출자가 넘긴 파일 객체는 닫지 않는다 (with 블록이 끝나도 그대로).
+    """
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return io.BytesIO(src)
+    if _is_filelike(src):
+        return contextlib.nullcontext(src)
+    return open(src, "rb")
+
+def _src_name(src) -> str:
+    """로그용 입력 표시 (바이트 입력이면 크기만)"""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(src)}>"
+    if _is_filelike(src):
+        return f"<stream:{getattr(src, 'name', type(src).__name__)}>"
+    return str(src)
+
+def _loc(stream: Optional[str], off: int) -> str:
+    """키워드용 위치 표기: 컨테이너 스트림이면 '스트림@오프셋', 원시 파일이면 오프셋만"""
+    return f"{stream}@{off}" if stream else str(off)
+
+def _where(stream: Optional[str], off: int) -> Dict:
+    where = {"offset": off}
+    if stream:
+        where["stream"] = stream
+    return where
+
+# --- 통합 스캔: 모든 시그니처/정규식을 한 번의 sweep 으로 매칭 ---
+# 리터럴 앵커(MZ, %!PS, EPSF-, ://, .exe)만 한 번에 훑고, 앵커 주변에서만 정규식으로 확정한다.
+# (re 의 대형 alternation 은 규칙별 개별 검색보다 느리므로 앵커 방식 사용)
+# 바이너리 스트림은 bytes 정규식으로 직접 매칭하므로 decode() 사본이 생기지 않는다.
+_ANCHOR_PAT = rb"MZ|%!PS|EPSF-|://|\.[eE][xX][eE]"
+_TEXT_ANCHOR_PAT = rb"://|\.[eE][xX][eE]"
+_MARK_ANCHOR_PAT = rb"MZ|%!PS|EPSF-"
+_DOUBLE_EXT_EXTS = rb"\.(?:docx|xlsx|pptx|pdf|hwp|txt|jpg|png)\.exe\Z"
+_DOUBLE_EXT_TAIL_PAT = rb"[\w\-]+" + _DOUBLE_EXT_EXTS
+# 바이트용: bytes 정규식의 \w 는 ASCII 뿐이라 UTF-8 다바이트 문자(보고서.hwp.exe)도 이름으로 받고,
+# 확정은 디코드한 이름에 유니코드 \w 패턴으로 한다 (_utf8_name)
+_UTF8_NAME_TAIL_PAT = rb"(?:[\w\-]|[\xc2-\xf4][\x80-\xbf]{1,3})+" + _DOUBLE_EXT_EXTS
+_RAW_IP_PAT = rb"(?:https?|ftp)://(?:\d{1,3}\.){3}\d{1,3}(?::\d{1,5})?(?:/[^\s\"'<>\)]*)?"
+_SCHEMES = (b"https", b"http", b"ftp")
+_ANCHOR_MAX = 5   # 가장 긴 앵커(EPSF-, .exe) 길이: limit 앞에서 시작한 앵커가 끝까지 보이는 데 필요한 여유
+
+
+class _Patterns(NamedTuple):
+    anchor: "re.Pattern"
+    double_ext_tail: "re.Pattern"
+    raw_ip: "re.Pattern"
+    schemes: tuple
+
+
+# 바이너리 스트림/원시 파일용(bytes), UTF-16 텍스트 스트림용(str, 유니코드 \w),
+# 텍스트 스트림의 원본 바이트용(bytes, 바이너리 규칙 MZ/EPS 만) 세 벌
+_BIN = _Patterns(
+    re.compile(_ANCHOR_PAT),
+    re.compile(_UTF8_NAME_TAIL_PAT, re.IGNORECASE),
+    re.compile(_RAW_IP_PAT, re.IGNORECASE),
+    _SCHEMES,
+)
+_TXT = _Patterns(
+    re.compile(_TEXT_ANCHOR_PAT.decode()),
+    re.compile(_DOUBLE_EXT_TAIL_PAT.decode(), re.IGNORECASE),
+    re.compile(_RAW_IP_PAT.decode(), re.IGNORECASE),
+    tuple(x.decode() for x in _SCHEMES),
+)
+_MARK = _BIN._replace(anchor=re.compile(_MARK_ANCHOR_PAT))
+_EPS_MARKERS = [b"%!PS", b"EPSF-"]  # 선호 순서 (%!PS-Adobe 는 %!PS 에 포함)
+
+_PE_WINDOW = 4096
+_PE_MAX_LFANEW = _PE_WINDOW - 8   # e_lfanew 상한 (헤더+섹션 표가 chunk 겹침 구간 안에 들어오도록)
+_PE_MACHINES = {
+    0x014C: "i386", 0x8664: "x64", 0xAA64: "arm64", 0x01C0: "arm", 0x01C4: "armnt", 0x0200: "ia64",
+}
+_PE_OPT_MAGIC = {0x10B: "PE32", 0x20B: "PE32+"}
+_NAME_WINDOW = 256     # 이중 확장자 파일명 최대 길이(앵커 앞쪽)
+_CHUNK = 1 << 20       # 스트림 처리 단위 (메모리 상한)
+_OVERLAP = 2 * _PE_WINDOW  # chunk 경계에서 앵커 앞뒤 확인 여유
+_VIEW_WINDOW = 16 * _CHUNK  # mmap 직접 스캔 시 한 번에 훑는 구간 (지나간 페이지는 내려놓음)
+
+
+class TokenHit(NamedTuple):
+    """정규식/시그니처 적중 하나. raw 는 찾은 그대로 (바이너리면 bytes, UTF-16 텍스트 스트림이면 str)"""
+    raw: object
+    stream: Optional[str]
+    offset: int
+
+
+class PeHit(NamedTuple):
+    """검증된 PE 이미지 한 개. raw_size 는 디스크상 크기(헤더~마지막 섹션 끝), 섹션 표가 잘렸으면 None"""
+    stream: Optional[str]
+    offset: int
+    machine: str
+    sections: int
+    image_size: int      # OptionalHeader.SizeOfImage (메모리 적재 크기)
+    raw_size: Optional[int]
+
+
+def _parse_pe(buf, off: int, hi: int) -> Optional[Tuple[str, int, int, Optional[int]]]:
+    """
+    buf[off] 의 'MZ' 가 실제 DOS/PE 헤더인지 O(1) 검증 (복사 없이 struct.unpack_from).
+      e_lfanew → 정확히 그 위치의 'PE\0\0' → Machine / NumberOfSections → OptionalHeader magic
+    통과하면 (machine, 섹션 수, SizeOfImage, 디스크상 크기) 반환, 아니면 None.
+    """
+    if off + 0x40 > hi:
+        return None
+    lfanew = struct.unpack_from("<I", buf, off + 0x3C)[0]
+    if lfanew < 0x40 or lfanew > _PE_MAX_LFANEW:
+        return None
+    pe = off + lfanew
+    if pe + 24 + 64 > hi or buf[pe:pe + 4] != b"PE\x00\x00":
+        return None
+    machine, n_sec = struct.unpack_from("<HH", buf, pe + 4)
+    opt_size = struct.unpack_from("<H", buf, pe + 20)[0]
+    if machine not in _PE_MACHINES or not 0 < n_sec <= 96 or opt_size < 64:
+        return None
+    opt = pe + 24
+    if struct.unpack_from("<H", buf, opt)[0] not in _PE_OPT_MAGIC:
+        return None
+    image_size, headers_size = struct.unpack_from("<II", buf, opt + 56)
+
+    # 섹션 표: 디스크상 끝 = max(PointerToRawData + SizeOfRawData)
+    raw_size = None
+    sec = opt + opt_size
+    if sec + n_sec * 40 <= hi:
+        raw_size = headers_size
+        for i in range(n_sec):
+            size, ptr = struct.unpack_from("<II", buf, sec + i * 40 + 16)
+            if size:
+                raw_size = max(raw_size, ptr + size)
+    return _PE_MACHINES[machine], n_sec, image_size, raw_size
+
+
+def _is_word(c) -> bool:
+    if isinstance(c, int):
+        return c == 0x5F or 0x30 <= c <= 0x39 or 0x41 <= c <= 0x5A or 0x61 <= c <= 0x7A
+    return c == "_" or c.isalnum()
+
+
+def _utf8_name(raw: bytes, start: int) -> Optional[Tuple[bytes, int]]:
     """
-    간단 휴리스틱:
-      - 'MZ' 서명 존재
-      - 근처에 'PE\\x00\\x00' 또는 'This program cannot be run in DOS mode' 문자열 존재
+    바이트 매치에서 UTF-8 로 읽어 유니코드 \\w 인 이름 부분만 남긴다 (예전 decode 후 매칭과 같은 결과).
+    (남긴 바이트, 그 시작 오프셋) 또는 이름이 없으면 None
     """
+    if raw.isascii():
+        return raw, start
+    name = raw.decode("utf-8", "surrogateescape")
+    m = _TXT.double_ext_tail.search(name)
+    if m is None:
+        return None
+    cut = len(name[:m.start()].encode("utf-8", "surrogateescape"))
+    return raw[cut:], start + cut
+
+
+def _as_text(v) -> str:
+    return v if isinstance(v, str) else v.decode(errors="ignore")
+
+
+def _hit_bytes(raw) -> Tuple[str, int]:
+    """TokenHit.raw → (Hit.match, 스트림 상 바이트 길이). bytes 는 latin1 로 1:1 보존"""
+    if isinstance(raw, str):
+        return raw, len(raw.encode("utf-16-le", "surrogatepass"))
+    return raw.decode("latin1"), len(raw)
+
+
+def _inflate(chunks: Iterable[bytes], name: str) -> Iterator[bytes]:
+    """
+    raw deflate(HWP 압축 스트림)를 chunk 단위로 점진적으로 풀어낸다 (출력도 _CHUNK 단위로 제한).
+    첫 chunk 부터 deflate 가 아니면 비압축 스트림으로 보고 원본을 그대로 넘긴다.
+    """
+    it = iter(chunks)
+    first = next(it, b"")
+    d = zlib.decompressobj(-15)
+    try:
+        out = d.decompress(first, _CHUNK)
+    except zlib.error:
+        yield first
+        yield from it
+        return
     try:
-        data = _read_bytes(file_path)
-        idx = 0
-        hit_offsets: List[int] = []
         while True:
-            off = data.find(b"MZ", idx)
-            if off == -1:
+            if out:
+                yield out
+            if d.unconsumed_tail:
+                out = d.decompress(d.unconsumed_tail, _CHUNK)
+                continue
+            if d.eof:
+                return
+            nxt = next(it, None)
+            if nxt is None:
                 break
-            # 합리성 체크
-            window = data[off:off+4096]
-            if (b"PE\x00\x00" in window) or (b"This program cannot be run in DOS mode" in window):
-                hit_offsets.append(off)
-            idx = off + 2
+            out = d.decompress(nxt, _CHUNK)
+        tail = d.flush()
+        if tail:
+            yield tail
+    except zlib.error:
+        _logger.debug("inflate failed stream=%s", name, exc_info=True)
+
+
+# BMP 밖 문자: UTF-16 에서는 서로게이트 쌍(2 code unit = 4바이트)인데 디코드된 str 에서는 한 글자
+_ASTRAL = re.compile("[\U00010000-\U0010FFFF]")
+
+
+class _Feed:
+    """HwpScan.feed 한 갈래의 상태: 패턴 + 앞 chunk 꼬리(carry) 이어 붙이기"""
+    __slots__ = ("pats", "scale", "carry", "skip", "base", "wide", "wide_before")
+
+    def __init__(self, pats: _Patterns, scale: int, empty):
+        self.pats = pats
+        self.scale = scale   # 버퍼 인덱스 → 스트림 바이트 오프셋 배수 (UTF-16 텍스트면 2)
+        self.carry = empty
+        self.skip = 0        # carry 중 이미 처리한 앞부분(뒤쪽 확인용으로만 유지)
+        self.base = 0        # carry[0] 의 스트림 기준 인덱스
+        # UTF-16 텍스트: carry 이후 BMP 밖 문자의 스트림 기준 인덱스 (오름차순) + carry 앞에서 버린 개수
+        self.wide: Optional[List[int]] = [] if isinstance(empty, str) else None
+        self.wide_before = 0
+
+    def offset(self, i: int) -> int:
+        """스트림 기준 인덱스 i → 스트림 바이트 오프셋 (BMP 밖 문자는 code unit 2개로 센다)"""
+        if self.wide is None:
+            return i * self.scale
+        return (i + self.wide_before + bisect.bisect_left(self.wide, i)) * self.scale
+
+    def trim(self) -> None:
+        """carry 앞으로 밀려난 BMP 밖 문자 위치는 개수만 남긴다"""
+        n = bisect.bisect_left(self.wide, self.base)
+        if n:
+            self.wide_before += n
+            del self.wide[:n]
+
+
+def _offset(feed: Optional[_Feed], i: int) -> int:
+    return feed.offset(i) if feed is not None else i
+
+
+class HwpScan:
+    """
+    scan_hwp 한 번에 공유되는 스캔 결과. 스트림(또는 원시 파일)을 chunk 단위로 받아 누적한다.
+      - pe_hits    : 헤더 검증을 통과한 PE 이미지 [PeHit, ...]
+      - eps        : EPS 마커(%!PS, EPSF-) 위치 [TokenHit, ...]
+      - double_ext : 이중 확장자 매치 [TokenHit, ...]
+      - raw_ip     : 원시 IP 링크 [TokenHit, ...]
+    규칙마다 발견 순서대로 MAX_HITS 개까지 모은다 (상한에 닿은 규칙은 더 확인하지 않음).
+    stream 은 CFB 스트림 경로, 원시 파일 스캔이면 None.
+    first_hit=True 면 어느 규칙이든 첫 적중에서 스캔을 멈춘다 (verdict 모드).
+    want 는 확인할 규칙 키 집합 (기본: 전부). 꺼진 규칙의 후보 확인은 건너뛴다.
+    """
+    __slots__ = ("bytes_scanned", "streams", "pe_hits", "eps", "double_ext", "raw_ip", "first_hit",
+                 "_w_pe", "_w_eps", "_w_de", "_w_ip")
+
+    def __init__(self, first_hit: bool = False, want: Optional[Iterable[str]] = None):
+        want = set(_SWEEP_KEYS if want is None else want)
+        self._w_pe = "PE_MZ" in want
+        self._w_eps = "EPS_PS" in want
+        self._w_de = "DOUBLE_EXT" in want
+        self._w_ip = "RAW_IP" in want
+        self.first_hit = first_hit
+        self.bytes_scanned = 0
+        self.streams: List[str] = []
+        self.pe_hits: List[PeHit] = []
+        self.eps: List[TokenHit] = []
+        self.double_ext: List[TokenHit] = []
+        self.raw_ip: List[TokenHit] = []
+
+    def hit_key(self) -> Optional[str]:
+        """적중한 규칙 키 하나 (없으면 None)"""
+        if self.pe_hits:
+            return "PE_MZ"
+        if self.eps:
+            return "EPS_PS"
+        if self.double_ext:
+            return "DOUBLE_EXT"
+        if self.raw_ip:
+            return "RAW_IP"
+        return None
+
+    @property
+    def done(self) -> bool:
+        """first_hit 모드에서 더 볼 필요가 없는지"""
+        return self.first_hit and self.hit_key() is not None
+
+    def reset(self) -> None:
+        """지금까지 모은 적중을 버린다 (컨테이너가 깨져 원시 파일 스캔으로 다시 할 때)"""
+        self.streams.clear()
+        self.pe_hits.clear()
+        self.eps.clear()
+        self.double_ext.clear()
+        self.raw_ip.clear()
+
+    # ---- chunk 공급 ----
+    def feed(self, chunks: Iterable[bytes], stream: Optional[str] = None, text: bool = False) -> None:
+        """
+        chunks 를 순서대로 스캔. 앞 chunk 의 꼬리(_OVERLAP)를 이어 붙여 경계 걸친 매치도 잡는다.
+        text=True 면 UTF-16LE 로 디코드한 텍스트에서 텍스트 규칙(이중 확장자/원시 IP)을,
+        같은 바이트에서 바이너리 규칙(MZ/EPS)을 함께 실행 (본문/스크립트 스트림에 숨긴 PE/EPS)
+        """
+        if stream:
+            self.streams.append(stream)
+        if text:
+            dec = codecs.getincrementaldecoder("utf-16-le")("replace")
+            txt: Optional[_Feed] = _Feed(_TXT, 2, "")
+            raw = _Feed(_MARK, 1, b"")
+        else:
+            txt = None
+            raw = _Feed(_BIN, 1, b"")
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if self.done:
+                return
+            self.bytes_scanned += len(chunk)
+            if txt is not None:
+                self._push(txt, dec.decode(chunk), stream)
+            self._push(raw, chunk, stream)
+        if txt is not None:
+            self._push(txt, dec.decode(b"", final=True), stream)
+            self._flush(txt, stream)
+        self._flush(raw, stream)
+
+    def _push(self, f: "_Feed", chunk, stream: Optional[str]) -> None:
+        if not chunk or self.done:
+            return
+        if f.wide is not None:
+            at = f.base + len(f.carry)
+            f.wide.extend(at + m.start() for m in _ASTRAL.finditer(chunk))
+        buf = f.carry + chunk if f.carry else chunk
+        limit = len(buf) - _OVERLAP  # 이후 앵커는 다음 chunk 와 이어서 처리
+        if limit <= f.skip:
+            f.carry = buf
+            return
+        self._sweep(buf, f.skip, limit, f.base, stream, f.pats, f)
+        cut = max(0, limit - _NAME_WINDOW)
+        f.carry = buf[cut:]
+        f.skip = limit - cut
+        f.base += cut
+        if f.wide:
+            f.trim()
+
+    def _flush(self, f: "_Feed", stream: Optional[str]) -> None:
+        if len(f.carry) > f.skip and not self.done:
+            self._sweep(f.carry, f.skip, len(f.carry), f.base, stream, f.pats, f)
 
-        if hit_offsets:
+    def feed_view(self, buf, start: int, length: int, stream: Optional[str] = None) -> None:
+        """
+        이미 메모리에 있는(또는 mmap 된) 버퍼의 [start, start+length) 구간을 복사 없이 바로 스캔.
+        오프셋은 구간 시작 기준. 앞뒤 확인도 구간 밖으로 나가지 않는다.
+        """
+        if stream:
+            self.streams.append(stream)
+        self.bytes_scanned += length
+        end = start + length
+        drop = isinstance(buf, mmap.mmap) and hasattr(mmap, "MADV_DONTNEED")
+        pos = start
+        dropped = (start // mmap.PAGESIZE) * mmap.PAGESIZE
+        while pos < end and not self.done:
+            # 창 단위로 스캔하고 지나간 페이지는 매핑에서 내려 RSS 를 창 크기로 유지
+            limit = min(end, pos + _VIEW_WINDOW)
+            self._sweep(buf, pos, limit, -start, stream, _BIN, None, lo=start, hi=end)
+            if drop:
+                upto = (max(start, limit - _NAME_WINDOW) // mmap.PAGESIZE) * mmap.PAGESIZE
+                if upto > dropped:
+                    buf.madvise(mmap.MADV_DONTNEED, dropped, upto - dropped)
+                    dropped = upto
+            pos = limit
+
+    # ---- 앵커 sweep ----
+    def _want(self, on: bool, hits: list) -> bool:
+        return on and len(hits) < MAX_HITS
+
+    def _anchors_done(self, pats: _Patterns) -> bool:
+        """pats 의 MZ 외 앵커 규칙이 모두 꺼졌거나 상한에 닿았는지 (그러면 MZ 만 찾으면 된다)"""
+        eps = self._want(self._w_eps, self.eps)
+        if pats is _MARK:
+            return not eps
+        txt = self._want(self._w_de, self.double_ext) or self._want(self._w_ip, self.raw_ip)
+        if pats is _TXT:
+            return not txt
+        return not (txt or eps)
+
+    def _sweep(self, buf: bytes, start: int, limit: int, base: int,
+               stream: Optional[str], pats: _Patterns, feed: Optional[_Feed],
+               lo: int = 0, hi: Optional[int] = None) -> None:
+        # feed: 인덱스 → 바이트 오프셋 변환 (None 이면 버퍼 인덱스 그대로)
+        # lo/hi: 앞뒤 확인이 넘지 말아야 할 버퍼 경계 (기본은 버퍼 전체)
+        hi = len(buf) if hi is None else hi
+        if not self._anchors_done(pats):
+            pos = None
+            # 앵커 검색은 limit 직후에서 끊는다 (mmap 창 단위 스캔이 다음 앵커까지 스트림 끝으로 달려가지 않게)
+            for m in pats.anchor.finditer(buf, start, min(hi, limit + _ANCHOR_MAX - 1)):
+                s = m.start()
+                if s >= limit:
+                    break
+                tok = m.group(0)
+                if tok == b"MZ":
+                    if self._want(self._w_pe, self.pe_hits):
+                        self._check_mz(buf, s, base, stream, hi)
+                        if self.first_hit and self.pe_hits:
+                            return
+                    continue
+                if tok in (b"://", "://"):
+                    if self._want(self._w_ip, self.raw_ip):
+                        self._check_raw_ip(pats, buf, s, base, stream, feed, lo, hi)
+                elif tok in (b"%!PS", b"EPSF-"):
+                    if self._want(self._w_eps, self.eps):
+                        self.eps.append(TokenHit(tok, stream, base + s))
+                elif self._want(self._w_de, self.double_ext):
+                    self._check_double_ext(pats, buf, s, base, stream, feed, lo, hi)
+                if self.done:
+                    return
+                # 텍스트 규칙이 모두 상한에 닿으면 나머지는 MZ 만 찾으면 된다
+                if self._anchors_done(pats):
+                    pos = m.end()
+                    break
+            if pos is None:
+                return
+        else:
+            pos = start
+        if pats is _TXT:
+            return
+        while self._want(self._w_pe, self.pe_hits):
+            off = buf.find(b"MZ", pos, limit + 1)
+            if off == -1 or off >= limit:
+                return
+            self._check_mz(buf, off, base, stream, hi)
+            if self.first_hit and self.pe_hits:
+                return
+            pos = off + 2
+
+    def _check_mz(self, buf: bytes, off: int, base: int, stream: Optional[str], hi: int) -> None:
+        pe = _parse_pe(buf, off, hi)
+        if pe is not None:
+            self.pe_hits.append(PeHit(stream, base + off, *pe))
+
+    def _check_double_ext(self, pats: _Patterns, buf, anchor: int, base: int,
+                          stream: Optional[str], feed: Optional[_Feed], lo: int, hi: int) -> None:
+        end = anchor + 4
+        if end < hi and _is_word(buf[end]):
+            return  # 끝 \b 불만족
+        m = pats.double_ext_tail.search(buf, max(lo, anchor - _NAME_WINDOW), end)
+        if m is None:
+            return
+        tok, start = m.group(0), m.start()
+        if pats is not _TXT:
+            named = _utf8_name(tok, start)
+            if named is None:
+                return
+            tok, start = named
+        self.double_ext.append(TokenHit(tok, stream, _offset(feed, base + start)))
+
+    def _check_raw_ip(self, pats: _Patterns, buf, anchor: int, base: int,
+                      stream: Optional[str], feed: Optional[_Feed], lo: int, hi: int) -> None:
+        for scheme in pats.schemes:
+            start = anchor - len(scheme)
+            if start >= lo and buf[start:anchor].lower() == scheme:
+                m = pats.raw_ip.match(buf, start, hi)
+                if m:
+                    self.raw_ip.append(TokenHit(m.group(0), stream, _offset(feed, base + start)))
+                return
+
+
+# --- HWP 5.x 컨테이너: 스트림마다 (필요 시) 풀어서 스캔 ---
+# 스트림별 처리 방식 (접두어, UTF-16 텍스트 스트림 여부, FileHeader 압축 플래그 적용 여부).
+# 여기 없는 스트림(DocOptions/_LinkDoc 등)도 저장된 바이트 그대로 바이너리 규칙으로 스캔한다.
+_STREAM_PLAN = [
+    ("BinData/", False, True),
+    ("BodyText/", True, True),
+    ("DocInfo", True, True),
+    ("Scripts/", True, True),
+    ("PrvText", True, False),
+]
+_HWP_SIGNATURE = b"HWP Document File"
+
+
+def _stream_plan(path: str) -> Optional[Tuple[bool, bool]]:
+    for prefix, text, compressible in _STREAM_PLAN:
+        if path == prefix or path.startswith(prefix):
+            return text, compressible
+    return None
+
+
+def stream_layout(path: str, compressed: bool) -> Optional[Tuple[bool, bool]]:
+    """
+    _STREAM_PLAN 의 스트림이면 (UTF-16 텍스트 여부, deflate 로 풀어야 하는지), 아니면 None
+    (None 이면 스캐너/클린업 모두 저장된 바이트 그대로 바이너리로 다룬다)
+    """
+    plan = _stream_plan(path)
+    if plan is None:
+        return None
+    text, compressible = plan
+    return text, compressed and compressible
+
+
+def _file_header(cfb: cfb_reader.CfbReader) -> Optional[bytes]:
+    """HWP 서명이 있는 FileHeader 스트림 (없거나 체인이 깨졌으면 None)"""
+    try:
+        head = cfb.read_stream("FileHeader")
+    except (KeyError, cfb_reader.CfbError):
+        return None
+    return head if head.startswith(_HWP_SIGNATURE) and len(head) >= 40 else None
+
+
+def is_compressed(cfb: cfb_reader.CfbReader) -> bool:
+    """FileHeader 속성 bit0 = 스트림 압축 여부"""
+    head = _file_header(cfb)
+    return head is not None and bool(struct.unpack_from("<I", head, 36)[0] & 0x1)
+
+
+def _iter_file(fp: BinaryIO) -> Iterator[bytes]:
+    fp.seek(0)
+    while True:
+        chunk = fp.read(_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+# --- 입력 매핑: 경로/실제 파일은 mmap, 메모리 바이트는 그대로 (전체 읽기 없이 find/정규식 직접 실행) ---
+USE_MMAP = os.getenv("HWP_MMAP", "1") != "0"
+
+@contextlib.contextmanager
+def _map_source(src):
+    """
+    스캔 가능한 버퍼(find/정규식 지원)를 내준다.
+      - bytes/bytearray: 그대로
+      - memoryview: 원본 객체가 통째로 bytes 면 그것, 아니면 복사
+      - 경로 / fileno 있는 파일 객체: 읽기 전용 mmap (페이지는 OS 가 필요할 때만 올림)
+      - 그 외(BytesIO 등 fileno 없는 객체, mmap 불가, HWP_MMAP=0): None → chunk 읽기 경로
+    """
+    if isinstance(src, (bytes, bytearray)):
+        yield src
+        return
+    if isinstance(src, memoryview):
+        obj = src.obj
+        yield obj if isinstance(obj, bytes) and src.nbytes == len(obj) else src.tobytes()
+        return
+    if not USE_MMAP:
+        yield None
+        return
+    if _is_filelike(src):
+        try:
+            fd = src.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            yield None
+            return
+        with _mmap_fd(fd) as mm:
+            yield mm
+        return
+    with open(src, "rb") as f, _mmap_fd(f.fileno()) as mm:
+        yield mm
+
+@contextlib.contextmanager
+def _mmap_fd(fd: int):
+    try:
+        mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    except ValueError:      # 빈 파일
+        yield b""
+        return
+    except OSError:         # 파이프/특수 파일 등 매핑 불가
+        _logger.debug("mmap failed fd=%d, fallback to reads", fd, exc_info=True)
+        yield None
+        return
+    try:
+        yield mm
+    finally:
+        mm.close()
+
+
+def scan_container(src, first_hit: bool = False, want: Optional[Iterable[str]] = None) -> HwpScan:
+    """
+    입력이 OLE/CFB 면 BinData/BodyText 등 관련 스트림만 점진적으로 inflate 해서 스캔하고,
+    CFB 가 아니면(HWP 3.x, 임의 바이너리) 파일 전체를 스캔한다.
+    경로/바이트 입력은 매핑된 버퍼 위에서 바로 찾으므로(원시 파일, 연속 배치된 비압축 스트림)
+    파일 크기만큼 메모리에 올리지 않는다. 나머지 스트림은 chunk + FAT/디렉터리 크기로 제한.
+    first_hit=True 면 작은 스트림부터 보고 첫 적중에서 멈춘다. want 로 확인할 규칙 키를 제한.
+    """
+    scan = HwpScan(first_hit, want)
+    with _map_source(src) as view:
+        if view is None:
+            with _open_source(src) as fp:
+                _scan_fp(scan, fp, None, src)
+        else:
+            fp = view if isinstance(view, mmap.mmap) else io.BytesIO(view)
+            _scan_fp(scan, fp, view, src)
+    return scan
+
+
+def _scan_raw(scan: HwpScan, fp: BinaryIO, view) -> None:
+    if view is not None:
+        scan.feed_view(view, 0, len(view))
+    else:
+        scan.feed(_iter_file(fp))
+
+
+def _checked(chunks: Iterable[bytes], entry: cfb_reader.CfbEntry) -> Iterator[bytes]:
+    """섹터 체인이 디렉터리의 스트림 크기보다 일찍 끝나면 CfbError (깨진 FAT → 원시 스캔으로)"""
+    got = 0
+    for chunk in chunks:
+        got += len(chunk)
+        yield chunk
+    if got < entry.size:
+        raise cfb_reader.CfbError(f"stream {entry.path} ends at {got} of {entry.size} bytes")
+
+
+def _scan_fp(scan: HwpScan, fp: BinaryIO, view, src) -> None:
+    try:
+        cfb = cfb_reader.CfbReader(fp)
+    except cfb_reader.CfbError:
+        _logger.debug("not a compound file, raw scan %s", _src_name(src))
+        _scan_raw(scan, fp, view)
+        return
+    entries = cfb.streams()
+    # 스트림이 없거나 FileHeader 가 HWP 가 아니면 디렉터리/FAT 를 믿을 수 없다 → 파일 전체를 원시 스캔
+    if not entries or _file_header(cfb) is None:
+        _logger.info("inconsistent compound file (streams=%d), raw scan %s", len(entries), _src_name(src))
+        _scan_raw(scan, fp, view)
+        return
+    compressed = is_compressed(cfb)
+    _logger.debug("cfb streams=%d compressed=%s", len(entries), compressed)
+    try:
+        _scan_streams(scan, cfb, entries, compressed, view)
+    except cfb_reader.CfbError as e:
+        # 스캔 도중 깨진 체인: 스트림 단위 결과를 버리고 파일 전체를 원시 스캔
+        _logger.info("broken compound file (%s), raw scan %s", e, _src_name(src))
+        scan.reset()
+        _scan_raw(scan, fp, view)
+
+
+def _scan_streams(scan: HwpScan, cfb: cfb_reader.CfbReader, entries: List[cfb_reader.CfbEntry],
+                  compressed: bool, view) -> None:
+    if scan.first_hit:
+        entries = sorted(entries, key=lambda e: e.size)  # 싼(작은) 스트림부터
+    for entry in entries:
+        if scan.done:
+            break
+        text, packed = stream_layout(entry.path, compressed) or (False, False)
+        if view is not None and not text and not packed:
+            runs = cfb.stream_runs(entry)
+            if len(runs) == 1:
+                # 연속 배치된 비압축 바이너리 스트림: 매핑된 버퍼에서 바로 스캔
+                off, length = runs[0]
+                scan.feed_view(view, off, length, entry.path)
+                continue
+        chunks = _checked(cfb.iter_stream(entry, _CHUNK), entry)
+        if packed:
+            chunks = _inflate(chunks, entry.path)
+        scan.feed(chunks, entry.path, text=text)
+
+
+def _as_scan(src) -> HwpScan:
+    """규칙 입력 정규화: 이미 만든 HwpScan 이면 그대로, 아니면 한 번 스캔"""
+    if isinstance(src, HwpScan):
+        return src
+    return scan_container(src)
+
+def _token_detection(key: str, hits: List[TokenHit], keyword: str) -> Dict:
+    """TokenHit 목록 → Detection dict (match 는 찾은 바이트, length 는 스트림 상 바이트 수)"""
+    attack = _label(key)
+    out = []
+    for h in hits:
+        match, nbytes = _hit_bytes(h.raw)
+        out.append(Hit(h.offset, nbytes, h.stream, match=match))
+    det = Detection(key, attack, keyword, _summarize_intent(attack, keyword), out, len(hits) >= MAX_HITS)
+    return det.to_dict()
+
+# --- 1) BinData 내 PE(MZ) 실행파일 삽입 검출(바이너리 시그니처 휴리스틱) ---
+def hwp_pe_mz(file_path) -> Optional[Dict]:
+    """
+    DOS/PE 헤더 검증:
+      - 'MZ' 의 e_lfanew 가 가리키는 정확한 위치에 'PE\\x00\\x00'
+      - Machine / NumberOfSections / OptionalHeader magic 이 정상 범위
+    모든 이미지를 hits 로, 각 이미지의 디스크상 크기를 length 로 보고한다
+    (클린업 단계에서 이미지 전체를 지울 수 있게. 섹션 표가 잘려 크기를 모르면 'MZ' 2바이트).
+    """
+    try:
+        hits = _as_scan(file_path).pe_hits
+        if hits:
+            first = hits[0]
             attack = _label("PE_MZ")
-            keyword = f"MZ at {hit_offsets[0]} (hits={len(hit_offsets)})"
-            intent = _summarize_intent(attack, keyword)
-            return {"attack": attack, "keyword": keyword, "intent": intent}
+            keyword = f"MZ at {_loc(first.stream, first.offset)} (hits={len(hits)})"
+            det = Detection("PE_MZ", attack, keyword, _summarize_intent(attack, keyword), [
+                Hit(h.offset, h.raw_size or 2, h.stream, match="MZ",
+                    meta={"image_size": h.image_size, "machine": h.machine, "sections": h.sections})
+                for h in hits
+            ], len(hits) >= MAX_HITS)
+            return det.to_dict()
     except Exception:
         return None
     return None
 
 # --- 2) EPS/PS(PostScript) 포함 (시그니처: %!PS, EPSF-) ---
-def hwp_eps_ps(file_path: str) -> Optional[Dict]:
+def hwp_eps_ps(file_path) -> Optional[Dict]:
     try:
-        data = _read_bytes(file_path)
-        # 대표 시그니처
-        markers = [b"%!PS", b"%!PS-Adobe", b"EPSF-"]
-        for m in markers:
-            off = data.find(m)
-            if off != -1:
-                attack = _label("EPS_PS")
-                keyword = f"{m.decode(errors='ignore')} at {off}"
-                intent = _summarize_intent(attack, keyword)
-                return {"attack": attack, "keyword": keyword, "intent": intent}
+        eps = _as_scan(file_path).eps
+        if eps:
+            # 마커 선호 순서(_EPS_MARKERS)대로, 같은 마커는 위치 순 → keyword/대표 위치는 첫 항목
+            hits = sorted(eps, key=lambda h: _EPS_MARKERS.index(h.raw))
+            first = hits[0]
+            keyword = f"{first.raw.decode(errors='ignore')} at {_loc(first.stream, first.offset)}"
+            if len(hits) > 1:
+                keyword += f" (hits={len(hits)})"
+            return _token_detection("EPS_PS", hits, keyword)
     except Exception:
         return None
     return None
 
 # --- 3) 이중 확장자 첨부파일 (…pdf.exe, …hwp.exe 등) ---
-_DOUBLE_EXT_RX = re.compile(
-    r"\b[\w\-]+\.(?:docx|xlsx|pptx|pdf|hwp|txt|jpg|png)\.exe\b",
-    re.IGNORECASE
-)
-
-def hwp_double_ext(file_path: str) -> Optional[Dict]:
+def hwp_double_ext(file_path) -> Optional[Dict]:
     try:
-        data = _read_bytes(file_path)
-        text = data.decode(errors="ignore")
-        m = _DOUBLE_EXT_RX.search(text)
-        if m:
-            attack = _label("DOUBLE_EXT")
-            keyword = m.group(0)
-            intent = _summarize_intent(attack, keyword)
-            return {"attack": attack, "keyword": keyword, "intent": intent}
+        hits = _as_scan(file_path).double_ext
+        if hits:
+            return _token_detection("DOUBLE_EXT", hits, _as_text(hits[0].raw))
     except Exception:
         return None
     return None
 
 # --- 4) 원시 IP 기반 외부 링크 ---
-_RAW_IP_RX = re.compile(
-    r"(?:https?|ftp)://(?:\d{1,3}\.){3}\d{1,3}(?::\d{1,5})?(?:/[^\s\"'<>\)]*)?",
-    re.IGNORECASE
-)
-
-def hwp_raw_ip(file_path: str) -> Optional[Dict]:
+def hwp_raw_ip(file_path) -> Optional[Dict]:
     try:
-        data = _read_bytes(file_path)
-        text = data.decode(errors="ignore")
-        m = _RAW_IP_RX.search(text)
-        if m:
-            attack = _label("RAW_IP")
-            keyword = m.group(0)
-            intent = _summarize_intent(attack, keyword)
-            return {"attack": attack, "keyword": keyword, "intent": intent}
+        hits = _as_scan(file_path).raw_ip
+        if hits:
+            return _token_detection("RAW_IP", hits, _as_text(hits[0].raw))
     except Exception:
         return None
     return None
 
+# --- 규칙 등록: 네 규칙 모두 같은 sweep(HwpScan) 결과를 공유 ---
+_SWEEP_KEYS = ("PE_MZ", "EPS_PS", "DOUBLE_EXT", "RAW_IP")
+rules.register("hwp", "PE_MZ", hwp_pe_mz, rules.COST_SWEEP, (rules.NEED_SWEEP,))
+rules.register("hwp", "EPS_PS", hwp_eps_ps, rules.COST_SWEEP, (rules.NEED_SWEEP,))
+rules.register("hwp", "DOUBLE_EXT", hwp_double_ext, rules.COST_SWEEP, (rules.NEED_SWEEP,))
+rules.register("hwp", "RAW_IP", hwp_raw_ip, rules.COST_SWEEP, (rules.NEED_SWEEP,))
+
 # 로거 설정: stderr로만 출력 (stdout의 JSON과 분리)
 _logger = logging.getLogger("hwp_detect")
 if not _logger.handlers:
@@ -163,26 +800,67 @@ def _log_start():
 		_logger.debug("pre-log failed", exc_info=True)
 
 # ---- 메인 스캐너 ----
-def scan_hwp(file_path: str) -> List[Dict]:
-    checks = [hwp_pe_mz, hwp_eps_ps, hwp_double_ext, hwp_raw_ip]
+def scan_hwp(file_path) -> List[Dict]:
+    plan = rules.plan("hwp")
     findings: List[Dict] = []
-    for fn in checks:
+    if not plan:
+        return findings
+    # 컨테이너를 한 번만 훑고(켜진 규칙만 확인), 그 결과를 모든 규칙이 공유
+    _logger.debug("sweep %s", _src_name(file_path))
+    t0 = time.perf_counter()
+    scan = scan_container(file_path, want=[r.key for r in plan])
+    # 바이트를 실제로 훑는 건 공유 sweep 한 번 → 시간/바이트/스트림 수는 "sweep" 항목에,
+    # 규칙별 항목은 sweep 결과 확인(적중 여부)만
+    metrics.record_rule("hwp", "sweep", time.perf_counter() - t0, None,
+                        scan.bytes_scanned, len(scan.streams))
+    for rule in plan:
+        fn = rule.func
+        res = None
+        t0 = time.perf_counter()
         try:
             _logger.debug("run %s", fn.__name__)
-            res = fn(file_path)
+            res = fn(scan)
             _logger.debug("%s -> %s", fn.__name__, "HIT" if res else "MISS")
             if res:
                 findings.append(res)
         except Exception:
             _logger.exception("%s error", fn.__name__)
-            continue
-    _logger.info("scan done file=%s hits=%d", file_path, len(findings))
+        metrics.record_rule("hwp", rule.key, time.perf_counter() - t0, bool(res))
+    _logger.info("scan done file=%s hits=%d", _src_name(file_path), len(findings))
     try:
         sys.stderr.flush()
     except Exception:
         pass
     return findings
 
+# ---- verdict 모드: 악성/정상 판정만 (첫 적중에서 멈추고 라벨/intent 생략) ----
+def verdict_hwp(file_path) -> Dict:
+    """
+    {"malicious": bool, "rule": 적중 규칙 키 또는 None, "keyword": 적중 토큰}
+    스캔 자체가 실패하면 예외를 그대로 올린다 (정상으로 판정해 캐시되지 않게, 호출자가 error 결과로 만든다)
+    """
+    want = [r.key for r in rules.plan("hwp")]
+    if not want:
+        return {"malicious": False, "rule": None}
+    t0 = time.perf_counter()
+    scan = scan_container(file_path, first_hit=True, want=want)
+    key = scan.hit_key()
+    metrics.record_rule("hwp", "sweep", time.perf_counter() - t0, key is not None,
+                        scan.bytes_scanned, len(scan.streams))
+    if key is None:
+        return {"malicious": False, "rule": None}
+    if key == "PE_MZ":
+        h = scan.pe_hits[0]
+        keyword = f"MZ at {_loc(h.stream, h.offset)}"
+    elif key == "EPS_PS":
+        h = scan.eps[0]
+        keyword = f"{h.raw.decode(errors='ignore')} at {_loc(h.stream, h.offset)}"
+    elif key == "DOUBLE_EXT":
+        keyword = _as_text(scan.double_ext[0].raw)
+    else:
+        keyword = _as_text(scan.raw_ip[0].raw)
+    return {"malicious": True, "rule": key, "keyword": keyword}
+
 if __name__ == "__main__":
 	_log_start()
 	try:
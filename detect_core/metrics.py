@@ -0,0 +1,201 @@
+# metrics.py
+"""
+규칙별 계측 (실행 시간 / 본 바이트 / 파싱한 파트 / 적중 여부 / 캐시 적중)
+- 디텍터가 record_rule() 로 남기면 프로세스 누적 레지스트리 + 진행 중인 스캔(collect) 양쪽에 쌓인다
+- 규칙 키 외에 공유 단계도 항목으로 남긴다: hwp "sweep" (컨테이너 바이트 단일 sweep), docx "open" (zip 디렉터리)
+- 프로세스 풀 워커의 수치는 결과에 실려 부모 레지스트리로 합쳐진다 (merge)
+- 내보내기:
+    DETECT_METRICS_FILE=경로        Prometheus 텍스트 형식 파일 (node_exporter textfile collector 용)
+    DETECT_METRICS_INTERVAL=10      파일 갱신 최소 간격(초)
+    DETECT_METRICS_IN_RESULT=1      scan_file 결과에 "metrics" (이번 스캔 규칙별 수치) 포함
+  --serve 모드에서는 {"op": "metrics"} 요청으로 JSON/텍스트를 받을 수 있다
+"""
+import atexit
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+PREFIX = "detect"
+IN_RESULT_DEFAULT = os.getenv("DETECT_METRICS_IN_RESULT", "0") == "1"
+_FILE = os.getenv("DETECT_METRICS_FILE") or None
+_INTERVAL = float(os.getenv("DETECT_METRICS_INTERVAL", "10"))
+
+
+class ScanStats:
+    """한 번의 스캔에서 모은 수치 (결과 JSON 에 싣거나 풀 워커 → 부모로 넘김)"""
+
+    __slots__ = ("fmt", "rules", "cache_hit")
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.rules: Dict[str, Dict[str, Any]] = {}
+        self.cache_hit: Optional[bool] = None
+
+    def add(self, name: str, seconds: float, hit: Optional[bool], nbytes: int, parts: int) -> None:
+        self.rules[name] = {
+            "seconds": round(seconds, 6), "hit": hit, "bytes": nbytes, "parts": parts,
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "format": self.fmt,
+            "cache_hit": self.cache_hit,
+            "seconds": round(sum(r["seconds"] for r in self.rules.values()), 6),
+            "bytes": sum(r["bytes"] for r in self.rules.values()),
+            "parts": sum(r["parts"] for r in self.rules.values()),
+            "rules": self.rules,
+        }
+
+
+class Registry:
+    """프로세스 누적 카운터 (스레드 안전)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (fmt, rule) -> [calls, hits, misses, seconds, bytes, parts]  (hit=None 인 공유 단계는 hits/misses 없음)
+        self.rules: Dict[Tuple[str, str], list] = {}
+        # fmt -> [scans, seconds, bytes, parts]
+        self.scans: Dict[str, list] = {}
+        # "hit"/"miss" -> count
+        self.cache: Dict[str, int] = {"hit": 0, "miss": 0}
+
+    def rule(self, fmt: str, name: str, seconds: float, hit: Optional[bool], nbytes: int, parts: int) -> None:
+        with self._lock:
+            row = self.rules.setdefault((fmt, name), [0, 0, 0, 0.0, 0, 0])
+            row[0] += 1
+            if hit is not None:
+                row[1 if hit else 2] += 1
+            row[3] += seconds
+            row[4] += nbytes
+            row[5] += parts
+
+    def scan(self, stats: Dict[str, Any]) -> None:
+        with self._lock:
+            row = self.scans.setdefault(stats["format"], [0, 0.0, 0, 0])
+            row[0] += 1
+            row[1] += stats["seconds"]
+            row[2] += stats["bytes"]
+            row[3] += stats["parts"]
+            if stats.get("cache_hit") is not None:
+                self.cache["hit" if stats["cache_hit"] else "miss"] += 1
+
+    def merge(self, stats: Dict[str, Any]) -> None:
+        """다른 프로세스(풀 워커)가 보낸 ScanStats.as_dict() 를 합친다"""
+        for name, r in stats.get("rules", {}).items():
+            self.rule(stats["format"], name, r["seconds"], r["hit"], r["bytes"], r["parts"])
+        self.scan(stats)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rules": [
+                    {"format": f, "rule": n, "calls": c, "hits": h, "misses": m,
+                     "seconds": round(s, 6), "bytes": b, "parts": p}
+                    for (f, n), (c, h, m, s, b, p) in sorted(self.rules.items())
+                ],
+                "scans": [
+                    {"format": f, "scans": c, "seconds": round(s, 6), "bytes": b, "parts": p}
+                    for f, (c, s, b, p) in sorted(self.scans.items())
+                ],
+                "cache": dict(self.cache),
+            }
+
+    def prometheus_text(self) -> str:
+        snap = self.snapshot()
+        lines = []
+
+        def family(name: str, kind: str, help_: str) -> None:
+            lines.append(f"# HELP {PREFIX}_{name} {help_}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        family("rule_calls_total", "counter", "Rule executions")
+        for r in snap["rules"]:
+            lines.append(f'{PREFIX}_rule_calls_total{{format="{r["format"]}",rule="{r["rule"]}"}} {r["calls"]}')
+        family("rule_results_total", "counter", "Rule outcomes (hit/miss)")
+        for r in snap["rules"]:
+            if r["hits"] + r["misses"] == 0:
+                continue
+            lab = f'format="{r["format"]}",rule="{r["rule"]}"'
+            lines.append(f'{PREFIX}_rule_results_total{{{lab},result="hit"}} {r["hits"]}')
+            lines.append(f'{PREFIX}_rule_results_total{{{lab},result="miss"}} {r["misses"]}')
+        family("rule_seconds_total", "counter", "Wall time spent in each rule")
+        for r in snap["rules"]:
+            lines.append(f'{PREFIX}_rule_seconds_total{{format="{r["format"]}",rule="{r["rule"]}"}} {r["seconds"]}')
+        family("rule_bytes_total", "counter", "Bytes examined by each rule")
+        for r in snap["rules"]:
+            lines.append(f'{PREFIX}_rule_bytes_total{{format="{r["format"]}",rule="{r["rule"]}"}} {r["bytes"]}')
+        family("rule_parts_total", "counter", "Container parts/streams parsed by each rule")
+        for r in snap["rules"]:
+            lines.append(f'{PREFIX}_rule_parts_total{{format="{r["format"]}",rule="{r["rule"]}"}} {r["parts"]}')
+        family("scans_total", "counter", "Scans by format")
+        for s in snap["scans"]:
+            lines.append(f'{PREFIX}_scans_total{{format="{s["format"]}"}} {s["scans"]}')
+        family("scan_seconds_total", "counter", "Detector wall time by format")
+        for s in snap["scans"]:
+            lines.append(f'{PREFIX}_scan_seconds_total{{format="{s["format"]}"}} {s["seconds"]}')
+        family("cache_requests_total", "counter", "Result cache lookups")
+        for k, v in snap["cache"].items():
+            lines.append(f'{PREFIX}_cache_requests_total{{result="{k}"}} {v}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_current: "contextvars.ContextVar[Optional[ScanStats]]" = contextvars.ContextVar("detect_scan_stats", default=None)
+_last_write = 0.0
+
+
+def record_rule(fmt: str, name: str, seconds: float, hit: Optional[bool],
+                nbytes: int = 0, parts: int = 0) -> None:
+    """규칙 한 번 실행 결과 기록 (진행 중인 collect() 가 있으면 거기에도)"""
+    REGISTRY.rule(fmt, name, seconds, hit, nbytes, parts)
+    cur = _current.get()
+    if cur is not None:
+        cur.add(name, seconds, hit, nbytes, parts)
+
+
+@contextmanager
+def collect(fmt: str) -> Iterator[ScanStats]:
+    """이 블록 안의 record_rule 을 한 스캔 단위로 모은다. 끝나면 스캔 합계를 레지스트리에 반영"""
+    stats = ScanStats(fmt)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        REGISTRY.scan(stats.as_dict())
+        maybe_write_textfile()
+
+
+def write_textfile(path: str) -> None:
+    """Prometheus textfile (임시 파일에 쓰고 교체 → 수집기가 반쯤 쓴 파일을 읽지 않게)"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.prometheus_text())
+    os.replace(tmp, path)
+
+
+def disable_export() -> None:
+    """풀 워커용: 부모만 파일을 쓴다 (워커 자기 몫만 담긴 파일로 덮어쓰지 않게)"""
+    global _FILE
+    _FILE = None
+
+
+def maybe_write_textfile(force: bool = False) -> None:
+    global _last_write
+    if not _FILE:
+        return
+    now = time.monotonic()
+    if not force and now - _last_write < _INTERVAL:
+        return
+    _last_write = now
+    try:
+        write_textfile(_FILE)
+    except OSError:
+        pass
+
+
+# 단발 실행(CLI)도 종료 시 마지막 값을 남긴다
+atexit.register(maybe_write_textfile, True)
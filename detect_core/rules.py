@@ -0,0 +1,147 @@
+# rules.py
+"""
+탐지 규칙 레지스트리
+- 규칙마다 포맷(hwp/docx), 공격 키, 비용 등급, 필요한 입력을 선언하고 디텍터 모듈 import 시 register() 로 등록
+- 엔진(scan_hwp/scan_docx/verdict_*)은 plan(포맷) 으로 켜진 규칙을 싼 것부터 받아 실행
+- 공격 라벨(영/한)도 여기 한 곳에서 관리
+- 운영 설정(배포별로 비싼 규칙 끄기):
+    DETECT_DISABLE_RULES="CMD,EPS_PS"   (키 또는 함수 이름, 쉼표 구분)
+    DETECT_MAX_COST=2                    (이 등급보다 비싼 규칙은 끔)
+    DETECT_RULES_CONFIG=rules.json       ({"disabled": [...], "max_cost": 2})
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+LOGGER = logging.getLogger("rules")
+
+# --- 비용 등급 (작을수록 싸다) ---
+COST_META = 0    # 컨테이너 메타데이터만 (zip 목록 조회 등)
+COST_PART = 1    # 작은 파트 하나 파싱 (rels 등)
+COST_TEXT = 2    # 본문 파트 전부 파싱/스트리밍
+COST_SWEEP = 3   # 파일(스트림) 전체 바이트 sweep
+
+# --- 필요한 입력 (같은 입력은 포맷별 공유 컨텍스트가 한 번만 만든다: DocxContext / HwpScan) ---
+NEED_ZIP_DIR = "zip:dir"          # zip 중앙 디렉터리
+NEED_ZIP_RELS = "zip:rels"        # word/_rels/*.rels XML
+NEED_TEXT_PARTS = "zip:text"      # 본문/머리글/각주 등 텍스트 XML 파트
+NEED_SWEEP = "bytes:sweep"        # 컨테이너 스트림 바이트 단일 sweep
+
+# --- 공격 라벨 (영문/한글 동시 표기) ---
+ATTACK_LABELS_EN = {
+    "PE_MZ": "HWP: Embedded PE (MZ)",
+    "EPS_PS": "HWP: EPS/PostScript",
+    "DOUBLE_EXT": "HWP: Double-Extension Attachment",
+    "RAW_IP": "HWP: Raw-IP Link",
+    "VBA": "DOCX: Macro (VBA)",
+    "TEMPLATE": "DOCX: External Template",
+    "DDE": "DOCX: Dynamic Data Exchange",
+    "CMD": "DOCX: Suspicious Command",
+}
+ATTACK_LABELS_KO = {
+    "PE_MZ": "HWP: BinData 내 실행파일(MZ) 삽입",
+    "EPS_PS": "HWP: EPS/PS(PostScript) 포함",
+    "DOUBLE_EXT": "HWP: 이중 확장자 첨부파일",
+    "RAW_IP": "HWP: 원시 IP 기반 외부 링크",
+    "VBA": "DOCX: 매크로(VBA)",
+    "TEMPLATE": "DOCX: 외부 템플릿",
+    "DDE": "DOCX: DDE 포함",
+    "CMD": "DOCX: 의심 명령 호출",
+}
+
+
+def label(key: str) -> str:
+    eng = ATTACK_LABELS_EN.get(key, key)
+    kor = ATTACK_LABELS_KO.get(key, key)
+    return f"{eng} / {kor}"
+
+
+def key_from_label(attack: str) -> Optional[str]:
+    """attack 라벨(영/한 혼합 문자열)에서 키 역추출"""
+    for k, en in ATTACK_LABELS_EN.items():
+        if attack.startswith(en):
+            return k
+    for k, ko in ATTACK_LABELS_KO.items():
+        if ko in attack:
+            return k
+    return None
+
+
+@dataclass(frozen=True)
+class Rule:
+    fmt: str                      # "hwp" / "docx"
+    key: str                      # 공격 키 (ATTACK_LABELS_* 의 키)
+    func: Callable                # 전체 결과 규칙: (입력 또는 공유 컨텍스트) -> dict | None
+    cost: int                     # COST_*
+    needs: Tuple[str, ...]        # NEED_*
+    finder: Optional[Callable] = None   # verdict 용: 라벨/intent 없이 Found(keyword, 스니펫, 적중) 만 (docx)
+    seq: int = field(default=0, compare=False)  # 등록 순서 (같은 비용이면 먼저 등록된 것부터)
+
+    @property
+    def name(self) -> str:
+        return self.func.__name__
+
+
+_REGISTRY: Dict[Tuple[str, str], Rule] = {}
+_config: Optional[Dict] = None
+
+
+def register(fmt: str, key: str, func: Callable, cost: int, needs: Tuple[str, ...],
+             finder: Optional[Callable] = None) -> Rule:
+    """규칙 등록 (같은 포맷/키로 다시 등록하면 교체, 순서는 유지)"""
+    old = _REGISTRY.get((fmt, key))
+    seq = old.seq if old is not None else len(_REGISTRY)
+    rule = Rule(fmt, key, func, cost, tuple(needs), finder, seq)
+    _REGISTRY[(fmt, key)] = rule
+    return rule
+
+
+def _load_config() -> Dict:
+    cfg: Dict = {"disabled": set(), "max_cost": None}
+    path = os.getenv("DETECT_RULES_CONFIG")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            cfg["disabled"].update(str(x) for x in raw.get("disabled", []))
+            if raw.get("max_cost") is not None:
+                cfg["max_cost"] = int(raw["max_cost"])
+        except (OSError, ValueError):
+            LOGGER.warning("rules config unreadable path=%s", path, exc_info=True)
+    env = os.getenv("DETECT_DISABLE_RULES", "")
+    cfg["disabled"].update(x.strip() for x in env.split(",") if x.strip())
+    if os.getenv("DETECT_MAX_COST"):
+        cfg["max_cost"] = int(os.getenv("DETECT_MAX_COST"))
+    return cfg
+
+
+def reload_config() -> None:
+    """환경변수/설정 파일 다시 읽기 (다음 plan() 부터 반영)"""
+    global _config
+    _config = None
+
+
+def is_enabled(rule: Rule) -> bool:
+    global _config
+    if _config is None:
+        _config = _load_config()
+    disabled: Set[str] = _config["disabled"]
+    if rule.key in disabled or rule.name in disabled:
+        return False
+    max_cost = _config["max_cost"]
+    return max_cost is None or rule.cost <= max_cost
+
+
+def plan(fmt: str, include_disabled: bool = False) -> List[Rule]:
+    """포맷의 (켜진) 규칙을 싼 것부터"""
+    rules = [r for r in _REGISTRY.values() if r.fmt == fmt]
+    if not include_disabled:
+        rules = [r for r in rules if is_enabled(r)]
+    return sorted(rules, key=lambda r: (r.cost, r.seq))
+
+
+def signature(fmt: str) -> str:
+    """켜진 규칙 키 목록 문자열 (결과 캐시 키에 포함 → 설정이 바뀌면 캐시도 분리)"""
+    return ",".join(r.key for r in plan(fmt))
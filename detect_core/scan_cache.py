@@ -0,0 +1,155 @@
+# scan_cache.py
+"""
+스캔 결과 캐시 (내용 해시 기반)
+- 키: SHA-256(파일 바이트) + 포맷 + 규칙 집합 버전 → 같은 첨부가 다시 와도 재스캔 없이 결과 반환
+- 1차: 프로세스 메모리 LRU (DETECT_CACHE_SIZE, 기본 4096개)
+- 2차(옵션): sqlite 파일 (DETECT_CACHE_DB=경로). 여러 프로세스/재시작 사이에 공유
+- DETECT_CACHE=0 이면 비활성
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+LOGGER = logging.getLogger("scan_cache")
+
+DEFAULT_SIZE = int(os.getenv("DETECT_CACHE_SIZE", "4096"))
+_HASH_CHUNK = 1 << 20
+
+
+def file_digest(data) -> str:
+    """ 바이트(bytes/memoryview) 또는 파일 객체의 SHA-256 hex (파일 객체는 chunk 로 읽고 처음 위치로 되돌림) """
+    if hasattr(data, "read"):
+        h = hashlib.sha256()
+        data.seek(0)
+        for chunk in iter(lambda: data.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+        data.seek(0)
+        return h.hexdigest()
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_key(data, kind: str, version: str, digest: Optional[str] = None) -> str:
+    """
+    바이트(bytes/memoryview) 또는 파일 객체 해시 + 포맷 + 규칙 버전
+    (SHA-256: 하드웨어 가속이 있으면 BLAKE2b 보다 빠름)
+    digest 를 주면 (디렉터리 스캔처럼 이미 해시를 구한 경우) 다시 읽지 않는다
+    """
+    return f"{kind}:{version}:{digest or file_digest(data)}"
+
+
+class ScanCache:
+    """
+    LRU(OrderedDict) + 선택적 sqlite 백엔드. 값은 JSON 직렬화 가능한 dict.
+    스레드 안전 (serve 모드 콜백 스레드 대비). sqlite 연결은 프로세스(pid)별로 새로 연다 (fork 대비).
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_SIZE, db_path: Optional[str] = None):
+        self.max_entries = max(0, max_entries)
+        self.db_path = db_path
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    # ---- sqlite ----
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            try:
+                db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS scan_cache ("
+                    " key TEXT PRIMARY KEY, result TEXT NOT NULL, ts REAL NOT NULL)"
+                )
+                db.commit()
+            except sqlite3.Error:
+                LOGGER.warning("cache db unavailable path=%s", self.db_path, exc_info=True)
+                self.db_path = None
+                return None
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def _db_get(self, key: str) -> Optional[Dict[str, Any]]:
+        db = self._conn()
+        if db is None:
+            return None
+        try:
+            row = db.execute("SELECT result FROM scan_cache WHERE key=?", (key,)).fetchone()
+        except sqlite3.Error:
+            LOGGER.debug("cache db read failed", exc_info=True)
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _db_put(self, key: str, value: Dict[str, Any]) -> None:
+        db = self._conn()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO scan_cache (key, result, ts) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+            db.commit()
+        except sqlite3.Error:
+            LOGGER.debug("cache db write failed", exc_info=True)
+
+    # ---- LRU ----
+    def _mem_put(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.max_entries:
+            return
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    # ---- 공개 API ----
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            val = self._mem.get(key)
+            if val is not None:
+                self._mem.move_to_end(key)
+            else:
+                val = self._db_get(key)
+                if val is not None:
+                    self._mem_put(key, val)
+            if val is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return val
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._mem_put(key, value)
+            self._db_put(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            db = self._conn()
+            if db is not None:
+                db.execute("DELETE FROM scan_cache")
+                db.commit()
+
+
+_default: Optional[ScanCache] = None
+
+
+def default_cache() -> Optional[ScanCache]:
+    """ 환경변수 설정대로 만든 프로세스 공용 캐시 (DETECT_CACHE=0 이면 None) """
+    global _default
+    if os.getenv("DETECT_CACHE", "1") == "0":
+        return None
+    if _default is None:
+        _default = ScanCache(DEFAULT_SIZE, os.getenv("DETECT_CACHE_DB") or None)
+    return _default
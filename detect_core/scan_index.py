@@ -0,0 +1,104 @@
+# scan_index.py
+"""
+디렉터리 스캔 색인 (경로 → 크기/mtime/내용 해시/결과)
+- 크기 + mtime_ns 가 그대로이고 규칙 버전이 같으면 파일을 열지 않고 이전 결과를 쓴다
+- 크기/mtime 이 바뀐 파일은 워커가 해시를 다시 구해, 내용이 같으면(touch, 복사본 덮어쓰기) 스캔 없이 이전 결과
+- 문서가 아닌 파일(kind=None)도 기록해 두므로 다음 실행에서는 열어 보지도 않는다
+- sqlite 파일 (--index 경로 또는 DETECT_INDEX_DB). 지정이 없으면 메모리 (한 번 실행 안에서만 유효)
+- 전체 결과와 verdict 결과는 mode 로 나눠 저장 (한 색인 파일을 두 모드가 같이 써도 섞이지 않음)
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+LOGGER = logging.getLogger("scan_index")
+
+# 이만큼 쓸 때마다 commit (파일마다 commit 하면 fsync 때문에 느림)
+COMMIT_EVERY = int(os.getenv("DETECT_INDEX_COMMIT_EVERY", "256"))
+
+
+@dataclass
+class IndexEntry:
+    size: int
+    mtime_ns: int
+    sha256: Optional[str]                # 문서가 아니면 None (해시를 구하지 않음)
+    kind: Optional[str]                  # "hwp" / "docx" / None(문서 아님)
+    version: str                         # 스캔 당시 규칙 버전 (file_scanner._cache_version)
+    result: Optional[Dict[str, Any]]     # 스캔 결과 (filename/path 제외)
+
+
+class ScanIndex:
+    """ 경로별 색인. 부모 프로세스(디렉터리 스캔 루프)에서만 쓴다 """
+
+    def __init__(self, db_path: Optional[str] = None, mode: str = "full"):
+        self.db_path = db_path or ":memory:"
+        self.mode = mode
+        self._db = sqlite3.connect(self.db_path, timeout=5)
+        if self.db_path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scan_index ("
+            " path TEXT NOT NULL, mode TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " sha256 TEXT, kind TEXT, version TEXT NOT NULL, result TEXT, ts REAL NOT NULL,"
+            " PRIMARY KEY (path, mode))"
+        )
+        self._db.commit()
+        self._dirty = 0
+
+    def get(self, path: str) -> Optional[IndexEntry]:
+        row = self._db.execute(
+            "SELECT size, mtime_ns, sha256, kind, version, result FROM scan_index WHERE path=? AND mode=?",
+            (path, self.mode),
+        ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, sha, kind, version, result = row
+        try:
+            result = json.loads(result) if result else None
+        except ValueError:
+            LOGGER.debug("index row unreadable path=%s", path)
+            return None
+        return IndexEntry(size, mtime_ns, sha, kind, version, result)
+
+    def put(self, path: str, entry: IndexEntry) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO scan_index (path, mode, size, mtime_ns, sha256, kind, version, result, ts)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, self.mode, entry.size, entry.mtime_ns, entry.sha256, entry.kind, entry.version,
+             json.dumps(entry.result, ensure_ascii=False) if entry.result is not None else None, time.time()),
+        )
+        self._dirty += 1
+        if self._dirty >= COMMIT_EVERY:
+            self.commit()
+
+    def forget(self, path: str) -> None:
+        """ 읽기 실패/시간 초과 등 → 다음 실행에서 다시 스캔하도록 지운다 """
+        self._db.execute("DELETE FROM scan_index WHERE path=? AND mode=?", (path, self.mode))
+        self._dirty += 1
+
+    def commit(self) -> None:
+        if self._dirty:
+            self._db.commit()
+            self._dirty = 0
+
+    def close(self) -> None:
+        try:
+            self.commit()
+        finally:
+            self._db.close()
+
+    def __enter__(self) -> "ScanIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_index(db_path: Optional[str] = None, mode: str = "full") -> ScanIndex:
+    """ db_path 가 없으면 DETECT_INDEX_DB, 그것도 없으면 메모리 색인 """
+    return ScanIndex(db_path or os.getenv("DETECT_INDEX_DB") or None, mode)
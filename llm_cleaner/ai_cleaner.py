@@ -2,16 +2,23 @@
 # -*- coding: utf-8 -*-
 """
 ai_sanitize.py
-- UI의 det.keyword("KEYWORD : ... at 13367") 형식을 받아 위험 키워드 구간을 치환
+- 디텍터 결과(detections)의 적중 위치(hits: offset/length/match)를 그대로 받아 위험 구간을 치환
+  (hits 가 없는 예전 UI 형식 det.keyword("KEYWORD : ... at 13367")도 해석)
 - 기본: LLM 치환 시도 → 실패 시 fill(0x00)로 채움
 - 옵션: --mask "***" 를 주면 LLM을 사용하지 않고 길이만큼 패턴 반복으로 치환
 - 입력 경로가 주어지고, 패치 결과는 {src}.sanitized 로 저장하며 .report.txt를 남김
+- --serve: 상주 모드. LLM 은 한 번만 적재하고 줄 단위 JSON 작업을 큐로 처리
+- DOCX 탐지 / HWP 압축 스트림 속 탐지는 container_sanitize 가 컨테이너를 다시 써서 처리
 """
 
 from pathlib import Path
 from dataclasses import dataclass
 from typing import List, Optional, Iterable
-import json, re, sys
+import functools, json, os, re, sys, threading
+
+import container_sanitize
+import llm_cache
+from detection import Detection
 
 # === 마스킹 유틸 ============================================================
 
@@ -26,21 +33,43 @@ def make_mask(L: int, pattern: str = "***") -> bytes:
 
 
 # ---------------- A) LLM 로더 (4bit 실패하면 자동 폴백) ----------------------
+# 모듈 import 시에는 아무것도 올리지 않는다. 첫 ask_llm() 호출 때 한 번만 로드.
+# (--mask / --no-ai 실행은 transformers import 도, 모델 적재도 하지 않음)
 USE_AI = True
+MODEL = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
 gen = None
-if USE_AI:
+_gen_loaded = False
+_gen_lock = threading.Lock()
+_gen_call_lock = threading.Lock()
+
+def _load_llm():
     try:
         from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-        MODEL = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
         tok = AutoTokenizer.from_pretrained(MODEL)
         try:
             mdl = AutoModelForCausalLM.from_pretrained(MODEL, device_map="auto", load_in_4bit=True)
         except Exception:
             mdl = AutoModelForCausalLM.from_pretrained(MODEL, device_map="auto")
-        gen = pipeline("text-generation", model=mdl, tokenizer=tok)
+        # 배치 생성용 패딩: pad 토큰이 없는 모델은 eos 로, 디코더 전용이라 왼쪽 패딩
+        if tok.pad_token is None:
+            tok.pad_token = tok.eos_token
+        tok.padding_side = "left"
+        return pipeline("text-generation", model=mdl, tokenizer=tok)
     except Exception as e:
         print("[warn] LLM init failed -> fallback to rule-only:", e, file=sys.stderr)
-        gen = None
+        return None
+
+def get_gen():
+    """LLM 파이프라인 (처음 필요할 때 로드, 실패하면 이후 계속 None = 규칙 전용)"""
+    global gen, _gen_loaded
+    if not USE_AI:
+        return None
+    if not _gen_loaded:
+        with _gen_lock:
+            if not _gen_loaded:
+                gen = _load_llm()
+                _gen_loaded = True
+    return gen
 
 # ---------------- B) 입력 스펙 ----------------------------------------------
 
@@ -49,6 +78,7 @@ class Patch:
     offset: int       # 바이트 오프셋
     keyword: str      # 해당 위치에서 덮어쓸 원문 키워드(길이 산정에 사용)
     label: str = ""   # 사람이 보기 좋은 라벨(옵션)
+    length: Optional[int] = None   # 지울 길이. keyword 길이와 다르면 구간 전체를 fill 로 지움 (PE 이미지 등)
 
 # UI에서 오는 "KEYWORD : ... at 13367" → Patch
 def parse_det_keyword(s: str) -> Optional[Patch]:
@@ -63,6 +93,16 @@ def parse_det_keyword(s: str) -> Optional[Patch]:
 def patches_from_ui(dets: Iterable[dict]) -> List[Patch]:
     out: List[Patch] = []
     for d in dets:
+        det = Detection.from_dict(d)
+        if det.hits:
+            # 구조화된 적중: 원시 파일 위치만 (스트림/파트 안 위치는 container_sanitize 가 처리)
+            for h in det.hits:
+                if h.offset is not None and not h.stream and not h.part:
+                    out.append(Patch(h.offset, h.match or "", d.get("label", ""), h.length))
+            continue
+        # 압축 컨테이너 스트림 내부 오프셋은 원본 파일 오프셋이 아니므로 바이트 패치 대상에서 제외
+        if d.get("stream"):
+            continue
         # 우선 priority: 명시 offset/keyword가 있으면 그대로
         if "offset" in d and "keyword" in d and isinstance(d["offset"], int):
             out.append(Patch(int(d["offset"]), str(d["keyword"]), d.get("label","")))
@@ -83,10 +123,13 @@ SYSTEM = (
 "3) 결과는 JSON 한 줄로만: {\"summary\": \"...\", \"replacement\": \"...\"}"
 )
 
-def ask_llm(keyword: str, target_len: int) -> Optional[dict]:
-    if gen is None:
-        return None
-    prompt = (
+# 프롬프트가 바뀌면 올린다 (llm_cache 키에 포함 → 예전 치환 결과 자동 무효화)
+PROMPT_VERSION = "1"
+# 한 번에 파이프라인에 넣는 프롬프트 수 (짧은 쪽은 왼쪽 패딩)
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "8") or 8)
+
+def _prompt(keyword: str, target_len: int) -> str:
+    return (
         f"{SYSTEM}\n"
         f"키워드: {keyword}\n"
         f"치환길이: {target_len} (정확히 이 길이로 맞춰)\n"
@@ -94,7 +137,8 @@ def ask_llm(keyword: str, target_len: int) -> Optional[dict]:
         f"- 실행 의미, URL 의미 제거\n"
         f"- 길이 모자라면 '_'로 패딩\n"
     )
-    out = gen(prompt, max_new_tokens=180, temperature=0.0, do_sample=False)[0]["generated_text"]
+
+def _parse_llm(out: str) -> Optional[dict]:
     m = re.search(r"\{.*\}", out, re.S)
     if not m:
         return None
@@ -103,6 +147,44 @@ def ask_llm(keyword: str, target_len: int) -> Optional[dict]:
     except Exception:
         return None
 
+def ask_llm_batch(items: List[tuple]) -> List[Optional[dict]]:
+    """
+    [(keyword, target_len), ...] → 같은 순서의 결과 목록 (실패/LLM 없음은 None)
+    캐시(llm_cache)에 있는 것은 생성하지 않고, 같은 (keyword, 길이)는 한 번만,
+    나머지는 패딩 배치로 한 번에 생성한다. 전부 캐시에 있으면 모델을 올리지도 않는다.
+    """
+    if not USE_AI or not items:
+        return [None] * len(items)
+    cache = llm_cache.default_cache()
+    parsed: dict = {}
+    uniq = list(dict.fromkeys(items))
+    if cache is not None:
+        for k, L in uniq:
+            hit = cache.get(llm_cache.replacement_key(MODEL, PROMPT_VERSION, k, L))
+            if hit is not None:
+                parsed[(k, L)] = hit
+    missing = [it for it in uniq if it not in parsed]
+    if missing:
+        gen = get_gen()
+        if gen is None:
+            return [parsed.get(it) for it in items]
+        prompts = [_prompt(k, L) for k, L in missing]
+        # 파이프라인 하나를 여러 작업 스레드가 공유하므로 생성은 한 번에 하나씩
+        # return_full_text=False: 프롬프트 속 JSON 예시가 결과 파싱에 섞이지 않게 생성 부분만
+        with _gen_call_lock:
+            outs = gen(prompts, max_new_tokens=180, temperature=0.0, do_sample=False,
+                       batch_size=min(LLM_BATCH_SIZE, len(prompts)), return_full_text=False)
+        for (k, L), o in zip(missing, outs):
+            res = _parse_llm(o[0]["generated_text"])
+            parsed[(k, L)] = res
+            # 쓸 수 있는 결과만 저장 (파싱 실패는 다음에 다시 시도)
+            if cache is not None and res and "replacement" in res:
+                cache.put(llm_cache.replacement_key(MODEL, PROMPT_VERSION, k, L), res)
+    return [parsed.get(it) for it in items]
+
+def ask_llm(keyword: str, target_len: int) -> Optional[dict]:
+    return ask_llm_batch([(keyword, target_len)])[0]
+
 def normalize_len(s: str, L: int) -> str:
     """라틴1 기반 길이 정확히 L로 맞추기(부족하면 '_' 패딩, 넘치면 절단)."""
     b = s.encode("latin1", "ignore")
@@ -110,7 +192,134 @@ def normalize_len(s: str, L: int) -> str:
         return b[:L].decode("latin1", "ignore")
     return (b + b"_" * (L - len(b))).decode("latin1", "ignore")
 
+def choose_replacements(items: List[tuple], fill: int = 0x00, mask_pattern: Optional[str] = None,
+                        use_ai: bool = True) -> List[tuple]:
+    """
+    [(keyword, L), ...] → [(치환 bytes(길이 L), ai 사용 여부, ai 요약), ...]
+    우선순위: mask_pattern → LLM(한 번의 배치) → fill 바이트. sanitize_file / 컨테이너 클린업 공용
+    """
+    if mask_pattern:
+        return [(make_mask(L, mask_pattern), False, None) for _k, L in items]
+    llm = ask_llm_batch(items) if use_ai else [None] * len(items)
+    out = []
+    for (_k, L), res in zip(items, llm):
+        if res and "replacement" in res:
+            out.append((normalize_len(res["replacement"], L).encode("latin1"), True, res.get("summary")))
+        else:
+            out.append((bytes([fill]) * L, False, None))
+    return out
+
 # ---------------- D) 패치 적용 ----------------------------------------------
+# 스트리밍 기록: 치환 구간만 메모리에 두고, 나머지 구간은 커널 복사(copy_file_range → sendfile)
+# 또는 블록 단위 복사로 원본에서 바로 목적지로 옮긴다. 메모리는 O(치환 바이트), 쓰기는 한 번.
+_COPY_BLOCK = 1 << 20
+
+def _merge_edits(fsrc, edits: List[tuple]) -> List[tuple]:
+    """
+    [(offset, bytes), ...](입력 순서) → 겹치지 않는 [(start, bytes), ...](오프셋 순).
+    겹치는 패치는 해당 구간 원본 위에 입력 순서대로 덮어써서 예전(bytearray 순차 치환)과 같은 결과.
+    """
+    spans = sorted(((off, off + len(rep), i) for i, (off, rep) in enumerate(edits) if rep), key=lambda t: t[:2])
+    groups = []
+    for start, end, i in spans:
+        if groups and start < groups[-1][1]:
+            g = groups[-1]
+            g[1] = max(g[1], end)
+            g[2].append(i)
+        else:
+            groups.append([start, end, [i]])
+    out = []
+    for start, end, idx in groups:
+        if len(idx) == 1:
+            out.append((start, edits[idx[0]][1]))
+            continue
+        fsrc.seek(start)
+        buf = bytearray(fsrc.read(end - start))
+        for i in sorted(idx):
+            off, rep = edits[i]
+            buf[off - start:off - start + len(rep)] = rep
+        out.append((start, bytes(buf)))
+    return out
+
+def _write_all(f, data: bytes) -> None:
+    # 버퍼 없는(raw) 파일의 write 는 일부만 쓸 수 있다
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view):]
+
+def _copy_range(fsrc, fdst, start: int, count: int) -> None:
+    """fsrc[start:start+count] → fdst 현재 위치 (원본 위치는 건드리지 않음)"""
+    sfd, dfd = fsrc.fileno(), fdst.fileno()
+    pos, left = start, count
+    for fn in ("copy_file_range", "sendfile"):
+        call = getattr(os, fn, None)
+        while call is not None and left > 0:
+            try:
+                if fn == "copy_file_range":
+                    k = call(sfd, dfd, left, pos)
+                else:
+                    k = call(dfd, sfd, pos, left)
+            except OSError:
+                break  # 파일시스템/플랫폼 미지원 → 다음 방식으로
+            if k <= 0:
+                break
+            pos += k
+            left -= k
+        if left <= 0:
+            return
+    fsrc.seek(pos)
+    while left > 0:
+        chunk = fsrc.read(min(_COPY_BLOCK, left))
+        if not chunk:
+            break
+        _write_all(fdst, chunk)
+        left -= len(chunk)
+
+def _write_patched(src_path: str, out_path: str, size: int, edits: List[tuple]) -> None:
+    """원본 + 치환 목록 → out_path. out_path 가 원본과 같은 파일이면 치환 구간만 제자리에서 덮어쓴다"""
+    in_place = os.path.exists(out_path) and os.path.samefile(src_path, out_path)
+    if in_place:
+        with open(src_path, "r+b", buffering=0) as f:
+            for start, rep in _merge_edits(f, edits):
+                f.seek(start)
+                _write_all(f, rep)
+        return
+    with open(src_path, "rb", buffering=0) as fsrc, open(out_path, "wb", buffering=0) as fdst:
+        pos = 0
+        for start, rep in _merge_edits(fsrc, edits):
+            _copy_range(fsrc, fdst, pos, start - pos)
+            _write_all(fdst, rep)
+            pos = start + len(rep)
+        _copy_range(fsrc, fdst, pos, size - pos)
+
+
+def write_report(src_path: str, out_path: str, report: List[dict]) -> None:
+    """{out_path}.report.txt (원시 오프셋 / 컨테이너 스트림·파트 항목 공용)"""
+    lines = [f"Sanitized: {src_path} -> {out_path}"]
+    for r in report:
+        if r.get("part"):
+            line = f"- [{r.get('label','')}] {r['part']} {r.get('target','')}".rstrip() + f" {r['status']}"
+            lines.append(line)
+            continue
+        if r.get("stream"):
+            where = f"at {r['stream']}@{r['offset']}"
+        elif "offset" in r:
+            where = f"at {r['offset']}"
+        else:
+            where = repr(r.get("keyword", ""))
+        if "count" in r:
+            where += f" x{r['count']}"
+        line = f"- [{r.get('label','')}] {where} len={r.get('length','?')} "
+        line += "AI" if r.get("ai_used") else "NIL"
+        if r.get("status") not in (None, "patched"):
+            line += f" ({r['status']})"
+        if r.get("truncated"):
+            line += " (truncated)"
+        if r.get("ai_summary"):
+            line += f" :: {r['ai_summary']}"
+        lines.append(line)
+    Path(out_path + ".report.txt").write_text("\n".join(lines), encoding="utf-8")
+
 
 def sanitize_file(
     src_path: str,
@@ -118,13 +327,16 @@ def sanitize_file(
     fill: int = 0x00,
     make_report: bool = True,
     mask_pattern: Optional[str] = None,
+    use_ai: bool = True,
+    out_path: Optional[str] = None,
 ):
     """
     원본 파일(src_path)을 읽어 patches에 명시된 offset~offset+len(keyword) 구간을 치환한다.
+    patch.length 가 keyword 길이와 다르면 offset~offset+length 구간을 fill 로 지운다 (파일 끝에서 자름).
 
     치환 우선순위:
       1) mask_pattern이 지정되면, 해당 패턴을 keyword 길이에 맞춰 반복/패딩해 덮어씀 (AI 미사용)
-      2) mask_pattern이 없고 LLM 가용 시 ask_llm() 결과 사용
+      2) mask_pattern이 없고 LLM 가용 시 ask_llm_batch() 결과 사용 (AI 가 필요한 패치를 모아 한 번에 생성)
       3) 그 외에는 fill(기본 0x00) 바이트로 채움
 
     Parameters
@@ -132,29 +344,49 @@ def sanitize_file(
     src_path : str
         입력 파일 경로
     patches : List[Patch]
-        각 패치 항목 (offset: int, keyword: str, label: str="")
+        각 패치 항목 (offset: int, keyword: str, label: str="", length: int=None)
     fill : int
         AI/마스크 미사용 시 바이트 채우기 값 (기본 0x00)
     make_report : bool
         .report.txt 생성 여부
     mask_pattern : Optional[str]
         예: "***" 또는 "####" 등. 지정 시 AI 무시하고 패턴으로 치환.
+    use_ai : bool
+        False 면 LLM 을 부르지 않는다 (--no-ai, 상주 모드의 작업별 no_ai)
+    out_path : Optional[str]
+        저장 경로 (기본 '{src_path}.sanitized'). src_path 와 같으면 제자리에서 치환 구간만 덮어쓴다.
 
     Returns
     -------
     (out_path: str, report: list)
-        out_path는 '{src_path}.sanitized'
+        out_path는 저장 경로 (기본 '{src_path}.sanitized')
         report는 각 패치 처리 결과 딕셔너리 목록
     """
-    data = bytearray(Path(src_path).read_bytes())
+    # 파일 전체를 메모리에 올리지 않는다: 치환 바이트만 모아 두었다가 _write_patched 로 한 번에 기록
+    n = os.path.getsize(src_path)
     report = []
-    n = len(data)
+    edits = []  # (offset, 치환 바이트) 입력 순서
 
+    # 1차: 범위 확인 + LLM 이 필요한 패치 모으기 (한 번의 배치 생성으로 처리)
+    todo = []   # (patch, off, L, 지우기 여부)
     for p in patches:
         # keyword의 바이트 길이에 맞춰 동일 길이로 치환
         L = len(p.keyword.encode("latin1"))
         off = int(p.offset)
-        if off < 0 or off + L > n:
+        wipe = p.length is not None and p.length != L
+        if wipe:
+            # 섹션 표상 크기가 파일보다 긴 PE 등: 파일 끝에서 자른다
+            L = min(p.length, n - off)
+        if off < 0 or L <= 0 or off + L > n:
+            todo.append((p, off, None, wipe))
+        else:
+            todo.append((p, off, L, wipe))
+    asks = [(p.keyword, L) for p, _off, L, wipe in todo if L is not None and not wipe]
+    chosen = iter(choose_replacements(asks, fill, mask_pattern, use_ai))
+
+    # 2차: 입력 순서대로 치환
+    for p, off, L, wipe in todo:
+        if L is None:
             report.append({
                 "label": p.label,
                 "offset": off,
@@ -162,53 +394,127 @@ def sanitize_file(
             })
             continue
 
-        used_ai = False
-        rep: bytes
-
-        if mask_pattern:
-            # 1) 마스킹 패턴 우선
-            rep = make_mask(L, mask_pattern)
-            llm = None
+        if wipe:
+            rep, used_ai, summary = bytes([fill]) * L, False, None
         else:
-            # 2) LLM 치환 시도
-            llm = ask_llm(p.keyword, L)
-            if llm and "replacement" in llm:
-                rep = normalize_len(llm["replacement"], L).encode("latin1")
-                used_ai = True
-            else:
-                # 3) 폴백: fill 바이트로 채우기
-                rep = bytes([fill]) * L
-
-        data[off:off + L] = rep
+            rep, used_ai, summary = next(chosen)
+        edits.append((off, rep))
 
         item = {
             "label": p.label,
             "offset": off,
             "length": L,
-            "status": "patched",
+            "status": "wiped" if wipe else "patched",
             "ai_used": used_ai,
         }
         # LLM 사용했고 요약이 있으면 붙이기
-        if used_ai and (llm and "summary" in llm):
-            item["ai_summary"] = llm["summary"]
+        if used_ai and summary:
+            item["ai_summary"] = summary
         report.append(item)
 
-    out_path = f"{src_path}.sanitized"
-    Path(out_path).write_bytes(data)
+    out_path = out_path or f"{src_path}.sanitized"
+    _write_patched(src_path, out_path, n, edits)
 
     if make_report:
-        lines = [f"Sanitized: {src_path} -> {out_path}"]
-        for r in report:
-            line = f"- [{r.get('label','')}] at {r['offset']} len={r.get('length','?')} "
-            line += "AI" if r.get("ai_used") else "NIL"
-            if r.get("ai_summary"):
-                line += f" :: {r['ai_summary']}"
-            lines.append(line)
-        Path(out_path + ".report.txt").write_text("\n".join(lines), encoding="utf-8")
+        write_report(src_path, out_path, report)
 
     return out_path, report
 
-# ---------------- E) CLI 엔트리 (Electron/수동 둘 다) ------------------------
+# ---------------- E) 작업 단위 / 상주 모드 --------------------------------------
+
+def run_job(job: dict) -> dict:
+    """
+    작업 하나 처리 → {outPath, patched, report} (CLI 출력과 같은 형태)
+    job: {"in": 경로, "out": 경로(옵션), "detections": [...] 또는 "patches": [...],
+          "mask": "***"(옵션), "no_ai": bool(옵션)}
+    """
+    infile = job.get("in") or job.get("infile")
+    if not infile:
+        raise ValueError("missing in")
+    out_path = job.get("out") or job.get("outfile")
+    if job.get("patches") is not None:
+        patches = [Patch(int(r["offset"]), str(r["keyword"]), r.get("label", ""), r.get("length"))
+                   for r in job["patches"]]
+    else:
+        detections = job.get("detections") or []
+        kind = container_sanitize.container_kind(infile, detections)
+        if kind:
+            # DOCX / 압축 스트림 속 HWP 적중: 원시 오프셋 대신 컨테이너를 다시 쓴다
+            out_path = out_path or f"{infile}.sanitized"
+            replace = functools.partial(choose_replacements, fill=0x00, mask_pattern=job.get("mask"),
+                                        use_ai=not job.get("no_ai"))
+            report = container_sanitize.sanitize_container(kind, infile, detections, out_path, replace)
+            write_report(infile, out_path, report)
+            return {"outPath": out_path, "patched": _applied(report), "report": report}
+        patches = patches_from_ui(detections)
+
+    # --out 이 있으면 바로 그 경로에 쓴다 (중간 .sanitized 파일/복사 없음)
+    out_path, report = sanitize_file(
+        infile,
+        patches,
+        fill=0x00,
+        make_report=True,
+        mask_pattern=job.get("mask"),
+        use_ai=not job.get("no_ai"),
+        out_path=out_path,
+    )
+    return {"outPath": out_path, "patched": _applied(report), "report": report}
+
+
+def _applied(report: List[dict]) -> int:
+    """실제로 고친 항목 수 (skip-* 로 건너뛴 항목은 빼고)"""
+    return sum(1 for r in report if r.get("status", "patched") in ("patched", "wiped", "removed"))
+
+
+# 상주 모드 (--serve): 파이프라인을 한 번만 올려두고 줄 단위 JSON 작업을 처리
+# 요청: {"id": ..., "in": "...", "detections": [...], "mask": ..., "no_ai": ...}  (run_job 참고)
+#       {"id": ..., "op": "ping"} → {"id": ..., "pong": true}
+# 응답: {"id": ..., "result": {outPath, patched, report}} / 실패 시 {"id": ..., "error": "..."}
+# workers>1 이면 파일 읽기/패치/쓰기는 병렬, LLM 생성은 공유 파이프라인에서 하나씩 (응답 순서는 id 로 매칭)
+SERVE_WORKERS = int(os.getenv("SANITIZE_WORKERS", "1") or 1)
+
+def serve(stdin=None, stdout=None, workers: int = SERVE_WORKERS, preload: bool = False) -> None:
+    """stdin 이 닫힐 때까지 작업 처리. 받은 작업은 모두 끝내고 종료"""
+    from concurrent.futures import ThreadPoolExecutor
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    lock = threading.Lock()
+
+    def reply(obj: dict) -> None:
+        line = json.dumps(obj, ensure_ascii=False)
+        with lock:
+            stdout.write(line + "\n")
+            stdout.flush()
+
+    def work(rid, job: dict) -> None:
+        try:
+            reply({"id": rid, "result": run_job(job)})
+        except Exception as e:
+            reply({"id": rid, "error": str(e)})
+
+    if preload:
+        # 첫 AI 작업이 모델 적재를 기다리지 않게 미리 (요청 처리는 막지 않음)
+        threading.Thread(target=get_gen, daemon=True).start()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for line in stdin:
+            line = line.strip()
+            if not line:
+                continue
+            rid = None
+            try:
+                job = json.loads(line)
+                rid = job.get("id")
+            except Exception as e:
+                reply({"id": rid, "error": str(e)})
+                continue
+            if job.get("op") == "ping":
+                reply({"id": rid, "pong": True})
+                continue
+            pool.submit(work, rid, job)
+
+
+# ---------------- F) CLI 엔트리 (Electron/수동 둘 다) ------------------------
 # 사용법:
 # 1) dets.json을 넘기는 방식:
 #    python ai_sanitize.py --in for_test.hwp --dets dets.json
@@ -217,53 +523,49 @@ def sanitize_file(
 #    python ai_sanitize.py --in for_test.hwp --patches patches.json
 # 3) STDIN으로 det 배열을 넘김(IPC에서 편함):
 #    echo '[{"keyword":"KEYWORD : MZ at 13312"}]' | python ai_sanitize.py --in for_test.hwp --stdin
+# 4) 상주 모드(여러 파일, 모델 한 번만 적재):
+#    python ai_sanitize.py --serve [--workers 2] [--preload] [--no-ai]
 if __name__ == "__main__":
     import argparse
     ap = argparse.ArgumentParser()
-    ap.add_argument("--in", dest="infile", required=True, help="원본 파일 경로")
+    ap.add_argument("--in", dest="infile", default=None, help="원본 파일 경로")
     ap.add_argument("--out", dest="outfile", default=None, help="저장 파일 경로(옵션)")
     ap.add_argument("--dets", dest="dets_json", help="UI detections JSON 파일( det.keyword 형식 )")
     ap.add_argument("--patches", dest="patches_json", help="patches JSON 파일( offset/keyword 명시 )")
     ap.add_argument("--stdin", action="store_true", help="STDIN에서 det 배열(JSON) 수신")
     ap.add_argument("--no-ai", action="store_true", help="AI 비활성화(강제 0x00 또는 --mask 우선)")
     ap.add_argument("--mask", dest="mask", default=None, help="치환 패턴(예: ***, ####). 지정 시 길이만큼 반복/패딩")
+    ap.add_argument("--serve", action="store_true", help="상주 모드: STDIN 줄 단위 JSON 작업 처리")
+    ap.add_argument("--workers", type=int, default=SERVE_WORKERS, help="상주 모드 동시 작업 수")
+    ap.add_argument("--preload", action="store_true", help="상주 모드 시작 시 LLM 미리 적재")
     args = ap.parse_args()
 
     if args.no_ai:
-        gen = None  # LLM 무효화
+        USE_AI = False  # LLM 로드 안 함
+
+    if args.serve:
+        serve(workers=args.workers, preload=args.preload and USE_AI)
+        sys.exit(0)
+    if not args.infile:
+        ap.error("--in is required (or use --serve)")
 
     # patches 준비
-    det_list = []
+    job = {"in": args.infile, "out": args.outfile, "mask": args.mask}
     if args.dets_json:
-        det_list = json.loads(Path(args.dets_json).read_text(encoding="utf-8"))
-        patches = patches_from_ui(det_list)
+        job["detections"] = json.loads(Path(args.dets_json).read_text(encoding="utf-8"))
     elif args.patches_json:
-        raw = json.loads(Path(args.patches_json).read_text(encoding="utf-8"))
-        patches = [Patch(int(r["offset"]), str(r["keyword"]), r.get("label","")) for r in raw]
+        job["patches"] = json.loads(Path(args.patches_json).read_text(encoding="utf-8"))
     elif args.stdin:
-        s = sys.stdin.read()
-        det_list = json.loads(s)
-        patches = patches_from_ui(det_list)
+        job["detections"] = json.loads(sys.stdin.read())
     else:
         # 데모: 하드코딩 예시
-        patches = [
-            Patch(13312, "MZ", "HWP: Embedded PE"),
-            Patch(13367, "%!PS", "HWP: EPS/PS"),
+        job["patches"] = [
+            {"offset": 13312, "keyword": "MZ", "label": "HWP: Embedded PE"},
+            {"offset": 13367, "keyword": "%!PS", "label": "HWP: EPS/PS"},
         ]
 
-    # 실제 치환
-    out_path, report = sanitize_file(
-        args.infile,
-        patches,
-        fill=0x00,
-        make_report=True,
-        mask_pattern=args.mask,   # ★ 마스킹 패턴 전달(있으면 AI 무시)
-    )
-
-    # --out 이 지정되면 복사
-    if args.outfile:
-        Path(args.outfile).write_bytes(Path(out_path).read_bytes())
-        out_path = args.outfile
+    # 실제 치환 (--mask 가 있으면 AI 무시)
+    result = run_job(job)
 
     # IPC에서 파싱하기 좋은 JSON 한 줄 출력
-    print(json.dumps({"outPath": out_path, "patched": len(report), "report": report}, ensure_ascii=False))
+    print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,680 @@
+# container_sanitize.py
+"""
+컨테이너 인식 클린업 (DOCX=zip, HWP=OLE/CFB)
+- 원시 오프셋 덮어쓰기(ai_cleaner.sanitize_file)는 압축된 zip 멤버/HWP 스트림 안의 적중을 고칠 수 없다
+  → 컨테이너를 새로 쓰면서 문제 있는 멤버/스트림만 바꾼다
+- DOCX: zip 멤버를 새 아카이브로 순차 복사. 바뀌지 않은 멤버는 압축된 바이트 그대로(재압축 없음),
+        VBA → vbaProject.bin 삭제(+rels / [Content_Types] 정리), 외부 템플릿 → 관계 삭제,
+        DDE/의심 명령 → 본문 XML 텍스트에서 토큰만 치환
+- HWP : 탐지 적중(hits: stream + 스트림 내부 offset + match)이 있는 스트림만 풀어서 그 자리를 치환 후
+        다시 deflate, 나머지 스트림은 저장된 바이트 그대로 새 CFB 로 복사 (cfb_writer)
+- 위치는 디텍터의 Detection 레코드(detection.py)를 그대로 쓴다. hits 가 없는 예전 결과만 keyword 문자열을 해석
+- 치환 바이트 선택(LLM/마스크/fill)은 호출자가 넘기는 replace(items) 가 한다 (ai_cleaner.choose_replacements)
+"""
+import bisect
+import copy
+import itertools
+import os
+import re
+import sys
+import tempfile
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "detect_core"))
+
+import cfb_reader  # noqa: E402
+import cfb_writer  # noqa: E402
+import doc_detect  # noqa: E402
+import hwp_detect  # noqa: E402
+import rules  # noqa: E402
+from detection import Detection, Hit  # noqa: E402
+
+# replace([(keyword, 길이)]) -> [(치환 bytes(latin1, 길이), ai 사용 여부, 요약), ...]
+Replace = Callable[[List[Tuple[str, int]]], List[Tuple[bytes, bool, Optional[str]]]]
+
+DOCX_KEYS = ("VBA", "TEMPLATE", "DDE", "CMD")
+# 디텍터가 UTF-16 텍스트 스트림에서도 디코드하지 않은 바이트로 찾는 규칙 (match 를 latin1 바이트 그대로 치환)
+HWP_BINARY_KEYS = ("PE_MZ", "EPS_PS")
+_CHUNK = 1 << 20
+_SPOOL_MAX = 8 << 20     # 다시 압축한 스트림은 이 크기까지 메모리, 넘으면 임시 파일
+_TEXT_FILL = 0x2A        # 텍스트(XML/UTF-16) 안에는 NUL/제어 문자 대신 '*' 를 넣는다
+
+
+def _key(d: dict) -> Optional[str]:
+    if d.get("rule") in rules.ATTACK_LABELS_EN:
+        return d["rule"]
+    return rules.key_from_label(str(d.get("type") or d.get("attack") or ""))
+
+
+def _label(d: dict) -> str:
+    return d.get("label") or d.get("type") or d.get("attack") or ""
+
+
+def container_kind(path: str, detections: Iterable[dict]) -> Optional[str]:
+    """컨테이너 단위로 고칠 입력이면 "docx" / "hwp", 아니면 None (원시 오프셋 패치)"""
+    dets = list(detections)
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if head.startswith(b"PK\x03\x04") and any(_key(d) in DOCX_KEYS for d in dets):
+        return "docx"
+    if cfb_reader.is_cfb(head) and any(d.get("stream") or any(
+            isinstance(h, dict) and h.get("stream") for h in d.get("hits") or ()) for d in dets):
+        return "hwp"
+    return None
+
+
+def sanitize_container(kind: str, src_path: str, detections: List[dict], out_path: str,
+                       replace: Replace) -> List[dict]:
+    """
+    out_path 에 정리된 컨테이너를 쓰고 처리 결과 목록을 돌려준다.
+    임시 파일에 다 쓴 뒤 교체하므로 out_path == src_path 여도 된다.
+    """
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp = tempfile.mkstemp(prefix=".sanitize_", dir=out_dir)
+    try:
+        with os.fdopen(fd, "w+b") as out:
+            if kind == "docx":
+                report = _sanitize_docx(src_path, detections, out, replace)
+            else:
+                report = _sanitize_hwp(src_path, detections, out, replace)
+        os.replace(tmp, out_path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return report
+
+
+# --- HWP: 수정 스트림만 다시 deflate ---
+_LOC_SUFFIX = re.compile(r"\s+at\s+\S+(?:\s+\(hits=\d+\))?\s*$")
+
+
+def _token(d: dict) -> str:
+    """(예전 결과용) 키워드에서 위치 표기("... at BinData/X@12 (hits=1)") 제거 → 실제로 찾은 문자열"""
+    return _LOC_SUFFIX.sub("", str(d.get("keyword") or ""))
+
+
+class _Edit:
+    __slots__ = ("off", "expect", "rep", "status")
+
+    def __init__(self, off: int, expect: bytes, rep: bytes):
+        self.off = off
+        self.expect = expect   # 치환 전 그 자리에 있어야 하는 바이트 (다르면 건너뜀)
+        self.rep = rep
+        self.status = "skip-out-of-range"
+
+
+def _hwp_targets(detections: List[dict]) -> List[dict]:
+    """
+    탐지 → 고칠 대상 (탐지 하나 × 스트림 하나).
+      PE_MZ : 적중마다 이미지 전체(length)를 지움 (wipe)
+      그 외 : 적중 위치에 있는 match 를 그대로 치환 (at). EPS 는 두 마커가 모두 적중으로 온다
+    hits 가 없는 예전 결과는 keyword 에서 토큰을 꺼내고, 상한에 닿은(truncated) 결과와 함께
+    스트림 안의 같은 토큰을 전부 찾아 치환한다 (tokens)
+    """
+    out = []
+    for d in detections:
+        det = Detection.from_dict(d, _key(d))
+        label = _label(d)
+        hits = det.hits or [Hit.from_dict(d)]
+        hits = [h for h in hits if h.stream and isinstance(h.offset, int)]
+        if det.rule == "PE_MZ":
+            for h in hits:
+                out.append({"label": label, "stream": h.stream, "offset": h.offset, "wipe": h.length or 2})
+            continue
+        legacy = not det.hits
+        tokens = []
+        if legacy:
+            tok = _token(d)
+            if not tok:
+                continue
+            tokens = [tok]
+            if det.rule == "EPS_PS":
+                tokens += [m.decode() for m in hwp_detect._EPS_MARKERS if m.decode() != tok]
+        elif det.truncated:
+            tokens = list(dict.fromkeys(h.match for h in hits if h.match))
+        by_stream: Dict[str, List[Hit]] = {}
+        for h in hits:
+            by_stream.setdefault(h.stream, []).append(h)
+        for stream, hs in by_stream.items():
+            at = [] if legacy else [(h.offset, h.match) for h in hs if h.match]
+            if at or tokens:
+                out.append({"label": label, "rule": det.rule, "stream": stream, "offset": hs[0].offset,
+                            "at": at, "tokens": tokens, "truncated": det.truncated})
+    return out
+
+
+def _is_deflate(head: bytes) -> bool:
+    try:
+        zlib.decompressobj(-15).decompress(head, 1)
+    except zlib.error:
+        return False
+    return True
+
+
+def _inflate_strict(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """raw deflate 를 _CHUNK 단위 출력으로 푼다. 스캐너와 달리 깨진 스트림은 예외 (잘린 스트림을 쓰지 않게)"""
+    d = zlib.decompressobj(-15)
+    for chunk in chunks:
+        out = d.decompress(chunk, _CHUNK)
+        while True:
+            if out:
+                yield out
+            if not d.unconsumed_tail:
+                break
+            out = d.decompress(d.unconsumed_tail, _CHUNK)
+        if d.eof:
+            break
+    tail = d.flush()
+    if tail:
+        yield tail
+    if not d.eof:
+        raise zlib.error("truncated deflate stream")
+
+
+def _open_stream(cfb: cfb_reader.CfbReader, entry: cfb_reader.CfbEntry,
+                 packed: bool) -> Tuple[bool, Iterator[bytes]]:
+    """(실제로 deflate 였는지, 풀린 chunk). BinData 는 항목별로 압축 여부가 달라 스캐너처럼 첫 chunk 로 판단"""
+    chunks = cfb.iter_stream(entry, _CHUNK)
+    if not packed:
+        return False, chunks
+    first = next(chunks, b"")
+    chunks = itertools.chain([first], chunks)
+    if not _is_deflate(first):
+        return False, chunks
+    return True, _inflate_strict(chunks)
+
+
+def _find_all(chunks: Iterable[bytes], needles: List[bytes], align: int) -> List[Tuple[int, bytes]]:
+    """스트림 전체에서 needles 위치 전부 [(offset, needle)] (chunk 경계에 걸친 것 포함, offset % align == 0)"""
+    hits = []
+    carry = b""
+    base = 0
+    tail = max(len(n) for n in needles) - 1
+    for chunk in chunks:
+        buf = carry + chunk
+        for n in needles:
+            i = buf.find(n)
+            while i != -1:
+                # carry 안에서 끝나는 매치는 앞 chunk 에서 이미 셌다
+                if i + len(n) > len(carry) and (base + i) % align == 0:
+                    hits.append((base + i, n))
+                i = buf.find(n, i + 1)
+        cut = max(0, len(buf) - tail)
+        carry = buf[cut:]
+        base += cut
+    return sorted(hits)
+
+
+def _apply_edits(chunks: Iterable[bytes], edits: List[_Edit]) -> Iterator[bytes]:
+    """
+    스트림 chunk 에 치환을 적용하며 순서대로 내보낸다 (edits 는 offset 순).
+    아직 끝까지 안 들어온 치환 구간부터는 붙잡아 두었다가 구간이 다 채워지면 적용.
+    """
+    buf = bytearray()
+    base = 0
+    i = 0
+    for chunk in chunks:
+        buf += chunk
+        end = base + len(buf)
+        while i < len(edits) and edits[i].off + max(len(edits[i].rep), len(edits[i].expect)) <= end:
+            e = edits[i]
+            at = e.off - base
+            if at < 0:
+                e.status = "skip-overlap"
+            elif buf[at:at + len(e.expect)] != e.expect:
+                e.status = "skip-mismatch"
+            else:
+                buf[at:at + len(e.rep)] = e.rep
+                e.status = "patched"
+            i += 1
+        keep = edits[i].off - base if i < len(edits) else len(buf)
+        keep = max(0, min(keep, len(buf)))
+        if keep:
+            yield bytes(buf[:keep])
+            del buf[:keep]
+            base += keep
+    # 스트림 끝: 남은 치환은 끝에서 자른다 (섹션 표상 크기가 스트림보다 긴 PE 등)
+    for e in edits[i:]:
+        at = e.off - base
+        if 0 <= at and len(e.expect) <= len(buf) - at and buf[at:at + len(e.expect)] == e.expect:
+            buf[at:at + len(e.rep)] = e.rep[:len(buf) - at]
+            e.status = "patched"
+    if buf:
+        yield bytes(buf)
+
+
+def _spool_chunks(spool) -> Iterator[bytes]:
+    spool.seek(0)
+    while True:
+        chunk = spool.read(_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _encode(s: str, text: bool) -> bytes:
+    return s.encode("utf-16-le") if text else s.encode("latin1", "replace")
+
+
+def _stream_rep(rep: bytes, expect: bytes, text: bool) -> bytes:
+    """치환 바이트(latin1) → 스트림에 넣을 바이트 (expect 와 같은 길이)"""
+    if not text:
+        return rep[:len(expect)].ljust(len(expect), b"\0")
+    # UTF-16 본문: 제어 문자(NUL 채움 포함)는 HWP 컨트롤 코드라 '*' 로 바꿔 넣는다
+    out = bytes(_TEXT_FILL if b < 0x20 else b for b in rep).decode("latin1").encode("utf-16-le")
+    out = out[:len(expect)]
+    return out + b"*\0" * ((len(expect) - len(out)) // 2) + b"*" * ((len(expect) - len(out)) % 2)
+
+
+def _sanitize_hwp(src_path: str, detections: List[dict], out, replace: Replace) -> List[dict]:
+    targets = _hwp_targets(detections)
+    spools = []
+    with open(src_path, "rb") as fp:
+        cfb = cfb_reader.CfbReader(fp)
+        compressed = hwp_detect.is_compressed(cfb)
+        entries = {e.path: e for e in cfb.streams()}
+
+        report: List[dict] = []
+        plans: Dict[str, List[Tuple[dict, dict]]] = {}
+        for t in targets:
+            item = {"label": t["label"], "stream": t["stream"], "offset": t["offset"]}
+            if t.get("truncated"):
+                item["truncated"] = True   # 탐지가 상한에서 멈춤 → 보고되지 않은 다른 토큰이 남아 있을 수 있다
+            report.append(item)
+            if t["stream"] not in entries:
+                item["status"] = "skip-missing-stream"
+                continue
+            plans.setdefault(t["stream"], []).append((item, t))
+
+        # 서로 다른 토큰마다 치환 문자열 하나 (한 번의 배치)
+        toks = list(dict.fromkeys(k for plan in plans.values() for _i, t in plan if "wipe" not in t
+                                  for k in [m for _o, m in t["at"]] + t["tokens"]))
+        chosen = dict(zip(toks, replace([(k, len(k)) for k in toks]))) if toks else {}
+
+        sources = []
+        try:
+            for entry in cfb.streams():
+                plan = plans.get(entry.path)
+                if not plan:
+                    # 그대로 복사 (압축 스트림도 풀지 않고 저장된 바이트 그대로)
+                    sources.append(cfb_writer.StreamSource(
+                        entry.path, entry.size, lambda e=entry: cfb.iter_stream(e, _CHUNK)))
+                    continue
+                layout_text, packed = hwp_detect.stream_layout(entry.path, compressed) or (False, False)
+                owned: List[Tuple[dict, _Edit]] = []
+                # 텍스트(UTF-16) 토큰 / 바이트 토큰별로: 찾을 바이트 → (보고 항목, 치환 바이트)
+                needles: Dict[bool, Dict[bytes, Tuple[dict, bytes]]] = {}
+                # 탐지 위치(at) 로 고친 토큰: 그 자리 바이트가 다르면 스트림 전체에서 다시 찾는다
+                located: Dict[bool, Dict[bytes, Tuple[dict, bytes]]] = {}
+                for item, t in plan:
+                    if "wipe" in t:
+                        item.update(length=t["wipe"], ai_used=False)
+                        owned.append((item, _Edit(t["offset"], b"MZ", bytes(t["wipe"]))))
+                        continue
+                    text = layout_text and t.get("rule") not in HWP_BINARY_KEYS
+                    first = t["at"][0][1] if t["at"] else t["tokens"][0]
+                    _rep, used_ai, summary = chosen[first]
+                    item.update(length=len(_encode(first, text)), ai_used=used_ai)
+                    if used_ai and summary:
+                        item["ai_summary"] = summary
+                    # 탐지가 알려 준 위치 그대로
+                    for off, k in t["at"]:
+                        expect = _encode(k, text)
+                        rep = _stream_rep(chosen[k][0], expect, text)
+                        owned.append((item, _Edit(off, expect, rep)))
+                        located.setdefault(text, {})[expect] = (item, rep)
+                    for k in t["tokens"]:
+                        expect = _encode(k, text)
+                        needles.setdefault(text, {})[expect] = (item, _stream_rep(chosen[k][0], expect, text))
+                # 예전 결과 / 상한에 닿은 결과만: 같은 토큰 위치를 더 모은다 (수정할 스트림만 한 번 더 푼다)
+                known = {e.off for _i, e in owned}
+                for text, group in needles.items():
+                    _p, chunks = _open_stream(cfb, entry, packed)
+                    for off, n in _find_all(chunks, list(group), 2 if text else 1):
+                        if off in known:
+                            continue
+                        item, rep = group[n]
+                        owned.append((item, _Edit(off, n, rep)))
+
+                # 2차: 치환하면서 (원래 deflate 였으면) 다시 압축해 임시 버퍼로
+                spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX)
+                spools.append(spool)
+                retried = False
+                while True:
+                    edits = sorted((e for _i, e in owned), key=lambda e: e.off)
+                    packed, chunks = _open_stream(cfb, entry, packed)
+                    comp = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15) if packed else None
+                    for chunk in _apply_edits(chunks, edits):
+                        spool.write(comp.compress(chunk) if comp else chunk)
+                    if comp:
+                        spool.write(comp.flush())
+                    missed = {e.expect for e in edits if e.status == "skip-mismatch"}
+                    if retried or not missed:
+                        break
+                    # 탐지 오프셋이 어긋난 토큰 (예전 결과 등): 스트림에서 실제 위치를 찾아 한 번 더 쓴다
+                    retried = True
+                    found = False
+                    known = {e.off for e in edits}
+                    for text, group in located.items():
+                        group = {n: v for n, v in group.items() if n in missed}
+                        if not group:
+                            continue
+                        _p, chunks = _open_stream(cfb, entry, packed)
+                        for off, n in _find_all(chunks, list(group), 2 if text else 1):
+                            if off not in known:
+                                item, rep = group[n]
+                                owned.append((item, _Edit(off, n, rep)))
+                                found = True
+                    if not found:
+                        break
+                    spool.seek(0)
+                    spool.truncate()
+                sources.append(cfb_writer.StreamSource(
+                    entry.path, spool.tell(), lambda s=spool: _spool_chunks(s)))
+
+                for item, t in plan:
+                    mine = [e for it, e in owned if it is item]
+                    done = sum(1 for e in mine if e.status == "patched")
+                    if done:
+                        item["status"] = "wiped" if "wipe" in t else "patched"
+                    else:
+                        item["status"] = mine[0].status if mine else "skip-not-found"
+                    if "wipe" not in t:
+                        item["count"] = done
+            storages = [e.path for e in cfb.entries if e.type == cfb_reader.TYPE_STORAGE]
+            cfb_writer.write_cfb(out, sources, storages)
+        finally:
+            for s in spools:
+                s.close()
+    return report
+
+
+# --- DOCX: zip 멤버 단위로 다시 쓰기 ---
+_VBA_PARTS = ("word/vbaProject.bin", "word/vbaData.xml", "word/_rels/vbaProject.bin.rels")
+_CT_PATH = "[Content_Types].xml"
+_SETTINGS = "word/settings.xml"
+_MACRO_CT = {
+    "application/vnd.ms-word.document.macroEnabled.main+xml":
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml",
+    "application/vnd.ms-word.template.macroEnabledTemplate.main+xml":
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml",
+}
+_RX_EMPTY_TAG = re.compile(r"<(?:[\w.-]+:)?(Relationship|Override|Default|attachedTemplate)\b[^>]*?/>")
+_RX_ATTR = re.compile(r"([\w:.-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+_RX_TEXT_NODE = re.compile(r">([^<]+)<")
+_RX_INSTR_ATTR = re.compile(r"instr\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")   # 앞 \b 없음: 리터럴 빠른 검색
+_RX_DDE = re.compile(r"\bDDE(?:AUTO)?\b", re.I)
+
+
+def _attrs(tag: str) -> Dict[str, str]:
+    out = {}
+    for m in _RX_ATTR.finditer(tag):
+        name = m.group(1).rsplit(":", 1)[-1]
+        out[name] = m.group(2) if m.group(2) is not None else m.group(3)
+    return out
+
+
+def _drop_tags(xml: str, pred: Callable[[str, Dict[str, str]], bool]) -> str:
+    """빈 요소(<X .../>) 중 pred(태그 이름, 속성) 이 참인 것 제거"""
+    return _RX_EMPTY_TAG.sub(lambda m: "" if pred(m.group(1), _attrs(m.group(0))) else m.group(0), xml)
+
+
+def _strip_vba_rels(xml: str) -> str:
+    return _drop_tags(xml, lambda tag, a: tag == "Relationship"
+                      and a.get("Target", "").replace("\\", "/").lower().endswith("vbaproject.bin"))
+
+
+def _strip_vba_types(xml: str) -> str:
+    xml = _drop_tags(xml, lambda tag, a: (tag == "Override" and a.get("PartName", "").lower() in (
+        "/word/vbaproject.bin", "/word/vbadata.xml")) or (
+        tag == "Default" and a.get("ContentType", "") == "application/vnd.ms-office.vbaProject"))
+    for old, new in _MACRO_CT.items():
+        xml = xml.replace(old, new)
+    return xml
+
+
+def _is_external_template(a: Dict[str, str]) -> bool:
+    # 탐지와 같은 기준 (doc_detect._find_template)
+    if a.get("Type", "") != doc_detect._ATTACHED_TEMPLATE_TYPE:
+        return False
+    target = a.get("Target", "").strip()
+    mode = a.get("TargetMode", "").strip()
+    return mode.lower() == "external" or target.startswith(("http://", "https://", "file://", "\\\\", "//"))
+
+
+def _xml_safe(rep: bytes) -> str:
+    s = rep.decode("latin1")
+    s = "".join(chr(_TEXT_FILL) if ord(c) < 0x20 else c for c in s)
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def _finditer(rx, lit: str, text: str, low: Optional[str] = None) -> Iterator:
+    """
+    rx 매치 전부. re.I 패턴은 리터럴 빠른 검색을 못 쓰므로 소문자 사본(low)에서 리터럴(lit) 후보만 찾아
+    rx.match 로 확정 (lower() 로 길이가 바뀌는 문자가 있으면 그냥 finditer)
+    """
+    low = text.lower() if low is None else low
+    if len(low) != len(text):
+        yield from rx.finditer(text)
+        return
+    i = low.find(lit)
+    while i != -1:
+        m = rx.match(text, i)
+        if m:
+            yield m
+        i = low.find(lit, m.end() if m else i + 1)
+
+
+def _token_spans(xml: str, low: str, rx, lit: str) -> List[List[Tuple[int, int]]]:
+    """
+    XML 텍스트 노드를 공백으로 이어 붙인 문자열(탐지와 같은 방식) + fldSimple@instr 값에서 rx 매치를 찾아
+    매치마다 원본 XML 상의 구간 목록 [(시작, 끝), ...] 으로 돌려준다
+    (low: xml.lower(), lit: 매치가 항상 시작하는 소문자 리터럴)
+    """
+    # 매치는 노드 경계(공백으로 이어 붙인 자리)에 걸칠 수 있으므로 원본 XML 에서는 첫 공백 앞부분만 확인
+    if lit.split(None, 1)[0] not in low:
+        return []
+    same = len(low) == len(xml)
+    out = []
+    segs = [(m.start(1), m.end(1)) for m in _RX_TEXT_NODE.finditer(xml)]
+    starts = []
+    pos = 0
+    for a, b in segs:
+        starts.append(pos)
+        pos += b - a + 1
+    text = " ".join(xml[a:b] for a, b in segs)
+    text_low = " ".join(low[a:b] for a, b in segs) if same else None
+    for m in _finditer(rx, lit, text, text_low):
+        spans = []
+        k = max(0, bisect.bisect_right(starts, m.start()) - 1)
+        while k < len(segs) and starts[k] < m.end():
+            a, b = segs[k]
+            lo = max(m.start(), starts[k]) - starts[k] + a
+            hi = min(m.end(), starts[k] + (b - a)) - starts[k] + a
+            if hi > lo:
+                spans.append((lo, hi))
+            k += 1
+        out.append(spans)
+    for m in _RX_INSTR_ATTR.finditer(xml):
+        g = 1 if m.group(1) is not None else 2
+        for t in _finditer(rx, lit, m.group(g)):
+            out.append([(m.start(g) + t.start(), m.start(g) + t.end())])
+    return out
+
+
+def _replace_spans(xml: str, matches: List[List[Tuple[int, int]]], reps: Dict[str, str]) -> str:
+    pieces = []
+    last = 0
+    flat = []
+    for spans in matches:
+        word = "".join(xml[a:b] for a, b in spans)
+        rep = reps.get(word.lower(), "*" * len(word))
+        k = 0
+        for a, b in spans:
+            flat.append((a, b, rep[k:k + (b - a)]))
+            k += b - a
+    for a, b, new in sorted(flat):
+        if a < last:
+            continue
+        pieces.append(xml[last:a])
+        pieces.append(new)
+        last = b
+    pieces.append(xml[last:])
+    return "".join(pieces)
+
+
+def _copy_raw(zsrc: zipfile.ZipFile, zdst: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """멤버를 풀지 않고 압축된 바이트 그대로 옮긴다 (로컬 헤더는 중앙 디렉터리 정보로 다시 작성)"""
+    fsrc = zsrc.fp
+    fsrc.seek(info.header_offset)
+    head = fsrc.read(30)
+    if head[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"bad local header: {info.filename}")
+    n, m = int.from_bytes(head[26:28], "little"), int.from_bytes(head[28:30], "little")
+    fsrc.seek(info.header_offset + 30 + n + m)
+    zi = copy.copy(info)
+    zi.flag_bits &= ~0x08          # 크기/CRC 를 로컬 헤더에 바로 적으므로 데이터 디스크립터 없음
+    zi.header_offset = zdst.fp.tell()
+    zdst.fp.write(zi.FileHeader())
+    left = info.compress_size
+    while left > 0:
+        chunk = fsrc.read(min(_CHUNK, left))
+        if not chunk:
+            raise zipfile.BadZipFile(f"truncated member: {info.filename}")
+        zdst.fp.write(chunk)
+        left -= len(chunk)
+    zdst.filelist.append(zi)
+    zdst.NameToInfo[zi.filename] = zi
+    # zipfile 은 다음 멤버/중앙 디렉터리를 start_dir 위치부터 쓴다
+    zdst.start_dir = zdst.fp.tell()
+
+
+def _hit_parts(dets: List[Detection]) -> Optional[set]:
+    """적중이 있는 파트 집합. 위치 없는 예전 결과나 상한에 닿은 결과가 섞이면 None (전체 파트 검사)"""
+    parts = set()
+    for det in dets:
+        if det.truncated or not det.hits:
+            return None
+        parts.update(h.part for h in det.hits if h.part)
+    return parts or None
+
+
+def _sanitize_docx(src_path: str, detections: List[dict], out, replace: Replace) -> List[dict]:
+    report: List[dict] = []
+    by_key: Dict[str, List[Detection]] = {}
+    labels: Dict[str, str] = {}
+    for d in detections:
+        k = _key(d)
+        if k in DOCX_KEYS:
+            by_key.setdefault(k, []).append(Detection.from_dict(d, k))
+            labels.setdefault(k, _label(d))
+
+    with zipfile.ZipFile(src_path) as zsrc:
+        names = set(zsrc.namelist())
+        drop = set()
+        edits: Dict[str, List[Callable[[str], str]]] = {}
+
+        if "VBA" in by_key:
+            for part in _VBA_PARTS:
+                if part in names:
+                    drop.add(part)
+                    report.append({"label": labels["VBA"], "part": part, "status": "removed"})
+            edits.setdefault("word/_rels/document.xml.rels", []).append(_strip_vba_rels)
+            edits.setdefault(_CT_PATH, []).append(_strip_vba_types)
+
+        if "TEMPLATE" in by_key:
+            rel_parts = _hit_parts(by_key["TEMPLATE"])
+            for rel_path in doc_detect._REL_PATHS:
+                if rel_path not in names or (rel_parts is not None and rel_path not in rel_parts):
+                    continue
+                xml = zsrc.read(rel_path).decode("utf-8", "replace")
+                ids = set()
+                for m in _RX_EMPTY_TAG.finditer(xml):
+                    a = _attrs(m.group(0))
+                    if m.group(1) == "Relationship" and _is_external_template(a):
+                        ids.add(a.get("Id", ""))
+                        report.append({"label": labels["TEMPLATE"], "part": rel_path,
+                                       "target": a.get("Target", ""), "status": "removed"})
+                if not ids:
+                    continue
+                edits.setdefault(rel_path, []).append(
+                    lambda x: _drop_tags(x, lambda tag, a: tag == "Relationship" and _is_external_template(a)))
+                if rel_path == "word/_rels/settings.xml.rels":
+                    edits.setdefault(_SETTINGS, []).append(
+                        lambda x, ids=ids: _drop_tags(x, lambda tag, a: tag == "attachedTemplate"
+                                                      and a.get("id", "") in ids))
+
+        # DDE / 의심 명령: 적중이 있는 본문 파트에서 토큰 위치를 모으고, 서로 다른 토큰마다 치환 문자열을 한 번에 고른다
+        # (탐지 위치는 파싱된 텍스트 기준이라 원본 XML 오프셋이 없다 → 적중 문자열로 XML 안 위치를 찾는다)
+        token_rx = []   # (규칙 키, 정규식, 매치 첫 부분 소문자 리터럴, 대상 파트 또는 None=전체)
+        if "DDE" in by_key:
+            token_rx.append(("DDE", _RX_DDE, "dde", _hit_parts(by_key["DDE"])))
+        if "CMD" in by_key:
+            cmds = [h.match for det in by_key["CMD"] for h in det.hits if h.match]
+            cmds += [_token(d.to_dict()) for d in by_key["CMD"] if not d.hits]
+            parts = _hit_parts(by_key["CMD"])
+            for cmd in dict.fromkeys(c.lower() for c in cmds if c):
+                token_rx.append(("CMD", re.compile(r"(?<!\w)" + re.escape(cmd) + r"(?!\w)", re.I), cmd, parts))
+        texts: Dict[str, Tuple[str, List]] = {}
+        words: Dict[str, Tuple[str, str]] = {}   # 소문자 토큰 -> (원문, 규칙 키)
+        for part in doc_detect._TEXT_PARTS:
+            rxs = [(key, rx, lit) for key, rx, lit, only in token_rx if only is None or part in only]
+            if not rxs or part not in names:
+                continue
+            try:
+                xml = zsrc.read(part).decode("utf-8")
+            except UnicodeDecodeError:
+                report.append({"label": "", "part": part, "status": "skip-encoding"})
+                continue
+            low = xml.lower()
+            found = []
+            for key, rx, lit in rxs:
+                for spans in _token_spans(xml, low, rx, lit):
+                    word = "".join(xml[a:b] for a, b in spans)
+                    words.setdefault(word.lower(), (word, key))
+                    found.append(spans)
+            if found:
+                texts[part] = (xml, found)
+        reps: Dict[str, str] = {}
+        if words:
+            order = list(words.items())
+            chosen = replace([(w, len(w)) for _lw, (w, _k) in order])
+            for (lw, (w, key)), (rep, used_ai, summary) in zip(order, chosen):
+                reps[lw] = _xml_safe(rep)[:len(w)].ljust(len(w), "*")
+                n = sum(1 for part in texts for spans in texts[part][1]
+                        if "".join(texts[part][0][a:b] for a, b in spans).lower() == lw)
+                item = {"label": labels[key], "keyword": w, "length": len(w), "count": n,
+                        "status": "patched", "ai_used": used_ai}
+                if used_ai and summary:
+                    item["ai_summary"] = summary
+                report.append(item)
+
+        with zipfile.ZipFile(out, "w") as zdst:
+            for info in zsrc.infolist():
+                if info.filename in drop:
+                    continue
+                funcs = edits.get(info.filename, [])
+                if not funcs and info.filename not in texts:
+                    _copy_raw(zsrc, zdst, info)
+                    continue
+                if info.filename in texts:
+                    xml, found = texts[info.filename]
+                    new = _replace_spans(xml, found, reps)
+                else:
+                    xml = new = zsrc.read(info).decode("utf-8", "replace")
+                for f in funcs:
+                    new = f(new)
+                if new == xml:
+                    _copy_raw(zsrc, zdst, info)
+                    continue
+                zi = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                zi.external_attr = info.external_attr
+                zi.compress_type = zipfile.ZIP_DEFLATED
+                zdst.writestr(zi, new.encode("utf-8"))
+    return report
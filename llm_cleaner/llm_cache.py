@@ -0,0 +1,119 @@
+# llm_cache.py
+"""
+LLM 치환 결과 캐시
+- 키: 모델 + 프롬프트 버전 + 치환 길이 + 키워드 → 같은 키워드(MZ, %!PS, 같은 C2 URL 등)는 다시 생성하지 않음
+- 1차: 프로세스 메모리 LRU (LLM_CACHE_SIZE, 기본 1024개)
+- 2차: sqlite 파일 (LLM_CACHE_DB, 기본 ~/.cache/texnel/llm_cache.db). 실행 사이에 결과가 고정된다
+- LLM_CACHE=0 이면 비활성
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+
+
+def _default_db_path() -> str:
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return os.path.join(base, "texnel", "llm_cache.db")
+
+
+def replacement_key(model: str, prompt_version: str, keyword: str, target_len: int) -> str:
+    return json.dumps([model, prompt_version, target_len, keyword], ensure_ascii=False)
+
+
+class LlmCache:
+    """LRU(OrderedDict) + sqlite. 값은 {"summary", "replacement"} dict. 스레드 안전, sqlite 연결은 pid 별"""
+
+    def __init__(self, max_entries: int = DEFAULT_SIZE, db_path: Optional[str] = None):
+        self.max_entries = max(0, max_entries)
+        self.db_path = db_path
+        self._mem: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            try:
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+                db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    " key TEXT PRIMARY KEY, result TEXT NOT NULL, ts REAL NOT NULL)"
+                )
+                db.commit()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[warn] llm cache db unavailable ({self.db_path}): {e}", file=sys.stderr)
+                self.db_path = None
+                return None
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def _mem_put(self, key: str, value: Dict) -> None:
+        if not self.max_entries:
+            return
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            val = self._mem.get(key)
+            if val is not None:
+                self._mem.move_to_end(key)
+            else:
+                db = self._conn()
+                if db is not None:
+                    try:
+                        row = db.execute("SELECT result FROM llm_cache WHERE key=?", (key,)).fetchone()
+                    except sqlite3.Error:
+                        row = None
+                    if row:
+                        val = json.loads(row[0])
+                        self._mem_put(key, val)
+            if val is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return val
+
+    def put(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._mem_put(key, value)
+            db = self._conn()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, result, ts) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), time.time()),
+                )
+                db.commit()
+            except sqlite3.Error:
+                pass
+
+
+_default: Optional[LlmCache] = None
+
+
+def default_cache() -> Optional[LlmCache]:
+    """환경변수 설정대로 만든 프로세스 공용 캐시 (LLM_CACHE=0 이면 None)"""
+    global _default
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    if _default is None:
+        _default = LlmCache(DEFAULT_SIZE, os.getenv("LLM_CACHE_DB") or _default_db_path())
+    return _default
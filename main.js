@@ -52,8 +52,8 @@ function getScannerEntry() {
 
 // 3) 클린업(산티이즈) 스크립트 경로
 function getSanitizerEntry() {
-  const p = res('detect_core/ai_sanitize.py');
-  if (!exists(p)) throw new Error(`ai_sanitize.py not found: ${p}`);
+  const p = res('llm_cleaner/ai_cleaner.py');
+  if (!exists(p)) throw new Error(`ai_cleaner.py not found: ${p}`);
   return p;
 }
 
@@ -65,8 +65,8 @@ function writeTempFile(name, bytes) {
   return tmp;
 }
 
-// 스캐너 실행 (단일/다중) - entries: [{ path, name }]
-function runPythonScanner(entries) {
+// 스캐너 1회성 실행 - 파일 바이트를 stdin 으로 넘김 (--stdin-bytes, 임시 파일 없음)
+function runPythonScanner(name, bytes) {
   return new Promise((resolve, reject) => {
     let py = null;
     try { py = findPython(); } catch (e) { return reject(e); }
@@ -76,7 +76,7 @@ function runPythonScanner(entries) {
     const preArgs = parts.slice(1);
 
     const scannerPath = getScannerEntry();
-    const args = [...preArgs, scannerPath, ...entries.map(e => `${e.path}::${e.name}`)];
+    const args = [...preArgs, scannerPath, '--stdin-bytes', name];
 
     console.log('[Python] spawn:', cmd, args.join(' '));
     const env = {
@@ -95,13 +95,154 @@ function runPythonScanner(entries) {
       console.log('[Python] exit', code);
       if (err) console.log('[Python][stderr]\n' + err.slice(0, 2000));
       if (code !== 0) return reject(new Error(`scanner rc=${code} ${err.slice(0, 300)}`));
-      try { resolve(out.trim() ? JSON.parse(out) : (entries.length === 1 ? {} : [])); }
-      catch { resolve([]); }
+      try { resolve(out.trim() ? JSON.parse(out) : {}); }
+      catch { resolve({}); }
     });
+
+    proc.stdin.on('error', (w) => console.error('[Python] stdin write fail:', w));
+    proc.stdin.end(Buffer.from(bytes));
+  });
+}
+
+// 상주 파이썬 프로세스 공통 (file_scanner.py --serve / ai_cleaner.py --serve)
+// 줄 단위 JSON 으로 요청/응답, 응답은 id 로 매칭하므로 순서가 섞여도 됨
+// args 에 '--frames' 가 있으면 프레임 형식: [헤더 길이 u32 BE][헤더 JSON][본문 header.size 바이트]
+function spawnPyDaemon(tag, entry, args, extraEnv, onExit) {
+  const py = findPython();
+  const parts = String(py).split(' ');
+  const fullArgs = [...parts.slice(1), entry, ...args];
+  console.log(`[Python][${tag}] spawn:`, parts[0], fullArgs.join(' '));
+  const env = { ...process.env, PYTHONIOENCODING: 'utf-8', ...extraEnv };
+  const proc = spawn(parts[0], fullArgs, { cwd: path.dirname(entry), env, windowsHide: true });
+
+  const frames = args.includes('--frames');
+  const daemon = { tag, proc, pending: new Map(), seq: 0, buf: frames ? Buffer.alloc(0) : '', frames };
+  const failAll = (err) => {
+    for (const { reject, timer } of daemon.pending.values()) { clearTimeout(timer); reject(err); }
+    daemon.pending.clear();
+    onExit(daemon);
+  };
+
+  const settle = (msg) => {
+    const p = daemon.pending.get(msg.id);
+    if (!p) return;
+    daemon.pending.delete(msg.id);
+    clearTimeout(p.timer);
+    if (msg.error) p.reject(Object.assign(new Error(msg.error), { remote: true }));
+    else p.resolve(msg.result);
+  };
+
+  proc.stdout.on('data', (d) => {
+    if (frames) {
+      daemon.buf = daemon.buf.length ? Buffer.concat([daemon.buf, d]) : d;
+      while (daemon.buf.length >= 4) {
+        const n = daemon.buf.readUInt32BE(0);
+        if (daemon.buf.length < 4 + n) break;
+        const head = daemon.buf.subarray(4, 4 + n).toString('utf8');
+        let msg;
+        try { msg = JSON.parse(head); } catch { msg = null; }
+        // 응답 프레임은 본문이 없지만 size 가 있으면 건너뛴다
+        const size = (msg && Number(msg.size)) || 0;
+        if (daemon.buf.length < 4 + n + size) break;
+        daemon.buf = daemon.buf.subarray(4 + n + size);
+        if (!msg) { console.error(`[Python][${tag}] bad frame:`, head.slice(0, 200)); continue; }
+        settle(msg);
+      }
+      return;
+    }
+    daemon.buf += d.toString();
+    let nl;
+    while ((nl = daemon.buf.indexOf('\n')) >= 0) {
+      const line = daemon.buf.slice(0, nl).trim();
+      daemon.buf = daemon.buf.slice(nl + 1);
+      if (!line) continue;
+      let msg;
+      try { msg = JSON.parse(line); } catch { console.error(`[Python][${tag}] bad line:`, line.slice(0, 200)); continue; }
+      settle(msg);
+    }
+  });
+  proc.stderr.on('data', d => console.log(`[Python][${tag}][stderr]`, d.toString().slice(0, 2000)));
+  proc.on('error', (er) => { console.error(`[Python][${tag}] spawn error:`, er); failAll(er); });
+  // 데몬이 죽은 뒤(시간 초과로 kill 포함) 쓰던 요청이 있으면 EPIPE → 처리 안 하면 메인 프로세스가 죽는다
+  proc.stdin.on('error', (er) => {
+    console.error(`[Python][${tag}] stdin write fail:`, er);
+    failAll(er);
+    try { proc.kill(); } catch {}
   });
+  proc.on('close', (code) => {
+    console.log(`[Python][${tag}] exit`, code);
+    failAll(new Error(`${tag} exited rc=${code}`));
+  });
+  return daemon;
+}
+
+// 데몬에 요청 하나 (제한 시간 초과면 onTimeout 으로 데몬 재시작 → 멈춘 작업 회수)
+// body 는 프레임 데몬에만: 파일 바이트를 base64 없이 프레임 본문으로 보냄
+function requestDaemon(d, payload, timeoutMs, onTimeout, body) {
+  return new Promise((resolve, reject) => {
+    const id = ++d.seq;
+    const timer = setTimeout(() => {
+      d.pending.delete(id);
+      reject(new Error('timeout'));
+      onTimeout(d);
+    }, timeoutMs);
+    d.pending.set(id, { resolve, reject, timer });
+    if (!d.frames) {
+      d.proc.stdin.write(JSON.stringify({ id, ...payload }) + '\n');
+      return;
+    }
+    const size = body ? body.length : 0;
+    const head = Buffer.from(JSON.stringify(size ? { id, ...payload, size } : { id, ...payload }), 'utf8');
+    const len = Buffer.alloc(4);
+    len.writeUInt32BE(head.length, 0);
+    d.proc.stdin.write(len);
+    d.proc.stdin.write(head);
+    if (size) d.proc.stdin.write(body);
+  });
+}
+
+// 스캐너 데몬 (file_scanner.py --serve --frames) - 한 번 띄워두고 재사용
+// DETECT_DAEMON=0 이면 예전처럼 매번 spawn.
+const USE_SCANNER_DAEMON = process.env.DETECT_DAEMON !== '0';
+const SCAN_TIMEOUT_MS = (Number(process.env.DETECT_FILE_TIMEOUT) || 120) * 1000;
+let _scanner = null;
+
+function getScannerDaemon() {
+  if (_scanner) return _scanner;
+  _scanner = spawnPyDaemon('daemon', getScannerEntry(), ['--serve', '--frames'], { DETECT_LOG: '1' },
+    (d) => { if (_scanner === d) _scanner = null; });
+  return _scanner;
+}
+
+function stopScannerDaemon() {
+  const d = _scanner;
+  _scanner = null;
+  if (d) { try { d.proc.kill(); } catch {} }
+}
+
+// 데몬에 파일 하나 스캔 요청 (바이트는 프레임 본문으로 그대로 보냄 → 디스크도 base64 도 거치지 않음)
+function scanWithDaemon(name, bytes) {
+  let d;
+  try { d = getScannerDaemon(); } catch (e) { return Promise.reject(e); }
+  const body = Buffer.isBuffer(bytes) ? bytes : Buffer.from(bytes);
+  return requestDaemon(d, { name }, SCAN_TIMEOUT_MS,
+    (dd) => { if (_scanner === dd) stopScannerDaemon(); }, body);
+}
+
+// 단일 파일 스캔: 데몬 우선, 데몬 자체가 안 뜨거나 죽으면 1회성 실행으로 대체
+async function scanBytes(name, bytes) {
+  if (USE_SCANNER_DAEMON) {
+    try {
+      return await scanWithDaemon(name, bytes);
+    } catch (err) {
+      if (String(err?.message) === 'timeout') throw err;
+      console.error('[Python][daemon] fallback to one-shot:', err);
+    }
+  }
+  return runPythonScanner(name, bytes);
 }
 
-// 산티이즈 실행 (stdin으로 detections 전달 가능)
+// 산티이즈 1회성 실행 (stdin으로 detections 전달 가능)
 function runSanitizer({ infile, detections, mask, noAI }) {
   return new Promise((resolve, reject) => {
     let py = null;
@@ -151,6 +292,43 @@ function runSanitizer({ infile, detections, mask, noAI }) {
   });
 }
 
+// 클린업 데몬 (ai_cleaner.py --serve) - LLM 파이프라인을 한 번만 올려두고 작업을 큐로 처리
+// SANITIZE_DAEMON=0 이면 매번 spawn, SANITIZE_WORKERS 로 동시 작업 수, SANITIZE_TIMEOUT(초)로 작업당 제한
+const USE_SANITIZER_DAEMON = process.env.SANITIZE_DAEMON !== '0';
+const SANITIZE_TIMEOUT_MS = (Number(process.env.SANITIZE_TIMEOUT) || 600) * 1000;
+let _sanitizer = null;
+
+function getSanitizerDaemon() {
+  if (_sanitizer) return _sanitizer;
+  const args = ['--serve'];
+  if (process.env.SANITIZE_WORKERS) args.push('--workers', String(process.env.SANITIZE_WORKERS));
+  _sanitizer = spawnPyDaemon('sanitize-daemon', getSanitizerEntry(), args, {},
+    (d) => { if (_sanitizer === d) _sanitizer = null; });
+  return _sanitizer;
+}
+
+function stopSanitizerDaemon() {
+  const d = _sanitizer;
+  _sanitizer = null;
+  if (d) { try { d.proc.kill(); } catch {} }
+}
+
+// 클린업 하나: 데몬 우선, 데몬이 안 뜨거나 죽으면 1회성 실행으로 대체 (결과 형식 동일: { outPath, patched, report })
+async function sanitizeFile({ infile, detections, mask, noAI }) {
+  if (USE_SANITIZER_DAEMON) {
+    try {
+      const d = getSanitizerDaemon();
+      return await requestDaemon(d, { in: infile, detections: detections ?? [], mask, no_ai: !!noAI },
+        SANITIZE_TIMEOUT_MS, (dd) => { if (_sanitizer === dd) stopSanitizerDaemon(); });
+    } catch (err) {
+      // 작업 자체 실패(파일 없음 등, remote)는 1회성으로 다시 해도 같으므로 데몬 오류일 때만 대체
+      if (err?.remote || String(err?.message) === 'timeout') throw err;
+      console.error('[Python][sanitize-daemon] fallback to one-shot:', err);
+    }
+  }
+  return runSanitizer({ infile, detections, mask, noAI });
+}
+
 function createWindow() {
   const win = new BrowserWindow({
     width: 1200, height: 800,
@@ -193,33 +371,41 @@ function wireIpc() {
     const wc = evt.sender;
     const total = items.length;
 
-    const tmps = [];
-    const results = [];
+    // 동시 요청 수 제한 (DETECT_WORKERS, 기본 CPU 수) - 결과 배열은 입력 순서 유지
+    const limit = Math.max(1, Number(process.env.DETECT_WORKERS) || os.cpus().length || 1);
+    const results = new Array(total);
     let done = 0;
+    let next = 0;
+
+    const scanOne = async (it) => {
+      try {
+        return await scanBytes(it.name, it.bytes);
+      } catch (err) {
+        console.error('[IPC][scan-files] Error:', it.name, err);
+        return { filename: it.name, detections: [], has_detection: false, error: String(err) };
+      }
+    };
 
-    try {
-      for (const it of items) {
-        const tmp = writeTempFile(it.name, it.bytes);
-        tmps.push(tmp);
-
-        const res = await runPythonScanner([{ path: tmp, name: it.name }]);
-        const one = Array.isArray(res) ? (res[0] ?? {}) : res;
-
+    const lane = async () => {
+      while (next < total) {
+        const i = next++;
+        const it = items[i];
+        const one = await scanOne(it);
+        results[i] = one;
         wc.send('scan-result', { name: one.filename || it.name, result: one });
         done += 1;
         wc.send('scan-progress', { done, total, name: it.name });
-
-        results.push(one);
       }
+    };
 
+    try {
+      await Promise.all(Array.from({ length: Math.min(limit, total) }, lane));
       wc.send('scan-complete', { total, results });
       return results;
     } catch (err) {
       console.error('[IPC][scan-files] Error:', err);
-      try { wc.send('scan-complete', { total, results }); } catch {}
+      try { wc.send('scan-complete', { total, results: results.filter(Boolean) }); } catch {}
       return [];
-    } finally {
-      for (const t of tmps) { try { fs.existsSync(t) && fs.unlinkSync(t); } catch {} }
     }
   });
 
@@ -227,16 +413,13 @@ function wireIpc() {
   ipcMain.handle('scan-file', async (_evt, payload) => {
     const { name, bytes } = payload;
     console.log('[IPC] scan-file start', name);
-    const tmp = writeTempFile(name, bytes);
     try {
-      const json = await runPythonScanner([{ path: tmp, name }]);
+      const json = await scanBytes(name, bytes);
       console.log('[IPC] scan-file done', name);
       return json;
     } catch (err) {
       console.error('[IPC][scan-file] Error:', err);
       return { filename: name, detections: [], error: String(err) };
-    } finally {
-      try { fs.existsSync(tmp) && fs.unlinkSync(tmp); } catch {}
     }
   });
 
@@ -251,13 +434,13 @@ function wireIpc() {
 
     const tmpIn = srcPath && exists(srcPath) ? srcPath : writeTempFile(filename || 'input.bin', bytes);
     try {
-      const result = await runSanitizer({
+      const result = await sanitizeFile({
         infile: tmpIn,
         detections: Array.isArray(detections) ? detections : [],
         mask: mask || null,
         noAI: !!noAI,
       });
-      // ai_sanitize.py 출력: { outPath, patched, report }
+      // ai_cleaner.py 출력: { outPath, patched, report }
       console.log('[IPC] sanitize-file done', result?.outPath);
       return { ok: true, ...result };
     } catch (err) {
@@ -333,4 +516,8 @@ app.whenReady().then(() => {
 });
 app.on('window-all-closed', () => { if (process.platform !== 'darwin') app.quit(); });
 app.on('activate', () => { if (BrowserWindow.getAllWindows().length === 0) createWindow(); });
-app.on('will-quit', () => { try { globalShortcut.unregisterAll(); } catch {} });
+app.on('will-quit', () => {
+  try { globalShortcut.unregisterAll(); } catch {}
+  stopScannerDaemon();
+  stopSanitizerDaemon();
+});
@@ -37,6 +37,13 @@ const normalizeDetections = (payload) => {
     type: item.type ?? item.category ?? item.attack ?? 'unknown',
     keyword: item.keyword ?? item.key ?? item.match ?? '',
     summary: item.summary ?? item.message ?? item.desc ?? item.intent ?? '',
+    // 클린업이 그대로 쓰는 규칙 키/적중 위치 (문자열 keyword 를 다시 해석하지 않게)
+    rule: item.rule,
+    stream: item.stream,
+    offset: item.offset,
+    length: item.length,
+    hits: item.hits,
+    truncated: item.truncated,
   }));
 };
 
@@ -401,7 +408,7 @@ const onDrop = (e) => {
         filename: activeFile,
         srcPath: null,             // 경로가 있으면 채워도 됨
         bytes,                     // 경로 없으면 바이트 사용
-        detections: activeDetections, // [{ keyword: "KEYWORD : ... at 13367", ... }]
+        detections: activeDetections, // [{ type, keyword, rule, hits: [{ offset, length, stream|part, match }] }]
         mask: '***',
         noAI: true,
       });
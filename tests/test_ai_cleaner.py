@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+"""
+test_ai_cleaner.py
+- LLM 지연 적재: import / --mask / --no-ai 실행은 transformers 를 올리지 않고, 첫 LLM 요청 때 한 번만 적재
+- 상주 모드(serve): 줄 단위 JSON 작업/응답(id 매칭), ping, 잘못된 작업은 error, 동시 작업에도 모델은 한 번만 적재
+- 배치 생성: 파일 하나의 패치를 한 번의 파이프라인 호출로 (중복 제거, batch_size, 지우기/마스크 패치 제외)
+- 치환 캐시(llm_cache): (모델, 프롬프트 버전, 길이, 키워드) 키, 전부 캐시에 있으면 모델을 올리지 않음,
+  파싱 실패는 저장하지 않음, sqlite 파일로 실행 사이 유지
+- 패치 기록(_write_patched): 파일 전체 복사 없이 구간 복사 + 치환 바이트 — 순차 치환(bytearray)과 같은 결과,
+  겹치는 패치, 범위 밖 패치, 제자리 치환(out == src), copy_file_range/sendfile 없는 환경, 큰 파일 메모리
+- 파이프라인은 가짜(_FakeGen)로 바꿔 끼운다 (transformers 없이 실행)
+"""
+
+import io
+import json
+import random
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "llm_cleaner"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import ai_cleaner  # noqa: E402
+import llm_cache  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+
+class _FakeGen:
+    """ text-generation 파이프라인 대역: 프롬프트마다 키워드 길이에 맞춘 JSON 한 줄 """
+
+    def __init__(self, reply=None):
+        self.calls = []
+        self.reply = reply or (lambda keyword, L: json.dumps({"summary": f"{keyword} 요약", "replacement": "SAFE"}))
+
+    def __call__(self, prompts, **kwargs):
+        self.calls.append((list(prompts), kwargs))
+        out = []
+        for p in prompts:
+            keyword = p.split("키워드: ", 1)[1].split("\n", 1)[0]
+            L = int(p.split("치환길이: ", 1)[1].split(" ", 1)[0])
+            out.append([{"generated_text": self.reply(keyword, L)}])
+        return out
+
+
+class CleanerBase(unittest.TestCase):
+    """ USE_AI 켬, 파이프라인 미적재 상태, 메모리 전용 LLM 캐시, 임시 디렉터리 """
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.tmp = Path(self._tmp.name)
+        for name, value in (("USE_AI", True), ("gen", None), ("_gen_loaded", False)):
+            patcher = mock.patch.object(ai_cleaner, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = llm_cache.LlmCache(64, None)
+        for patcher in (mock.patch.object(llm_cache, "_default", self.cache),
+                        mock.patch.dict(os.environ, {"LLM_CACHE": "1"})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def loader(self, gen=None) -> mock.Mock:
+        """ _load_llm 을 가짜 파이프라인을 돌려주는 Mock 으로 """
+        load = mock.Mock(return_value=gen)
+        patcher = mock.patch.object(ai_cleaner, "_load_llm", load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return load
+
+    def write(self, name: str, data: bytes) -> str:
+        p = self.tmp / name
+        p.write_bytes(data)
+        return str(p)
+
+
+# --- 지연 적재 ---
+class LazyLoadTest(CleanerBase):
+    def test_loaded_once_on_first_request(self):
+        gen = _FakeGen()
+        load = self.loader(gen)
+        self.assertEqual(load.call_count, 0)
+        self.assertEqual(ai_cleaner.ask_llm("MZ", 2)["replacement"], "SAFE")
+        ai_cleaner.ask_llm("%!PS", 4)
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(len(gen.calls), 2)
+
+    def test_failed_load_not_retried(self):
+        load = self.loader(None)
+        src = self.write("a.bin", b"x" * 10 + b"MZ" + b"y" * 10)
+        for _ in range(2):
+            _out, report = ai_cleaner.sanitize_file(src, [ai_cleaner.Patch(10, "MZ")], make_report=False)
+            self.assertEqual((report[0]["status"], report[0]["ai_used"]), ("patched", False))
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual((self.tmp / "a.bin.sanitized").read_bytes()[10:12], b"\0\0")
+
+    def test_mask_and_no_ai_never_load(self):
+        load = self.loader(_FakeGen())
+        src = self.write("a.bin", b"x" * 10 + b"MZ" + b"y" * 10)
+        out, _ = ai_cleaner.sanitize_file(src, [ai_cleaner.Patch(10, "MZ")], make_report=False, mask_pattern="#")
+        self.assertEqual(Path(out).read_bytes()[10:12], b"##")
+        ai_cleaner.sanitize_file(src, [ai_cleaner.Patch(10, "MZ")], make_report=False, use_ai=False)
+        ai_cleaner.run_job({"in": src, "patches": [{"offset": 10, "keyword": "MZ"}], "no_ai": True})
+        with mock.patch.object(ai_cleaner, "USE_AI", False):
+            self.assertIsNone(ai_cleaner.ask_llm("MZ", 2))
+            self.assertIsNone(ai_cleaner.get_gen())
+        self.assertEqual(load.call_count, 0)
+
+    def test_cli_does_not_import_transformers(self):
+        # transformers import 를 가로채 기록하는 finder 를 심고 CLI 를 실행
+        src = self.write("a.bin", b"x" * 10 + b"MZ" + b"y" * 10)
+        patches = self.write("p.json", json.dumps([{"offset": 10, "keyword": "MZ"}]).encode())
+        script = textwrap.dedent(f"""
+            import runpy, sys
+            class Block:
+                def find_spec(self, name, path=None, target=None):
+                    if name.split(".")[0] in ("transformers", "torch"):
+                        print("IMPORTED", name, file=sys.stderr)
+                        raise ImportError(name)
+            sys.meta_path.insert(0, Block())
+            sys.path[:0] = {[str(ROOT / "detect_core"), str(ROOT / "llm_cleaner")]!r}
+            sys.argv = ["ai_cleaner.py"] + sys.argv[1:]
+            runpy.run_path({str(ROOT / "llm_cleaner" / "ai_cleaner.py")!r}, run_name="__main__")
+        """)
+        for flag in (["--mask", "***"], ["--no-ai"]):
+            with self.subTest(flag=flag):
+                proc = subprocess.run([sys.executable, "-c", script, "--in", src, "--patches", patches,
+                                       "--out", src + ".out"] + flag,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=60,
+                                      env={**os.environ, "LLM_CACHE": "0"})
+                self.assertEqual(proc.returncode, 0, proc.stderr)
+                self.assertNotIn("IMPORTED", proc.stderr)
+                self.assertEqual(json.loads(proc.stdout.splitlines()[-1])["patched"], 1)
+
+
+# --- 상주 모드 ---
+class ServeTest(CleanerBase):
+    def serve(self, lines: list, **kwargs) -> list:
+        stdin = io.StringIO("".join((s if isinstance(s, str) else json.dumps(s)) + "\n" for s in lines))
+        stdout = io.StringIO()
+        ai_cleaner.serve(stdin=stdin, stdout=stdout, **kwargs)
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_jobs(self):
+        gen = _FakeGen()
+        load = self.loader(gen)
+        srcs = [self.write(f"f{i}.bin", b"." * i + b"MZ" + b"." * 10) for i in range(6)]
+        jobs = [{"id": i, "in": src, "patches": [{"offset": i, "keyword": "MZ"}]} for i, src in enumerate(srcs)]
+        jobs.append({"id": "m", "in": srcs[0], "out": srcs[0] + ".m", "mask": "#",
+                     "patches": [{"offset": 0, "keyword": "MZ"}]})
+        out = self.serve([{"id": "p", "op": "ping"}] + jobs, workers=3)
+        by_id = {o["id"]: o for o in out}
+        self.assertEqual(set(by_id), {"p", "m", 0, 1, 2, 3, 4, 5})
+        self.assertTrue(by_id["p"]["pong"])
+        for i, src in enumerate(srcs):
+            res = by_id[i]["result"]
+            self.assertEqual((res["outPath"], res["patched"]), (src + ".sanitized", 1))
+            self.assertTrue(res["report"][0]["ai_used"])
+            self.assertEqual(Path(res["outPath"]).read_bytes()[i:i + 2], b"SA")
+        self.assertEqual(Path(srcs[0] + ".m").read_bytes()[:2], b"##")
+        # 작업이 동시에 와도 모델은 한 번만 적재
+        self.assertEqual(load.call_count, 1)
+
+    def test_bad_jobs(self):
+        self.loader(None)
+        out = self.serve(["{broken", {"id": 2}, {"id": 3, "in": str(self.tmp / "missing.bin"), "patches": []},
+                          {"id": 4, "op": "ping"}], workers=1)
+        by_id = {o["id"]: o for o in out}
+        self.assertIn("error", by_id[None])
+        self.assertEqual(by_id[2]["error"], "missing in")
+        self.assertIn("error", by_id[3])
+        self.assertTrue(by_id[4]["pong"])
+
+    def test_preload(self):
+        load = self.loader(_FakeGen())
+        self.assertEqual(self.serve([], preload=True), [])
+        deadline = time.monotonic() + 5
+        while not ai_cleaner._gen_loaded and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(load.call_count, 1)
+
+    def test_concurrent_first_use_loads_once(self):
+        started = threading.Event()
+
+        def slow_load():
+            started.wait(1)   # 다른 스레드들이 모두 get_gen 에 들어올 시간
+            return _FakeGen()
+
+        load = self.loader()
+        load.side_effect = slow_load
+        threads = [threading.Thread(target=ai_cleaner.get_gen) for _ in range(8)]
+        for t in threads:
+            t.start()
+        started.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(load.call_count, 1)
+        self.assertIsInstance(ai_cleaner.gen, _FakeGen)
+
+
+# --- 배치 생성 ---
+class BatchTest(CleanerBase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(os.environ, {"LLM_CACHE": "0"})   # 캐시 없이 배치 동작만
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_call_per_file(self):
+        gen = _FakeGen(lambda k, L: json.dumps({"summary": k, "replacement": k.upper().replace(":", "_")}))
+        self.loader(gen)
+        data = bytearray(b"." * 200)
+        items = [(10, "mz"), (30, "%!ps"), (50, "mz"), (70, "http://x"), (90, "a.pdf.exe")]
+        for off, kw in items:
+            data[off:off + len(kw)] = kw.encode()
+        src = self.write("a.bin", bytes(data))
+        patches = [ai_cleaner.Patch(off, kw) for off, kw in items] + [ai_cleaner.Patch(120, "MZ", length=40)]
+        out, report = ai_cleaner.sanitize_file(src, patches, make_report=False)
+        self.assertEqual(len(gen.calls), 1)
+        prompts, kwargs = gen.calls[0]
+        # 같은 (키워드, 길이)는 한 번만, 지우기(PE 이미지 등) 패치는 LLM 에 보내지 않는다
+        self.assertEqual(len(prompts), 4)
+        self.assertEqual((kwargs["batch_size"], kwargs["return_full_text"]), (4, False))
+        got = Path(out).read_bytes()
+        for off, kw in items:
+            self.assertEqual(got[off:off + len(kw)], kw.upper().replace(":", "_").encode())
+        self.assertEqual(got[120:160], b"\0" * 40)
+        self.assertEqual([r["status"] for r in report], ["patched"] * 5 + ["wiped"])
+        self.assertEqual([r["ai_used"] for r in report], [True] * 5 + [False])
+        self.assertEqual(report[1]["ai_summary"], "%!ps")
+
+    def test_batch_size_capped(self):
+        gen = _FakeGen()
+        self.loader(gen)
+        with mock.patch.object(ai_cleaner, "LLM_BATCH_SIZE", 2):
+            res = ai_cleaner.ask_llm_batch([(f"k{i}", 4) for i in range(5)])
+        self.assertEqual(gen.calls[0][1]["batch_size"], 2)
+        self.assertEqual([r["replacement"] for r in res], ["SAFE"] * 5)
+
+    def test_unparsable_output_falls_back(self):
+        gen = _FakeGen(lambda k, L: "no json here" if k == "bad" else json.dumps({"replacement": "ok"}))
+        self.loader(gen)
+        out = ai_cleaner.choose_replacements([("bad", 3), ("good", 3)], fill=0x20)
+        self.assertEqual(out, [(b"   ", False, None), (b"ok_", True, None)])
+
+    def test_replacement_length_normalized(self):
+        self.loader(_FakeGen(lambda k, L: json.dumps({"replacement": "waytoolong"})))
+        self.assertEqual(ai_cleaner.choose_replacements([("ab", 2)])[0][0], b"wa")
+
+    def test_no_patches_no_load(self):
+        load = self.loader(_FakeGen())
+        src = self.write("a.bin", b"abc")
+        ai_cleaner.sanitize_file(src, [], make_report=False)
+        self.assertEqual(ai_cleaner.ask_llm_batch([]), [])
+        self.assertEqual(load.call_count, 0)
+
+
+
+# --- 치환 캐시 ---
+class ReplacementCacheTest(CleanerBase):
+    def test_second_file_uses_cache(self):
+        gen = _FakeGen()
+        load = self.loader(gen)
+        self.assertEqual(ai_cleaner.ask_llm_batch([("MZ", 2), ("%!PS", 4)])[0]["replacement"], "SAFE")
+        # 새 프로세스처럼 파이프라인을 내려도, 전부 캐시에 있으면 다시 올리지 않는다
+        with mock.patch.object(ai_cleaner, "_gen_loaded", False), mock.patch.object(ai_cleaner, "gen", None):
+            res = ai_cleaner.ask_llm_batch([("%!PS", 4), ("MZ", 2)])
+        self.assertEqual([r["replacement"] for r in res], ["SAFE", "SAFE"])
+        self.assertEqual((load.call_count, len(gen.calls)), (1, 1))
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_key_includes_length_and_versions(self):
+        gen = _FakeGen()
+        self.loader(gen)
+        ai_cleaner.ask_llm("MZ", 2)
+        ai_cleaner.ask_llm("MZ", 3)                      # 길이가 다르면 다른 키
+        with mock.patch.object(ai_cleaner, "PROMPT_VERSION", "test"):
+            ai_cleaner.ask_llm("MZ", 2)
+        with mock.patch.object(ai_cleaner, "MODEL", "other/model"):
+            ai_cleaner.ask_llm("MZ", 2)
+        ai_cleaner.ask_llm("MZ", 2)
+        self.assertEqual(len(gen.calls), 4)
+        self.assertEqual(llm_cache.replacement_key("m", "1", "MZ", 2), llm_cache.replacement_key("m", "1", "MZ", 2))
+        self.assertNotEqual(llm_cache.replacement_key("m", "1", "MZ", 2), llm_cache.replacement_key("m", "1", "MZ", 3))
+
+    def test_only_mixed_misses_generated(self):
+        gen = _FakeGen()
+        self.loader(gen)
+        ai_cleaner.ask_llm("MZ", 2)
+        ai_cleaner.ask_llm_batch([("MZ", 2), ("new", 3), ("new", 3)])
+        self.assertEqual([len(p) for p, _kw in gen.calls], [1, 1])
+        self.assertIn("키워드: new", gen.calls[1][0][0])
+
+    def test_failures_not_cached(self):
+        gen = _FakeGen(lambda k, L: "not json")
+        self.loader(gen)
+        self.assertIsNone(ai_cleaner.ask_llm("MZ", 2))
+        self.assertIsNone(ai_cleaner.ask_llm("MZ", 2))
+        self.assertEqual(len(gen.calls), 2)
+        self.assertEqual(len(self.cache._mem), 0)
+
+    def test_lru_and_sqlite(self):
+        db = str(self.tmp / "sub" / "llm.db")
+        cache = llm_cache.LlmCache(1, db)
+        cache.put("a", {"replacement": "A"})
+        cache.put("b", {"replacement": "B"})
+        self.assertEqual(list(cache._mem), ["b"])
+        self.assertEqual(cache.get("a"), {"replacement": "A"})   # 메모리에서 밀려나도 파일에서
+        self.assertEqual(llm_cache.LlmCache(4, db).get("b"), {"replacement": "B"})
+
+    def test_unwritable_db_is_memory_only(self):
+        blocker = self.write("file", b"")
+        cache = llm_cache.LlmCache(4, os.path.join(blocker, "llm.db"))   # 상위가 파일이라 만들 수 없음
+        cache.put("a", {"replacement": "A"})
+        self.assertEqual((cache.get("a"), cache.db_path), ({"replacement": "A"}, None))
+
+    def test_disabled(self):
+        with mock.patch.dict(os.environ, {"LLM_CACHE": "0"}):
+            self.assertIsNone(llm_cache.default_cache())
+
+
+
+# --- 패치 기록 ---
+def _reference(data: bytes, patches: list, mask: str = "#", fill: int = 0) -> bytes:
+    """ 예전 방식: 파일 전체 bytearray 에 입력 순서대로 치환 """
+    buf = bytearray(data)
+    for p in patches:
+        L = len(p.keyword.encode("latin1"))
+        wipe = p.length is not None and p.length != L
+        if wipe:
+            L = min(p.length, len(buf) - p.offset)
+        if p.offset < 0 or L <= 0 or p.offset + L > len(buf):
+            continue
+        buf[p.offset:p.offset + L] = bytes([fill]) * L if wipe else ai_cleaner.make_mask(L, mask)
+    return bytes(buf)
+
+
+class PatchWriteTest(CleanerBase):
+    def random_case(self, rnd: random.Random, size: int) -> tuple:
+        data = rnd.randbytes(size)
+        patches = []
+        for _ in range(rnd.randint(0, 12)):
+            off = rnd.randint(-5, size + 5)
+            if rnd.random() < 0.2:
+                patches.append(ai_cleaner.Patch(off, "MZ", length=rnd.randint(1, 300)))
+            else:
+                patches.append(ai_cleaner.Patch(off, "k" * rnd.randint(1, 40)))
+        return data, patches
+
+    def test_same_as_bytearray_patching(self):
+        rnd = random.Random(11)
+        for i in range(200):
+            data, patches = self.random_case(rnd, rnd.choice((1, 100, 5000)))
+            src = self.write("in.bin", data)
+            with self.subTest(i=i):
+                out, report = ai_cleaner.sanitize_file(src, patches, make_report=False, mask_pattern="#")
+                self.assertEqual(Path(out).read_bytes(), _reference(data, patches))
+                self.assertEqual(len(report), len(patches))
+
+    def test_overlapping_patches_in_input_order(self):
+        src = self.write("in.bin", b"0123456789")
+        patches = [ai_cleaner.Patch(2, "abcd"), ai_cleaner.Patch(4, "XY", length=4), ai_cleaner.Patch(1, "zz")]
+        out, report = ai_cleaner.sanitize_file(src, patches, make_report=False, mask_pattern="#")
+        self.assertEqual(Path(out).read_bytes(), b"0###" + b"\0" * 4 + b"89")
+        self.assertEqual([r["status"] for r in report], ["patched", "wiped", "patched"])
+
+    def test_out_of_range_and_wipe_at_end(self):
+        src = self.write("in.bin", b"0123456789")
+        patches = [ai_cleaner.Patch(9, "abc"), ai_cleaner.Patch(-1, "a"), ai_cleaner.Patch(8, "MZ", length=100)]
+        out, report = ai_cleaner.sanitize_file(src, patches, make_report=False, mask_pattern="#")
+        self.assertEqual(Path(out).read_bytes(), b"01234567\0\0")
+        self.assertEqual([r["status"] for r in report], ["skip-out-of-range"] * 2 + ["wiped"])
+        self.assertEqual(report[2]["length"], 2)
+
+    def test_in_place(self):
+        data = random.Random(2).randbytes(10000)
+        src = self.write("in.bin", data)
+        inode = os.stat(src).st_ino
+        patches = [ai_cleaner.Patch(100, "abc"), ai_cleaner.Patch(9000, "MZ", length=50)]
+        out, _ = ai_cleaner.sanitize_file(src, patches, make_report=False, mask_pattern="#", out_path=src)
+        self.assertEqual(out, src)
+        self.assertEqual(os.stat(src).st_ino, inode)
+        self.assertEqual(Path(src).read_bytes(), _reference(data, patches))
+
+    def test_without_kernel_copy(self):
+        data = random.Random(3).randbytes(3 * ai_cleaner._COPY_BLOCK + 17)
+        src = self.write("in.bin", data)
+        patches = [ai_cleaner.Patch(5, "abc"), ai_cleaner.Patch(len(data) - 10, "xyz")]
+        expect = _reference(data, patches)
+        failing = mock.Mock(side_effect=OSError("unsupported"))
+        for label, attrs in (("missing", {"copy_file_range": None, "sendfile": None}),
+                             ("failing", {"copy_file_range": failing, "sendfile": failing})):
+            with self.subTest(label=label):
+                with mock.patch.multiple(os, create=True, **attrs):
+                    out, _ = ai_cleaner.sanitize_file(src, patches, make_report=False, mask_pattern="#",
+                                                      out_path=src + "." + label)
+                self.assertEqual(Path(out).read_bytes(), expect)
+
+    def test_large_file_memory(self):
+        # 64MB 희소 파일: 치환 바이트만 메모리에, 나머지는 원본에서 바로 복사
+        src = str(self.tmp / "big.bin")
+        with open(src, "wb") as f:
+            f.truncate(64 << 20)
+        patches = [ai_cleaner.Patch(10, "MZ"), ai_cleaner.Patch(40 << 20, "http://10.0.0.1/x"),
+                   ai_cleaner.Patch((64 << 20) - 100, "MZ", length=1 << 20)]
+        tracemalloc.start()
+        try:
+            out, report = ai_cleaner.sanitize_file(src, patches, make_report=False, mask_pattern="#")
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 8 << 20)
+        self.assertEqual(os.path.getsize(out), 64 << 20)
+        with open(out, "rb") as f:
+            f.seek(40 << 20)
+            self.assertEqual(f.read(17), b"#" * 17)
+        self.assertEqual(report[2]["length"], 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+test_corpus.py
+- 벤치 코퍼스 생성기(bench/corpus.py): 같은 seed → 같은 바이트, manifest 재사용
+- smoke 프로필의 기대 규칙(expect)이 실제 스캔 결과와 같고, 기대 적중이 있는 파일은 run_job 이 실제로 고치는지
+  (벤치 sanitize 항목이 복사만 재지 않게)
+"""
+
+import json
+import logging
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "llm_cleaner", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import ai_cleaner  # noqa: E402
+import corpus  # noqa: E402
+import file_scanner  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+
+class CorpusTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.tmp = Path(self._tmp.name)
+
+    def test_deterministic(self):
+        for fn, kwargs in ((corpus.make_hwp, {"bindata_mb": 0.1, "payloads": ("PE_MZ", "DOUBLE_EXT")}),
+                           (corpus.make_docx, {"document_kb": 8, "dde": True, "cmd": True})):
+            with self.subTest(fn=fn.__name__):
+                self.assertEqual(fn(seed=3, **kwargs), fn(seed=3, **kwargs))
+                self.assertNotEqual(fn(seed=3, **kwargs), fn(seed=4, **kwargs))
+
+    def test_manifest_reused(self):
+        files = corpus.generate(self.tmp, "smoke")
+        man = json.loads((self.tmp / corpus.MANIFEST).read_text(encoding="utf-8"))
+        self.assertEqual((man["profile"], man["files"]), ("smoke", files))
+        stamp = {f["name"]: (self.tmp / f["name"]).stat().st_mtime_ns for f in files}
+        self.assertEqual(corpus.generate(self.tmp, "smoke"), files)
+        self.assertEqual({f["name"]: (self.tmp / f["name"]).stat().st_mtime_ns for f in files}, stamp)
+        # seed 가 다르면 새로 만든다
+        other = corpus.generate(self.tmp, "smoke", seed=1)
+        self.assertNotEqual([f["bytes"] for f in other], [f["bytes"] for f in files])
+
+    def test_smoke_expectations(self):
+        use_ai = ai_cleaner.USE_AI
+        ai_cleaner.USE_AI = False
+        self.addCleanup(setattr, ai_cleaner, "USE_AI", use_ai)
+        out = self.tmp / "out"
+        out.mkdir()
+        for f in corpus.generate(self.tmp, "smoke"):
+            with self.subTest(name=f["name"]):
+                path = self.tmp / f["name"]
+                dets = file_scanner.scan_file(path.read_bytes(), f["name"], use_cache=False)["detections"]
+                self.assertEqual(sorted(d["rule"] for d in dets), sorted(f["expect"]))
+                res = ai_cleaner.run_job({"in": str(path), "out": str(out / f["name"]), "detections": dets,
+                                          "mask": "***", "no_ai": True})
+                self.assertEqual(res["patched"] > 0, bool(f["expect"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
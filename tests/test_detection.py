@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+test_detection.py
+- Detection / Hit: to_dict ↔ from_dict 왕복, 첫 적중의 offset/stream/length (예전 소비자용), meta 필드
+- scan_file 정규화 결과가 hits 를 그대로 유지하는지, 각 hit 위치의 바이트가 match 와 같은지 (원시 파일 / UTF-16 스트림)
+- 클린업 입력: patches_from_ui (구조화 hits / 예전 "KEYWORD ... at N" 문자열), run_job 의 patched 는 실제로 고친 수만
+"""
+
+import logging
+import random
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "llm_cleaner", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import ai_cleaner  # noqa: E402
+import cfb_reader  # noqa: E402
+import corpus  # noqa: E402
+import file_scanner  # noqa: E402
+import hwp_detect  # noqa: E402
+from detection import Detection, Hit  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+
+class RecordTest(unittest.TestCase):
+    def test_round_trip(self):
+        det = Detection("PE_MZ", "label", "MZ at BinData/A@3", "intent", [
+            Hit(3, 7168, "BinData/A", match="MZ", meta={"machine": "i386"}),
+            Hit(None, 5, part="word/document.xml", match="cmd /c"),
+        ], truncated=True)
+        d = det.to_dict()
+        self.assertEqual((d["stream"], d["offset"], d["length"], d["truncated"]), ("BinData/A", 3, 7168, True))
+        self.assertEqual(d["hits"][0], {"offset": 3, "length": 7168, "stream": "BinData/A", "match": "MZ",
+                                        "machine": "i386"})
+        self.assertEqual(d["hits"][1], {"length": 5, "part": "word/document.xml", "match": "cmd /c"})
+        self.assertEqual(Detection.from_dict(d), det)
+
+    def test_legacy_dict(self):
+        det = Detection.from_dict({"type": "label", "keyword": "KEYWORD : MZ at 12", "summary": "s"}, rule="PE_MZ")
+        self.assertEqual((det.rule, det.attack, det.intent, det.hits), ("PE_MZ", "label", "s", []))
+        # length 가 없으면 match 길이
+        self.assertEqual(Hit.from_dict({"offset": "x", "match": "abc"}), Hit(None, 3, match="abc"))
+
+    def test_normalize_keeps_locations(self):
+        raw = [{"attack": "a", "keyword": "k", "intent": "i", "rule": "RAW_IP", "offset": 5, "length": 3,
+                "hits": [{"offset": 5, "length": 3}], "truncated": True, "other": 1}, "plain"]
+        out = file_scanner._normalize_detections({"detections": raw})
+        self.assertEqual(out[0], {"id": 1, "type": "a", "keyword": "k", "summary": "i", "rule": "RAW_IP",
+                                  "offset": 5, "length": 3, "hits": [{"offset": 5, "length": 3}], "truncated": True})
+        self.assertEqual(out[1], {"id": 2, "type": "unknown", "keyword": "plain", "summary": ""})
+
+
+class HitLocationTest(unittest.TestCase):
+    def test_raw_file_offsets(self):
+        pe = corpus.make_pe(random.Random(1))
+        blob = b"\0" * 77 + pe + b" see http://10.0.0.5/x and a.pdf.exe %!PS-Adobe " + b"\0" * 50
+        dets = file_scanner.scan_file(blob, "a.hwp", use_cache=False)["detections"]
+        self.assertEqual({d["rule"] for d in dets}, {"PE_MZ", "EPS_PS", "RAW_IP", "DOUBLE_EXT"})
+        for det in dets:
+            for h in det["hits"]:
+                with self.subTest(rule=det["rule"], offset=h["offset"]):
+                    self.assertNotIn("stream", h)
+                    got = blob[h["offset"]:h["offset"] + h["length"]]
+                    if det["rule"] == "PE_MZ":
+                        self.assertEqual(got, pe)
+                    else:
+                        self.assertEqual(got, h["match"].encode("latin1"))
+
+    def test_utf16_stream_offsets(self):
+        # BMP 밖 문자(서로게이트 쌍) 뒤에서도 offset/length 는 압축 푼 스트림의 바이트 위치
+        body = "😀 첨부 " * 40 + "보고.pdf.exe 와 http://10.1.2.3/a 끝"
+        raw = body.encode("utf-16-le")
+        data = corpus.write_cfb({"FileHeader": corpus._file_header(True),
+                                 "BodyText/Section0": corpus._deflate(raw)})
+        dets = file_scanner.scan_file(data, "a.hwp", use_cache=False)["detections"]
+        self.assertEqual({d["rule"] for d in dets}, {"DOUBLE_EXT", "RAW_IP"})
+        for det in dets:
+            h = det["hits"][0]
+            self.assertEqual(h["stream"], "BodyText/Section0")
+            self.assertEqual(raw[h["offset"]:h["offset"] + h["length"]].decode("utf-16-le"), h["match"])
+
+    def test_truncated_at_cap(self):
+        data = b"".join(b" http://10.0.0.%d/x " % i for i in range(10))
+        with mock.patch.object(hwp_detect, "MAX_HITS", 4):
+            det = hwp_detect.hwp_raw_ip(data)
+        self.assertEqual((len(det["hits"]), det["truncated"]), (4, True))
+        self.assertNotIn("truncated", hwp_detect.hwp_raw_ip(data))
+
+
+class CleanupInputTest(unittest.TestCase):
+    def test_patches_from_ui(self):
+        dets = [
+            {"rule": "RAW_IP", "keyword": "http://x", "label": "ip",
+             "hits": [{"offset": 4, "length": 8, "match": "http://x"},
+                      {"offset": 9, "length": 8, "stream": "BodyText/Section0", "match": "http://y"}]},
+            {"rule": "CMD", "keyword": "cmd", "hits": [{"length": 3, "part": "word/document.xml", "match": "cmd"}]},
+            {"keyword": "KEYWORD : %!PS at 13367 (hits=1)", "label": "eps"},
+            {"offset": 7, "keyword": "MZ"},
+            {"keyword": "MZ", "stream": "BinData/A", "offset": 3},
+            {"keyword": "no location"},
+        ]
+        self.assertEqual(ai_cleaner.patches_from_ui(dets), [
+            ai_cleaner.Patch(4, "http://x", "ip", 8),
+            ai_cleaner.Patch(13367, "%!PS", "eps"),
+            ai_cleaner.Patch(7, "MZ", ""),
+        ])
+
+    def test_patched_counts_applied_only(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.bin"
+            src.write_bytes(b"xx http://10.0.0.1/a yy")
+            res = ai_cleaner.run_job({"in": str(src), "no_ai": True, "detections": [
+                {"rule": "RAW_IP", "hits": [{"offset": 3, "length": 17, "match": "http://10.0.0.1/a"},
+                                            {"offset": 100, "length": 17, "match": "http://10.0.0.1/a"}]}]})
+            self.assertEqual([r["status"] for r in res["report"]], ["patched", "skip-out-of-range"])
+            self.assertEqual(res["patched"], 1)
+            self.assertEqual(Path(res["outPath"]).read_bytes(), b"xx " + b"\0" * 17 + b" yy")
+
+    def test_container_hits_use_container_cleanup(self):
+        body = "본문 http://10.9.9.9/p 끝".encode("utf-16-le")
+        data = corpus.write_cfb({"FileHeader": corpus._file_header(True), "BodyText/Section0": corpus._deflate(body)})
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.hwp"
+            src.write_bytes(data)
+            dets = file_scanner.scan_file(data, "a.hwp", use_cache=False)["detections"]
+            self.assertEqual(ai_cleaner.patches_from_ui(dets), [])   # 스트림 안 위치는 원시 패치가 아니다
+            res = ai_cleaner.run_job({"in": str(src), "no_ai": True, "detections": dets})
+            self.assertEqual(res["patched"], 1)
+            with open(res["outPath"], "rb") as f:
+                self.assertEqual(file_scanner.scan_file(f.read(), "a.hwp", use_cache=False)["detections"], [])
+            with open(res["outPath"], "rb") as f:
+                cfb = cfb_reader.CfbReader(f)
+                self.assertEqual(cfb.read_stream("FileHeader"), corpus._file_header(True))
+
+
+if __name__ == "__main__":
+    unittest.main()
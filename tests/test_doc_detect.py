@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+test_doc_detect.py
+- DocxContext: 한 번 연 아카이브의 각 파트를 규칙들이 한 번만 파싱해 공유하는지
+- scan_docx 결과가 규칙 함수를 따로 부른 결과와 같은지
+- 의심 명령 통합 정규식(_SUSPICIOUS_RX)이 토큰별 개별 패턴과 같은 위치/토큰을 찾는지
+- 대형 파트 스트리밍 검사(_PartStream)가 트리 모드와 같은 DDE/CMD 적중을 내는지 (tail 텍스트, 쪼개진 instrText)
+"""
+
+import io
+import logging
+import random
+import re
+import sys
+import unittest
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import doc_detect  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+_W = corpus._W
+
+
+def _docx(members: dict) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buf.getvalue()
+
+
+def _document(body: str) -> str:
+    return f"<w:document {_W}><w:body>{body}</w:body></w:document>"
+
+
+ALL = corpus.make_docx(document_kb=16, n_headers=2, vba=True, dde=True,
+                       template="http://10.0.0.9/t.dotm", cmd=True, seed=2)
+
+
+class SharedContextTest(unittest.TestCase):
+    def test_scan_matches_single_rules(self):
+        single = [f(ALL) for f in (doc_detect.doc_vba, doc_detect.doc_template,
+                                   doc_detect.doc_dde, doc_detect.doc_cmd)]
+        by_rule = {d["rule"]: d for d in doc_detect.scan_docx(ALL)}
+        self.assertEqual(set(by_rule), {"VBA", "TEMPLATE", "DDE", "CMD"})
+        for det in single:
+            self.assertEqual(by_rule[det["rule"]], det)
+
+    def test_each_part_parsed_once(self):
+        with doc_detect.DocxContext(ALL) as ctx:
+            for finder in (doc_detect._find_vba, doc_detect._find_template,
+                           doc_detect._find_dde, doc_detect._find_cmd):
+                finder(ctx)
+            parsed = ctx.parts_parsed
+            self.assertEqual(parsed, len(ctx._xml) + len(ctx._streamed))
+            # 같은 규칙을 다시 돌려도 파싱이 늘지 않는다
+            doc_detect._find_dde(ctx)
+            doc_detect._find_cmd(ctx)
+            self.assertEqual(ctx.parts_parsed, parsed)
+
+    def test_unreadable_archive(self):
+        self.assertEqual(doc_detect.scan_docx(b"not a zip"), [])
+        self.assertIsNone(doc_detect.doc_vba(b"not a zip"))
+
+    def test_clean(self):
+        data = _docx({"word/document.xml": _document("<w:p><w:r><w:t>hello</w:t></w:r></w:p>")})
+        self.assertEqual(doc_detect.scan_docx(data), [])
+
+
+class CommandMatcherTest(unittest.TestCase):
+    SEPS = [" ", "\t", "\n", ".", "/", "-", "_", "x", "가", ""]
+    WORDS = ["powershell", "PowerShell.exe", "cmd", "cmd.exe /c", "CMD /C", "cmd/c", "rundll32", "regsvr32.exe",
+             "wscript", "cscript.exe", "mshta", "bitsadmin", "certutil", "certutils", "xcmd /c", "power", "hello"]
+
+    def test_same_as_separate_patterns(self):
+        singles = [(name, re.compile(r"\b" + pat, re.I)) for name, pat in doc_detect._SUSPICIOUS]
+        rnd = random.Random(7)
+        for i in range(500):
+            text = "".join(rnd.choice(self.WORDS) + rnd.choice(self.SEPS) for _ in range(rnd.randint(1, 8)))
+            expect = sorted((m.start(), m.group(0), name) for name, rx in singles for m in rx.finditer(text))
+            got = [(m.start(), m.group(0), m.lastgroup) for m in doc_detect._SUSPICIOUS_RX.finditer(text)]
+            with self.subTest(text=text):
+                self.assertEqual(got, expect)
+
+    def test_leftmost_token(self):
+        m = doc_detect._match_cmd("run mshta then powershell")
+        self.assertEqual((m.group(0), m.lastgroup), ("mshta", "mshta"))
+        self.assertIsNone(doc_detect._match_cmd("cmdlet /c powershells"))
+
+
+def _text_hits(data: bytes, threshold) -> dict:
+    """ stream_threshold 로 모드를 골라 DDE/CMD 적중 토큰 목록 (None 이면 트리 모드) """
+    out = {}
+    with doc_detect.DocxContext(data, stream_threshold=threshold) as ctx:
+        for key, finder in (("DDE", doc_detect._find_dde), ("CMD", doc_detect._find_cmd)):
+            found = finder(ctx)
+            out[key] = (found.keyword, [h.match for h in found.hits], found.snippet) if found else None
+    return out
+
+
+_WORDS = ["cmd", "/c", "calc", "powershell", "-enc", "DDE", "AUTO", "DD", "E", "regsvr32", "cscript",
+          "mshta", "hello", "세계", " ", "x"]
+
+
+def _random_body(rnd: random.Random, depth: int = 0) -> str:
+    out = []
+    for _ in range(rnd.randint(1, 5)):
+        roll = rnd.random()
+        if roll < 0.3:
+            out.append(rnd.choice(_WORDS))   # 앞 요소의 tail 이 된다
+        elif roll < 0.45:
+            out.append(f"<w:instrText>{rnd.choice(_WORDS)}</w:instrText>")
+        elif roll < 0.5:
+            out.append(f'<w:fldSimple w:instr=" {rnd.choice(_WORDS)} x"/>')
+        elif depth < 4:
+            out.append(f"<w:r>{rnd.choice(_WORDS)}{_random_body(rnd, depth + 1)}</w:r>")
+        else:
+            out.append(f"<w:t>{rnd.choice(_WORDS)}</w:t>")
+    return "".join(out)
+
+
+class StreamingParityTest(unittest.TestCase):
+    def assert_parity(self, body: str):
+        data = _docx({"word/document.xml": _document(body)})
+        self.assertEqual(_text_hits(data, 0), _text_hits(data, None), body)
+
+    def test_tail_text(self):
+        body = "<w:p>a<w:r>cmd</w:r>/c b<w:r><w:t>regsvr32</w:t></w:r>tail cscript</w:p>"
+        self.assert_parity(body)
+        self.assertEqual(_text_hits(_docx({"word/document.xml": _document(body)}), 0)["CMD"][1],
+                         ["cmd /c", "regsvr32", "cscript"])
+
+    def test_split_instr_text(self):
+        body = ("<w:p><w:r><w:instrText>DDE</w:instrText></w:r>"
+                "<w:r><w:instrText>AUTO c:\\x.exe</w:instrText></w:r></w:p>")
+        self.assert_parity(body)
+        self.assertEqual(_text_hits(_docx({"word/document.xml": _document(body)}), 0)["DDE"][1], ["DDEAUTO"])
+
+    def test_random_documents(self):
+        rnd = random.Random(5)
+        for i in range(300):
+            body = "".join(f"<w:p>{_random_body(rnd)}</w:p>" for _ in range(rnd.randint(1, 4)))
+            with self.subTest(i=i):
+                self.assert_parity(body)
+
+    def test_chunk_boundaries(self):
+        # 파서에 넣는 단위보다 큰 문서: 이벤트 배치/텍스트 배치 경계에 걸친 토큰
+        rnd = random.Random(6)
+        body = "".join(f"<w:p>{_random_body(rnd)}</w:p>" for _ in range(20000))
+        old = doc_detect._STREAM_READ
+        doc_detect._STREAM_READ = 4096
+        try:
+            self.assert_parity(body)
+        finally:
+            doc_detect._STREAM_READ = old
+
+
+if __name__ == "__main__":
+    unittest.main()
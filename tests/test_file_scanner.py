@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+test_file_scanner.py
+- scan_file: 인프로세스 엔진과 격리(서브프로세스) 실행의 결과가 같은지, 실패/미지원 입력
+- 메모리 입력: bytes / bytearray / memoryview / 파일 객체 / 경로가 같은 결과, 임시 파일을 만들지 않음
+- 배치 스캔(scan_files / iter_scan_files): 입력 순서, 프로세스 풀, 파일당 제한 시간 (워커 1개 포함)
+"""
+
+import io
+import logging
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import file_scanner  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+HWP = corpus.make_hwp(bindata_mb=0.1, text_kb=4, payloads=("PE_MZ", "RAW_IP"), seed=1)
+DOCX = corpus.make_docx(document_kb=4, vba=True, cmd=True, seed=1)
+
+
+class EngineTest(unittest.TestCase):
+    def test_inprocess_matches_isolated(self):
+        for name, data, rules in (("a.hwp", HWP, ["PE_MZ", "RAW_IP"]), ("a.docx", DOCX, ["VBA", "CMD"])):
+            with self.subTest(name=name):
+                inproc = file_scanner.scan_file(data, name, isolate=False, use_cache=False)
+                isolated = file_scanner.scan_file(data, name, isolate=True, use_cache=False)
+                self.assertEqual([d["rule"] for d in inproc["detections"]], rules)
+                self.assertTrue(inproc["has_detection"])
+                self.assertEqual(inproc, isolated)
+
+    def test_unsupported_extension(self):
+        res = file_scanner.scan_file(b"abc", "a.txt", use_cache=False)
+        self.assertEqual(res["error"], "unsupported_extension")
+        self.assertFalse(res["has_detection"])
+
+    def test_detector_failure_is_an_error(self):
+        old = file_scanner.DETECTORS["docx"]
+
+        def boom(_src):
+            raise RuntimeError("boom")
+
+        file_scanner.DETECTORS["docx"] = boom
+        try:
+            res = file_scanner.scan_file(DOCX, "a.docx", use_cache=False)
+        finally:
+            file_scanner.DETECTORS["docx"] = old
+        self.assertEqual((res["error"], res["detections"]), ("boom", []))
+
+
+class InputTypesTest(unittest.TestCase):
+    def inputs(self, data: bytes, tmp: str) -> dict:
+        path = Path(tmp) / "in.bin"
+        path.write_bytes(data)
+        return {"bytes": data, "bytearray": bytearray(data), "memoryview": memoryview(data),
+                "BytesIO": io.BytesIO(data), "file": open(path, "rb")}
+
+    def test_same_result_for_every_input(self):
+        for name, data in (("a.hwp", HWP), ("a.docx", DOCX)):
+            expect = file_scanner.scan_file(data, name, use_cache=False)
+            verdict = file_scanner.scan_verdict(data, name, use_cache=False)
+            with tempfile.TemporaryDirectory() as tmp:
+                for label, src in self.inputs(data, tmp).items():
+                    with self.subTest(name=name, input=label):
+                        try:
+                            self.assertEqual(file_scanner.scan_file(src, name, use_cache=False), expect)
+                            self.assertEqual(file_scanner.scan_verdict(src, name, use_cache=False), verdict)
+                        finally:
+                            if hasattr(src, "close"):
+                                self.assertFalse(src.closed)   # 호출자가 넘긴 파일 객체는 닫지 않는다
+                                src.close()
+
+    def test_no_temp_file_in_process(self):
+        with mock.patch.object(tempfile, "NamedTemporaryFile", side_effect=AssertionError("temp file")):
+            for name, data in (("a.hwp", HWP), ("a.docx", DOCX)):
+                self.assertTrue(file_scanner.scan_file(io.BytesIO(data), name, use_cache=False)["has_detection"])
+
+    def test_isolated_file_object(self):
+        src = io.BytesIO(HWP)
+        src.seek(100)   # 격리 모드는 처음부터 임시 파일로 복사한다
+        self.assertEqual(file_scanner.scan_file(src, "a.hwp", isolate=True, use_cache=False),
+                         file_scanner.scan_file(HWP, "a.hwp", use_cache=False))
+
+    def test_batch_path_source(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "a.docx"
+            path.write_bytes(DOCX)
+            res = file_scanner.scan_files([("a.docx", str(path)), ("b.docx", path)], workers=1)
+        self.assertEqual([r["has_detection"] for r in res], [True, True])
+
+
+def _hang_worker(name, src, verdict=False, with_metrics=None):
+    """ 이름이 hang 으로 시작하면 멈추는 워커 (풀에서 돌므로 최상위 함수) """
+    if name.startswith("hang"):
+        time.sleep(60)
+    return file_scanner._scan_worker(name, src, verdict, with_metrics)
+
+
+class BatchTest(unittest.TestCase):
+    FILES = [("a.hwp", HWP), ("b.docx", DOCX), ("c.txt", b"x"), ("d.hwp", b"\0" * 100)]
+
+    def test_results_in_input_order(self):
+        expect = [file_scanner.scan_file(d, n, use_cache=False)["has_detection"] for n, d in self.FILES]
+        for workers, timeout in ((1, 0), (1, 30), (2, 30)):
+            with self.subTest(workers=workers, timeout=timeout):
+                res = file_scanner.scan_files(self.FILES, workers=workers, timeout=timeout)
+                self.assertEqual([r["filename"] for r in res], [n for n, _ in self.FILES])
+                self.assertEqual([r["has_detection"] for r in res], expect)
+
+    def test_hung_detector_times_out(self):
+        files = [("a.hwp", HWP), ("hang.docx", DOCX), ("b.docx", DOCX)]
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                t0 = time.monotonic()
+                res = dict(file_scanner.iter_scan_files(files, workers=workers, timeout=1.0,
+                                                        worker=_hang_worker))
+                self.assertLess(time.monotonic() - t0, 30)
+                self.assertEqual(res[1], {"filename": "hang.docx", "detections": [], "has_detection": False,
+                                          "error": "timeout"})
+                self.assertTrue(res[0]["has_detection"])
+                self.assertTrue(res[2]["has_detection"])
+
+    def test_hung_verdict_times_out(self):
+        res = list(file_scanner.iter_scan_files([("hang.hwp", HWP)], workers=1, timeout=0.5, verdict=True,
+                                                worker=_hang_worker))
+        self.assertEqual(res, [(0, {"filename": "hang.hwp", "malicious": False, "rule": None, "error": "timeout"})])
+
+
+if __name__ == "__main__":
+    unittest.main()
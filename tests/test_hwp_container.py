@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+test_hwp_container.py
+- cfb_reader: 미니/일반 스트림, 중첩 스토리지, 범위 밖 체인
+- HWP 5.x 컨테이너 스캔: 압축 BinData / 본문 스트림 속 적중과 '스트림@오프셋' keyword,
+  계획에 없는 스트림, 깨진 컨테이너(FAT/디렉터리/짧은 체인/서명 없음)는 원시 파일 스캔으로 대체
+"""
+
+import io
+import logging
+import random
+import struct
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import cfb_reader  # noqa: E402
+import corpus  # noqa: E402
+import hwp_detect  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+PE = corpus.make_pe(random.Random(1))
+
+
+def _base(compressed: bool = False) -> dict:
+    pack = corpus._deflate if compressed else (lambda b: b)
+    return {
+        "FileHeader": corpus._file_header(compressed),
+        "DocInfo": pack("문서 정보".encode("utf-16-le")),
+        "BodyText/Section0": pack(("본문 " * 200).encode("utf-16-le")),
+        "PrvText": "미리보기".encode("utf-16-le"),
+    }
+
+
+def _with(extra: dict, compressed: bool = False) -> bytes:
+    return corpus.write_cfb({**_base(compressed), **extra})
+
+
+def _u32(data: bytes, at: int) -> int:
+    return struct.unpack_from("<I", data, at)[0]
+
+
+class CfbReaderTest(unittest.TestCase):
+    def test_read_streams(self):
+        streams = {"FileHeader": b"h" * 256, "BinData/BIN0001.OLE": bytes(range(256)) * 300,
+                   "A/B/C": b"abc"}
+        cfb = cfb_reader.CfbReader(io.BytesIO(corpus.write_cfb(streams)))
+        self.assertEqual({e.path: cfb.read_stream(e.path) for e in cfb.streams()}, streams)
+        self.assertTrue(cfb.is_mini(cfb.find("FileHeader")))
+        self.assertFalse(cfb.is_mini(cfb.find("BinData/BIN0001.OLE")))
+        # 작은 chunk 로 읽어도 같은 바이트
+        big = cfb.find("BinData/BIN0001.OLE")
+        self.assertEqual(b"".join(cfb.iter_stream(big, 1000)), streams["BinData/BIN0001.OLE"])
+        with self.assertRaises(KeyError):
+            cfb.find("Nope")
+
+    def test_not_cfb(self):
+        self.assertFalse(cfb_reader.is_cfb(b"PK\x03\x04"))
+        with self.assertRaises(cfb_reader.CfbError):
+            cfb_reader.CfbReader(io.BytesIO(b"\0" * 1024))
+
+    def test_broken_chain(self):
+        data = bytearray(_with({"BinData/BIN0001.OLE": b"x" * 10000}))
+        cfb = cfb_reader.CfbReader(io.BytesIO(bytes(data)))
+        e = cfb.find("BinData/BIN0001.OLE")
+        fat = (_u32(data, 76) + 1) * 512
+        struct.pack_into("<I", data, fat + 4 * e.start, 0x7FFFFF00)   # FAT 범위 밖 섹터
+        cfb = cfb_reader.CfbReader(io.BytesIO(bytes(data)))
+        with self.assertRaises(cfb_reader.CfbError):
+            b"".join(cfb.iter_stream(cfb.find("BinData/BIN0001.OLE")))
+
+
+class ContainerScanTest(unittest.TestCase):
+    def test_pe_in_compressed_bindata(self):
+        blob = random.Random(2).randbytes(3000) + PE + b"\0" * 500
+        data = corpus.write_cfb({**_base(True), "BinData/BIN0001.OLE": corpus._deflate(blob)})
+        det = hwp_detect.hwp_pe_mz(data)
+        self.assertEqual((det["stream"], det["offset"]), ("BinData/BIN0001.OLE", 3000))
+        self.assertTrue(det["keyword"].startswith("MZ at BinData/BIN0001.OLE@3000"))
+        # 압축된 바이트 그대로는 PE 가 보이지 않는다 (원시 스캔이었다면 놓쳤을 것)
+        self.assertNotIn(PE[:64], data)
+
+    def test_text_hits_report_stream_offsets(self):
+        body = "가나다 http://10.0.0.7/p 라".encode("utf-16-le")
+        data = corpus.write_cfb({**_base(True), "BodyText/Section1": corpus._deflate(body)})
+        det = hwp_detect.hwp_raw_ip(data)
+        self.assertEqual(det["keyword"], "http://10.0.0.7/p")
+        self.assertEqual((det["hits"][0]["stream"], det["hits"][0]["offset"]), ("BodyText/Section1", 8))
+
+    def test_eps_keyword(self):
+        eps = b"\0" * 100 + corpus._EPS
+        det = hwp_detect.hwp_eps_ps(_with({"BinData/BIN0002.eps": eps}))
+        self.assertEqual(det["keyword"].split(" (")[0], "%!PS at BinData/BIN0002.eps@100")
+
+    def test_streams_outside_plan(self):
+        for path in ("DocOptions/_LinkDoc", "Scripts/DefaultJScript"):
+            with self.subTest(path=path):
+                det = hwp_detect.hwp_pe_mz(_with({path: b"\0" * 64 + PE}))
+                self.assertEqual((det["stream"], det["offset"]), (path, 64))
+
+    def test_clean(self):
+        self.assertEqual(hwp_detect.scan_hwp(_with({"BinData/BIN0001.OLE": b"\0" * 5000})), [])
+
+
+class BrokenContainerTest(unittest.TestCase):
+    """ 컨테이너를 믿을 수 없으면 깨끗하다고 하지 않고 파일 전체를 원시 스캔한다 """
+    EPS = b"\0" * 3000 + corpus._EPS + b"\0" * 3000
+
+    def eps_file(self) -> bytearray:
+        return bytearray(_with({"BinData/BIN0001.eps": self.EPS}))
+
+    def assert_raw_hit(self, data: bytes):
+        det = hwp_detect.hwp_eps_ps(bytes(data))
+        self.assertIsNotNone(det)
+        self.assertNotIn("stream", det)   # 원시 파일 오프셋
+        self.assertEqual(bytes(data)[det["offset"]:det["offset"] + 4], b"%!PS")
+
+    def test_smashed_fat(self):
+        data = self.eps_file()
+        off = (_u32(data, 76) + 1) * 512
+        data[off:off + 512] = b"\xAB" * 512
+        self.assert_raw_hit(data)
+
+    def test_no_streams(self):
+        data = self.eps_file()
+        struct.pack_into("<I", data, (_u32(data, 48) + 1) * 512 + 76, 0xFFFFFFFF)
+        self.assert_raw_hit(data)
+
+    def test_short_chain(self):
+        data = self.eps_file()
+        e = cfb_reader.CfbReader(io.BytesIO(bytes(data))).find("BinData/BIN0001.eps")
+        struct.pack_into("<I", data, (_u32(data, 76) + 1) * 512 + 4 * e.start, 0xFFFFFFFE)
+        self.assert_raw_hit(data)
+
+    def test_missing_signature(self):
+        data = corpus.write_cfb({**_base(), "FileHeader": b"\0" * 256, "BinData/BIN0001.OLE": b"\0" * 100 + PE})
+        det = hwp_detect.hwp_pe_mz(data)
+        self.assertNotIn("stream", det)
+        self.assertEqual(data[det["offset"]:det["offset"] + len(PE)], PE)
+
+    def test_not_cfb_is_raw(self):
+        data = b"HWP Document File V3.00" + b"\0" * 200 + PE
+        self.assertEqual(hwp_detect.hwp_pe_mz(data)["offset"], 223)
+
+
+if __name__ == "__main__":
+    unittest.main()
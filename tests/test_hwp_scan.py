@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+test_hwp_scan.py
+- HwpScan 통합 sweep: 네 규칙을 한 번에 찾는지, chunk 경계 / mmap 창 경계에 걸친 적중, 규칙 선택(want)
+- 이중 확장자: 바이트 스트림/원시 파일의 UTF-8 한글·비ASCII 파일명 (예전 decode 후 매칭과 같은 결과)
+- PE 검증: e_lfanew → PE 서명 → Machine/섹션 수/OptionalHeader magic, 가짜 'MZ' 거부, 디스크상 크기(raw_size)
+- mmap 입력: 경로/파일 객체는 읽기 전용 매핑 위에서 스캔 (HWP_MMAP=0 chunk 읽기와 같은 결과, 파일 전체를 올리지 않음)
+"""
+
+import io
+import logging
+import mmap
+import random
+import struct
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import hwp_detect  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+_NAME = "보고서.hwp.exe"
+
+
+def _payload(seed: int = 1) -> tuple:
+    """(버퍼, {규칙: 기대 오프셋})  MZ 가 곳곳에 있는 잡음 + 네 규칙 적중 하나씩"""
+    rnd = random.Random(seed)
+    noise = bytearray(rnd.randbytes(20000).replace(b"exe", b"xxx").replace(b"://", b":/_"))
+    for i in range(0, len(noise), 997):
+        noise[i:i + 2] = b"MZ"   # 검증을 통과하지 못하는 가짜 MZ
+    pe = corpus.make_pe(rnd)
+    parts = [bytes(noise), pe, b" %!PS-Adobe-3.0 EPSF-3.0 ", b" see http://10.0.0.1/x ", b" a.pdf.exe ", b"\0" * 64]
+    want = {}
+    pos = 0
+    for p in parts:
+        if p is pe:
+            want["PE_MZ"] = pos
+        elif p.startswith(b" %!PS"):
+            want["EPS_PS"] = pos + 1
+        elif b"://" in p:
+            want["RAW_IP"] = pos + 5
+        elif p.endswith(b".exe "):
+            want["DOUBLE_EXT"] = pos + 1
+        pos += len(p)
+    return b"".join(parts), want
+
+
+def _offsets(scan: hwp_detect.HwpScan) -> dict:
+    out = {}
+    for key, hits in (("PE_MZ", scan.pe_hits), ("EPS_PS", scan.eps),
+                      ("DOUBLE_EXT", scan.double_ext), ("RAW_IP", scan.raw_ip)):
+        if hits:
+            out[key] = hits[0].offset
+    return out
+
+
+class SweepTest(unittest.TestCase):
+    def test_one_pass_finds_every_rule(self):
+        data, want = _payload()
+        scan = hwp_detect.scan_container(data)
+        self.assertEqual(_offsets(scan), want)
+        self.assertEqual(len(scan.pe_hits), 1)
+        self.assertEqual(scan.bytes_scanned, len(data))
+
+    def test_chunk_boundaries(self):
+        # 아주 작은 chunk 로 나눠 넣어도 (앵커/이름/PE 헤더가 chunk 경계에 걸쳐도) 같은 결과
+        data, want = _payload(2)
+        for size in (3, 7, 4096):
+            with self.subTest(size=size):
+                scan = hwp_detect.HwpScan()
+                scan.feed(data[i:i + size] for i in range(0, len(data), size))
+                self.assertEqual(_offsets(scan), want)
+
+    def test_view_windows(self):
+        data, want = _payload(3)
+        old = hwp_detect._VIEW_WINDOW
+        hwp_detect._VIEW_WINDOW = 1000
+        try:
+            scan = hwp_detect.HwpScan()
+            scan.feed_view(data, 0, len(data))
+        finally:
+            hwp_detect._VIEW_WINDOW = old
+        self.assertEqual(_offsets(scan), want)
+
+    def test_want_limits_rules(self):
+        data, want = _payload()
+        scan = hwp_detect.scan_container(data, want=("RAW_IP",))
+        self.assertEqual(_offsets(scan), {"RAW_IP": want["RAW_IP"]})
+
+    def test_first_hit_stops(self):
+        data, _want = _payload()
+        self.assertIsNotNone(hwp_detect.scan_container(data, first_hit=True).hit_key())
+        self.assertFalse(hwp_detect.verdict_hwp(b"\0" * 5000)["malicious"])
+
+
+class DoubleExtNameTest(unittest.TestCase):
+    def test_utf8_names_on_bytes(self):
+        for name, expect in ((_NAME, _NAME), ("é.hwp.exe", "é.hwp.exe"), ("x…보고.pdf.exe", "보고.pdf.exe")):
+            with self.subTest(name=name):
+                head = b"\x01\xff\xfe "
+                data = head + name.encode("utf-8") + b" tail"
+                det = hwp_detect.hwp_double_ext(data)
+                self.assertIsNotNone(det)
+                self.assertEqual(det["keyword"], expect)
+                start = len(head) + name.encode("utf-8").index(expect.encode("utf-8"))
+                self.assertEqual((det["hits"][0]["offset"], det["hits"][0]["length"]),
+                                 (start, len(expect.encode("utf-8"))))
+
+    def test_utf8_name_in_bindata_stream(self):
+        blob = random.Random(4).randbytes(5000).replace(b"exe", b"xxx") + b" " + _NAME.encode("utf-8")
+        data = corpus.write_cfb({"FileHeader": corpus._file_header(False), "BinData/BIN0001.OLE": blob})
+        det = hwp_detect.hwp_double_ext(data)
+        self.assertEqual(det["keyword"], _NAME)
+        self.assertEqual(det["hits"][0]["stream"], "BinData/BIN0001.OLE")
+        self.assertEqual(det["hits"][0]["offset"], 5001)
+
+    def test_utf16_name_in_body(self):
+        body = f"첨부 {_NAME} 참고".encode("utf-16-le")
+        data = corpus.write_cfb({"FileHeader": corpus._file_header(False), "BodyText/Section0": body})
+        det = hwp_detect.hwp_double_ext(data)
+        self.assertEqual(det["keyword"], _NAME)
+        self.assertEqual(det["hits"][0]["offset"], 6)
+
+    def test_no_name(self):
+        self.assertIsNone(hwp_detect.hwp_double_ext(b"\xe2\x80\xa6.pdf.exe and .hwp.exe"))
+
+
+_PE = corpus.make_pe(random.Random(9))
+
+
+def _patched_pe(at: int, fmt: str, *values) -> bytes:
+    img = bytearray(_PE)
+    struct.pack_into(fmt, img, at, *values)
+    return bytes(img)
+
+
+class PeValidationTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(hwp_detect._parse_pe(_PE, 0, len(_PE)), ("i386", 2, 0x4000, 0x1C00))
+        pe64 = _patched_pe(0x80 + 4, "<H", 0x8664)
+        pe64 = bytes(bytearray(pe64[:0x98]) + struct.pack("<H", 0x20B) + pe64[0x9A:])
+        self.assertEqual(hwp_detect._parse_pe(pe64, 0, len(pe64))[0], "x64")
+
+    def test_fake_mz_rejected(self):
+        fakes = {
+            "text": b"MZ" + b"\0" * 0x3A + b"This is not a PE file" * 50,
+            "lfanew_small": _patched_pe(0x3C, "<I", 0x20),
+            "lfanew_large": _patched_pe(0x3C, "<I", hwp_detect._PE_MAX_LFANEW + 1),
+            "lfanew_wrong": _patched_pe(0x3C, "<I", 0x84),    # PE 서명이 근처에 있어도 정확한 위치가 아니면 거부
+            "machine": _patched_pe(0x84, "<H", 0x1234),
+            "no_sections": _patched_pe(0x86, "<H", 0),
+            "opt_magic": _patched_pe(0x98, "<H", 0x999),
+            "short": _PE[:0x90],
+        }
+        for label, data in fakes.items():
+            with self.subTest(fake=label):
+                self.assertIsNone(hwp_detect._parse_pe(data, 0, len(data)))
+                self.assertIsNone(hwp_detect.hwp_pe_mz(b"\0" * 100 + data + b"\0" * 100))
+
+    def test_truncated_section_table(self):
+        # 섹션 표가 버퍼 밖이면 검증은 통과하지만 크기는 모른다 → 'MZ' 2바이트만 보고
+        end = 0x80 + 24 + 0xE0 + 40
+        self.assertEqual(hwp_detect._parse_pe(_PE, 0, end), ("i386", 2, 0x4000, None))
+        det = hwp_detect.hwp_pe_mz(b"\0" * 10 + _PE[:end])
+        self.assertEqual((det["hits"][0]["offset"], det["hits"][0]["length"]), (10, 2))
+
+    def test_every_image_reported(self):
+        data = b"MZ junk " * 50 + _PE + b"\0" * 300 + _PE
+        det = hwp_detect.hwp_pe_mz(data)
+        self.assertEqual([(h["offset"], h["length"]) for h in det["hits"]],
+                         [(400, len(_PE)), (400 + len(_PE) + 300, len(_PE))])
+        self.assertEqual({k: det["hits"][0][k] for k in ("image_size", "machine", "sections")},
+                         {"image_size": 0x4000, "machine": "i386", "sections": 2})
+        self.assertTrue(det["keyword"].startswith("MZ at 400 (hits=2)"))
+
+
+class MmapTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.tmp = Path(self._tmp.name)
+
+    def write(self, name: str, data: bytes) -> Path:
+        p = self.tmp / name
+        p.write_bytes(data)
+        return p
+
+    def test_map_source_kinds(self):
+        data = b"abc" * 100
+        path = self.write("a.bin", data)
+        with hwp_detect._map_source(data) as view:
+            self.assertIs(view, data)
+        with hwp_detect._map_source(memoryview(data)) as view:
+            self.assertIs(view, data)
+        with hwp_detect._map_source(str(path)) as view:
+            self.assertIsInstance(view, mmap.mmap)
+            self.assertEqual(view[:], data)
+        with open(path, "rb") as f, hwp_detect._map_source(f) as view:
+            self.assertIsInstance(view, mmap.mmap)
+        with hwp_detect._map_source(io.BytesIO(data)) as view:
+            self.assertIsNone(view)   # fileno 없음 → chunk 읽기
+        with hwp_detect._map_source(str(self.write("empty.bin", b""))) as view:
+            self.assertEqual(view, b"")
+
+    def test_same_result_as_chunked_reads(self):
+        data, want = _payload(4)
+        hwp = corpus.make_hwp(bindata_mb=0.5, text_kb=8, payloads=("PE_MZ", "EPS_PS", "RAW_IP", "DOUBLE_EXT"),
+                              seed=4)
+        for name, blob in (("raw.bin", data), ("doc.hwp", hwp)):
+            path = str(self.write(name, blob))
+            with self.subTest(name=name):
+                mapped = hwp_detect.scan_hwp(path)
+                with mock.patch.object(hwp_detect, "USE_MMAP", False):
+                    self.assertEqual(hwp_detect.scan_hwp(path), mapped)
+                self.assertEqual(hwp_detect.scan_hwp(blob), mapped)
+        self.assertEqual(_offsets(hwp_detect.scan_container(str(self.tmp / "raw.bin"))), want)
+
+    def test_contiguous_bindata_scanned_in_place(self):
+        blob = b"\0" * 70000 + corpus.make_pe(random.Random(5))
+        path = str(self.write("a.hwp", corpus.write_cfb({"FileHeader": corpus._file_header(False),
+                                                         "BinData/BIN0001.OLE": blob})))
+        views = []
+        real = hwp_detect.HwpScan.feed_view
+
+        def spy(scan, buf, start, length, stream=None):
+            views.append((type(buf), length, stream))
+            return real(scan, buf, start, length, stream)
+
+        with mock.patch.object(hwp_detect.HwpScan, "feed_view", spy):
+            det = hwp_detect.hwp_pe_mz(path)
+        self.assertEqual((det["stream"], det["offset"]), ("BinData/BIN0001.OLE", 70000))
+        self.assertIn((mmap.mmap, len(blob), "BinData/BIN0001.OLE"), views)
+
+    def test_large_file_not_loaded(self):
+        # 64MB 희소 파일 끝의 적중: 매핑 위에서 찾으므로 파이썬 힙에 파일 크기만큼 올라오지 않는다
+        path = self.tmp / "big.bin"
+        tail = b" see http://10.9.8.7/x "
+        with open(path, "wb") as f:
+            f.truncate(64 << 20)
+            f.seek((64 << 20) - len(tail))
+            f.write(tail)
+        old = hwp_detect._VIEW_WINDOW
+        hwp_detect._VIEW_WINDOW = 1 << 20
+        tracemalloc.start()
+        try:
+            det = hwp_detect.hwp_raw_ip(str(path))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            hwp_detect._VIEW_WINDOW = old
+        self.assertEqual(det["hits"][0]["offset"], (64 << 20) - len(tail) + 5)
+        self.assertLess(peak, 8 << 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+test_metrics.py
+- 스캔별 계측(with_metrics): 규칙별 시간/바이트/파트 수와 공유 단계(hwp sweep, docx open)
+- 누적 레지스트리: 인프로세스 / 프로세스 풀 워커 수치 합치기, 캐시 적중/실패
+- Prometheus 텍스트 형식과 textfile 내보내기
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import file_scanner  # noqa: E402
+import hwp_detect  # noqa: E402
+import metrics  # noqa: E402
+import scan_cache  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+HWP = corpus.make_hwp(bindata_mb=0.1, text_kb=4, payloads=("RAW_IP",), seed=2)
+DOCX = corpus.make_docx(document_kb=8, n_headers=1, cmd=True, seed=2)
+
+
+class MetricsBase(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+        patcher = mock.patch.object(metrics, "REGISTRY", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ScanStatsTest(MetricsBase):
+    def test_hwp_rules(self):
+        m = file_scanner.scan_file(HWP, "a.hwp", use_cache=False, with_metrics=True)["metrics"]
+        self.assertEqual(m["format"], "hwp")
+        self.assertEqual(list(m["rules"]), ["sweep", "PE_MZ", "EPS_PS", "DOUBLE_EXT", "RAW_IP"])
+        # 바이트를 훑는 건 공유 sweep 한 번뿐
+        self.assertEqual(m["rules"]["sweep"]["bytes"], hwp_detect.scan_container(HWP).bytes_scanned)
+        self.assertEqual(m["bytes"], m["rules"]["sweep"]["bytes"])
+        self.assertEqual([r["hit"] for r in m["rules"].values()], [None, False, False, False, True])
+        self.assertIsNone(m["cache_hit"])
+
+    def test_docx_parts_charged_to_first_rule(self):
+        m = file_scanner.scan_file(DOCX, "a.docx", use_cache=False, with_metrics=True)["metrics"]
+        self.assertEqual(list(m["rules"]), ["open", "VBA", "TEMPLATE", "DDE", "CMD"])
+        rules = m["rules"]
+        self.assertEqual((rules["VBA"]["parts"], rules["CMD"]["parts"]), (0, 0))
+        self.assertGreater(rules["DDE"]["parts"], 1)    # 본문 + 머리글 파트는 DDE 가 먼저 파싱
+        self.assertEqual(m["parts"], sum(r["parts"] for r in rules.values()))
+        self.assertTrue(rules["CMD"]["hit"])
+
+    def test_not_in_result_by_default(self):
+        with mock.patch.object(metrics, "IN_RESULT_DEFAULT", False):
+            self.assertNotIn("metrics", file_scanner.scan_file(DOCX, "a.docx", use_cache=False))
+
+
+class RegistryTest(MetricsBase):
+    def test_accumulates(self):
+        for _ in range(2):
+            file_scanner.scan_file(HWP, "a.hwp", use_cache=False)
+        snap = self.registry.snapshot()
+        self.assertEqual(snap["scans"][0]["format"], "hwp")
+        self.assertEqual(snap["scans"][0]["scans"], 2)
+        ip = next(r for r in snap["rules"] if r["rule"] == "RAW_IP")
+        self.assertEqual((ip["calls"], ip["hits"], ip["misses"]), (2, 2, 0))
+        sweep = next(r for r in snap["rules"] if r["rule"] == "sweep")
+        self.assertEqual((sweep["hits"], sweep["misses"]), (0, 0))
+
+    def test_pool_workers_merged(self):
+        files = [("a.hwp", HWP), ("b.docx", DOCX), ("c.hwp", HWP)]
+        with mock.patch.dict(os.environ, {"DETECT_CACHE": "0"}), mock.patch.object(metrics, "IN_RESULT_DEFAULT", False):
+            res = file_scanner.scan_files(files, workers=2, timeout=30)
+        # 워커는 항상 계측값을 실어 보내지만, 요청하지 않았으면 합친 뒤 결과에서 뺀다
+        self.assertEqual([("metrics" in r) for r in res], [False] * 3)
+        scans = {s["format"]: s["scans"] for s in self.registry.snapshot()["scans"]}
+        self.assertEqual(scans, {"hwp": 2, "docx": 1})
+
+    def test_cache_counts(self):
+        cache = scan_cache.ScanCache(4)
+        with mock.patch.object(scan_cache, "_default", cache), mock.patch.dict(os.environ, {"DETECT_CACHE": "1"}):
+            file_scanner.scan_file(DOCX, "a.docx")
+            file_scanner.scan_file(DOCX, "a.docx")
+        self.assertEqual(self.registry.snapshot()["cache"], {"hit": 1, "miss": 1})
+
+
+class ExportTest(MetricsBase):
+    def test_prometheus_text(self):
+        metrics.record_rule("docx", "CMD", 0.5, True, 100, 2)
+        metrics.record_rule("docx", "CMD", 0.25, False, 50, 1)
+        metrics.record_rule("hwp", "sweep", 1.0, None, 4096, 3)
+        text = self.registry.prometheus_text()
+        lines = text.splitlines()
+        self.assertIn("# TYPE detect_rule_calls_total counter", lines)
+        self.assertIn('detect_rule_calls_total{format="docx",rule="CMD"} 2', lines)
+        self.assertIn('detect_rule_results_total{format="docx",rule="CMD",result="hit"} 1', lines)
+        self.assertIn('detect_rule_seconds_total{format="docx",rule="CMD"} 0.75', lines)
+        self.assertIn('detect_rule_bytes_total{format="hwp",rule="sweep"} 4096', lines)
+        # 적중 여부가 없는 공유 단계는 결과 줄이 없다
+        self.assertNotIn('rule="sweep",result=', text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_textfile(self):
+        metrics.record_rule("hwp", "sweep", 1.0, None, 10, 1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "detect.prom")
+            with mock.patch.object(metrics, "_FILE", path):
+                metrics.maybe_write_textfile(force=True)
+            self.assertEqual(Path(path).read_text(encoding="utf-8"), self.registry.prometheus_text())
+            self.assertEqual(os.listdir(tmp), ["detect.prom"])   # 임시 파일이 남지 않는다
+
+    def test_record_outside_scan(self):
+        # 진행 중인 collect() 가 없으면 누적 레지스트리에만
+        metrics.record_rule("docx", "VBA", 0.1, False)
+        self.assertEqual(self.registry.snapshot()["scans"], [])
+        with metrics.collect("docx") as stats:
+            metrics.record_rule("docx", "VBA", 0.1, True, 5, 0)
+        self.assertEqual(stats.as_dict()["bytes"], 5)
+        self.assertEqual(self.registry.snapshot()["scans"][0]["scans"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+test_roundtrip.py
+- 스캔 → 클린업(run_job, AI 없음) → 다시 스캔 왕복 검사
+- 고친 결과는 다시 스캔해도 깨끗해야 하고, 손대지 않은 HWP 스트림 / DOCX 멤버는 바이트 그대로여야 한다
+- 합성 파일은 bench/corpus.py 생성기로 만든다 (같은 seed → 같은 바이트)
+- 실행: python -m pytest -q tests  또는  python -m unittest discover tests
+"""
+
+import io
+import logging
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+import zlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "llm_cleaner", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import ai_cleaner  # noqa: E402
+import cfb_reader  # noqa: E402
+import cfb_writer  # noqa: E402
+import corpus  # noqa: E402
+import file_scanner  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+
+def _scan(path: str) -> list:
+    with open(path, "rb") as f:
+        return file_scanner.scan_file(f.read(), os.path.basename(path), use_cache=False)["detections"]
+
+
+def _streams(path: str) -> dict:
+    """CFB 스트림 경로 → 저장된 바이트 (압축 스트림도 풀지 않은 그대로)"""
+    with open(path, "rb") as f:
+        cfb = cfb_reader.CfbReader(f)
+        return {e.path: b"".join(cfb.iter_stream(e)) for e in cfb.streams()}
+
+
+def _raw_members(path: str) -> dict:
+    """zip 멤버 이름 → (압축 방식, CRC, 압축된 바이트)"""
+    out = {}
+    with zipfile.ZipFile(path) as z, open(path, "rb") as f:
+        for info in z.infolist():
+            f.seek(info.header_offset)
+            head = f.read(30)
+            n, m = int.from_bytes(head[26:28], "little"), int.from_bytes(head[28:30], "little")
+            f.seek(info.header_offset + 30 + n + m)
+            out[info.filename] = (info.compress_type, info.CRC, f.read(info.compress_size))
+    return out
+
+
+def _hwp_text(body: str, compressed: bool, extra: dict = None) -> bytes:
+    pack = corpus._deflate if compressed else (lambda b: b)
+    streams = {
+        "FileHeader": corpus._file_header(compressed),
+        "DocInfo": pack("문서 정보".encode("utf-16-le")),
+        "BodyText/Section0": pack(body.encode("utf-16-le")),
+    }
+    streams.update(extra or {})
+    return corpus.write_cfb(streams)
+
+
+def _docx(members: dict) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buf.getvalue()
+
+
+class RoundTripBase(unittest.TestCase):
+    def setUp(self):
+        self._use_ai = ai_cleaner.USE_AI
+        ai_cleaner.USE_AI = False
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        ai_cleaner.USE_AI = self._use_ai
+        self._tmp.cleanup()
+
+    def write(self, name: str, data: bytes) -> str:
+        p = self.tmp / name
+        p.write_bytes(data)
+        return str(p)
+
+    def roundtrip(self, path: str) -> tuple:
+        """(처음 탐지, run_job 결과, 고친 파일 재탐지)"""
+        dets = _scan(path)
+        res = ai_cleaner.run_job({"in": path, "out": path + ".out", "detections": dets, "no_ai": True})
+        return dets, res, _scan(res["outPath"])
+
+
+# --- OLE(CFB) 라이터 ---
+class CfbWriterTest(unittest.TestCase):
+    def test_streams_read_back(self):
+        # 미니 스트림(4096 미만) / 일반 스트림 / 섹터 경계 / 빈 스트림 / 중첩 스토리지
+        streams = {
+            "FileHeader": corpus._file_header(True),
+            "Empty": b"",
+            "BodyText/Section0": os.urandom(4095),
+            "BodyText/Section1": os.urandom(4096),
+            "BinData/BIN0001.OLE": os.urandom(70000),
+            "Scripts/Deep/JScriptVersion": b"x" * 513,
+        }
+        path = io.BytesIO(corpus.write_cfb(streams))
+        cfb = cfb_reader.CfbReader(path)
+        got = {e.path: b"".join(cfb.iter_stream(e)) for e in cfb.streams()}
+        self.assertEqual(got, streams)
+
+    def test_explicit_storages(self):
+        buf = io.BytesIO()
+        cfb_writer.write_cfb(buf, [cfb_writer.StreamSource("A/B", 3, lambda: [b"abc"])], ["A", "Empty"])
+        cfb = cfb_reader.CfbReader(io.BytesIO(buf.getvalue()))
+        self.assertEqual(cfb.read_stream("A/B"), b"abc")
+        self.assertIn("Empty", [e.path for e in cfb.entries if e.type == cfb_reader.TYPE_STORAGE])
+
+
+# --- HWP ---
+class HwpRoundTripTest(RoundTripBase):
+    def check_hwp(self, data: bytes, name: str, expect: set) -> dict:
+        src = self.write(name, data)
+        dets, res, after = self.roundtrip(src)
+        self.assertEqual({d["rule"] for d in dets}, expect)
+        self.assertEqual(after, [])
+        self.assertEqual(res["patched"], len(res["report"]))
+        before, out = _streams(src), _streams(res["outPath"])
+        self.assertEqual(set(before), set(out))
+        # 적중이 없는 스트림은 (압축 스트림이라도) 저장된 바이트 그대로
+        hit = {h.get("stream") for d in dets for h in d["hits"]}
+        for path in before:
+            if path not in hit:
+                self.assertEqual(before[path], out[path], path)
+        return out
+
+    def test_all_payloads(self):
+        for compressed in (False, True):
+            with self.subTest(compressed=compressed):
+                data = corpus.make_hwp(bindata_mb=0.25, text_kb=16, compressed=compressed,
+                                       payloads=("PE_MZ", "EPS_PS", "RAW_IP", "DOUBLE_EXT"), seed=7)
+                out = self.check_hwp(data, f"all_{compressed}.hwp",
+                                     {"PE_MZ", "EPS_PS", "RAW_IP", "DOUBLE_EXT"})
+                if compressed:
+                    # 고친 본문도 raw deflate 로 다시 압축되어 있어야 한다
+                    zlib.decompressobj(-15).decompress(out["BodyText/Section0"])
+
+    def test_text_after_astral_chars(self):
+        # BMP 밖 문자(서로게이트 쌍) 뒤의 적중도 정확한 바이트 위치에서 고쳐야 한다
+        body = "😀 이모지 " * 300 + "첨부 invoice_2026.pdf.exe 🎉 http://10.1.2.3/a 끝"
+        for compressed in (False, True):
+            with self.subTest(compressed=compressed):
+                self.check_hwp(_hwp_text(body, compressed), f"emoji_{compressed}.hwp", {"DOUBLE_EXT", "RAW_IP"})
+
+    def test_binary_rule_in_text_stream(self):
+        # UTF-16 본문 스트림에 바이트로 박힌 EPS 마커
+        body = ("본문 " * 200).encode("utf-16-le") + b"%!PS-Adobe-3.0 EPSF-3.0\n" + ("끝" * 10).encode("utf-16-le")
+        data = corpus.write_cfb({"FileHeader": corpus._file_header(False), "BodyText/Section0": body,
+                                 "BinData/BIN0001.png": os.urandom(5000)})
+        self.check_hwp(data, "body_eps.hwp", {"EPS_PS"})
+
+    def test_clean_file_untouched(self):
+        src = self.write("clean.hwp", corpus.make_hwp(bindata_mb=0.1, text_kb=8, seed=3))
+        dets, res, after = self.roundtrip(src)
+        self.assertEqual((dets, after, res["patched"]), ([], [], 0))
+
+
+# --- DOCX ---
+_W = corpus._W
+
+
+class DocxRoundTripTest(RoundTripBase):
+    def check_docx(self, data: bytes, name: str, expect: set) -> tuple:
+        src = self.write(name, data)
+        dets, res, after = self.roundtrip(src)
+        self.assertEqual({d["rule"] for d in dets}, expect)
+        self.assertEqual(after, [])
+        with zipfile.ZipFile(res["outPath"]) as z:
+            self.assertIsNone(z.testzip())
+        return _raw_members(src), _raw_members(res["outPath"]), res
+
+    def test_all_payloads(self):
+        data = corpus.make_docx(document_kb=32, n_headers=3, vba=True, dde=True,
+                                template="http://10.0.0.9/t.dotm", cmd=True, seed=5)
+        before, out, res = self.check_docx(data, "all.docx", {"VBA", "TEMPLATE", "DDE", "CMD"})
+        self.assertNotIn("word/vbaProject.bin", out)
+        # 고친 파트 밖의 멤버는 풀지 않고 압축된 바이트 그대로 옮겨졌어야 한다
+        changed = {"word/document.xml", "word/header3.xml", "word/vbaProject.bin",
+                   "word/_rels/settings.xml.rels"}
+        for name, raw in before.items():
+            if name not in changed:
+                self.assertEqual(raw, out[name], name)
+
+    def test_cmd_split_across_runs(self):
+        # 탐지는 텍스트 노드를 공백으로 이어 붙이므로 "cmd" / "/c" 가 다른 run 에 있어도 "cmd /c" 로 잡힌다
+        doc = (f"<w:document {_W}><w:body><w:p><w:r><w:t>run </w:t></w:r><w:r><w:t>cmd</w:t></w:r>"
+               f"<w:r><w:t>/c calc.exe</w:t></w:r></w:p></w:body></w:document>")
+        hdr = f"<w:hdr {_W}><w:p><w:r><w:t>머리글</w:t></w:r></w:p></w:hdr>"
+        data = _docx({"[Content_Types].xml": "<Types/>", "word/document.xml": doc, "word/header1.xml": hdr})
+        before, out, res = self.check_docx(data, "split.docx", {"CMD"})
+        self.assertEqual([r["status"] for r in res["report"]], ["patched"])
+        self.assertEqual(before["word/header1.xml"], out["word/header1.xml"])
+        self.assertEqual(before["[Content_Types].xml"], out["[Content_Types].xml"])
+
+
+if __name__ == "__main__":
+    unittest.main()
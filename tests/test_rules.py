@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+test_rules.py
+- 규칙 레지스트리: 비용 순서(plan), 다시 등록하면 교체(순서 유지), 라벨 ↔ 키
+- 설정(DETECT_DISABLE_RULES / DETECT_MAX_COST / DETECT_RULES_CONFIG)으로 끈 규칙은 스캔/판정에서 빠지고
+  캐시 키(signature)도 달라진다
+"""
+
+import json
+import logging
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import doc_detect  # noqa: E402
+import file_scanner  # noqa: E402
+import hwp_detect  # noqa: E402
+import rules  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+HWP = corpus.make_hwp(bindata_mb=0.1, text_kb=4, payloads=("PE_MZ", "RAW_IP"), seed=1)
+DOCX = corpus.make_docx(document_kb=4, vba=True, template="http://10.0.0.9/t.dotm", cmd=True, seed=1)
+_ENV = ("DETECT_DISABLE_RULES", "DETECT_MAX_COST", "DETECT_RULES_CONFIG")
+
+
+class RulesConfigBase(unittest.TestCase):
+    def setUp(self):
+        env = mock.patch.dict(os.environ, {k: "" for k in _ENV})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(rules.reload_config)
+        rules.reload_config()
+
+    def configure(self, **env):
+        os.environ.update(env)
+        rules.reload_config()
+
+
+class RegistryTest(RulesConfigBase):
+    def test_plan_cheapest_first(self):
+        self.assertEqual([r.key for r in rules.plan("docx")], ["VBA", "TEMPLATE", "DDE", "CMD"])
+        self.assertEqual([r.key for r in rules.plan("hwp")], ["PE_MZ", "EPS_PS", "DOUBLE_EXT", "RAW_IP"])
+        costs = [r.cost for r in rules.plan("docx")]
+        self.assertEqual(costs, sorted(costs))
+
+    def test_register_replaces_in_place(self):
+        old = rules._REGISTRY[("docx", "VBA")]
+        try:
+            new = rules.register("docx", "VBA", old.func, rules.COST_SWEEP, old.needs, old.finder)
+            self.assertEqual(new.seq, old.seq)
+            self.assertEqual([r.key for r in rules.plan("docx")][-1], "VBA")
+        finally:
+            rules._REGISTRY[("docx", "VBA")] = old
+
+    def test_labels(self):
+        for key in rules.ATTACK_LABELS_EN:
+            with self.subTest(key=key):
+                self.assertEqual(rules.key_from_label(rules.label(key)), key)
+        self.assertIsNone(rules.key_from_label("unknown"))
+
+
+class ConfigTest(RulesConfigBase):
+    def test_disable_by_key_or_function_name(self):
+        self.configure(DETECT_DISABLE_RULES="CMD, hwp_raw_ip")
+        self.assertEqual([r.key for r in rules.plan("docx")], ["VBA", "TEMPLATE", "DDE"])
+        self.assertEqual([d["rule"] for d in doc_detect.scan_docx(DOCX)], ["VBA", "TEMPLATE"])
+        self.assertEqual([d["rule"] for d in hwp_detect.scan_hwp(HWP)], ["PE_MZ"])
+        # 꺼진 규칙은 sweep 에서도 확인하지 않는다
+        self.assertEqual(hwp_detect.scan_container(HWP, want=[r.key for r in rules.plan("hwp")]).raw_ip, [])
+        self.assertEqual(len(rules.plan("docx", include_disabled=True)), 4)
+
+    def test_max_cost(self):
+        self.configure(DETECT_MAX_COST=str(rules.COST_PART))
+        self.assertEqual([r.key for r in rules.plan("docx")], ["VBA", "TEMPLATE"])
+        self.assertEqual(hwp_detect.scan_hwp(HWP), [])
+        self.assertEqual(hwp_detect.verdict_hwp(HWP), {"malicious": False, "rule": None})
+
+    def test_config_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "rules.json"
+            path.write_text(json.dumps({"disabled": ["VBA"], "max_cost": rules.COST_TEXT}), encoding="utf-8")
+            self.configure(DETECT_RULES_CONFIG=str(path), DETECT_DISABLE_RULES="TEMPLATE")
+            self.assertEqual([r.key for r in rules.plan("docx")], ["DDE", "CMD"])
+            self.assertEqual(doc_detect.verdict_docx(DOCX)["rule"], "CMD")
+
+    def test_unreadable_config_keeps_all_rules(self):
+        self.configure(DETECT_RULES_CONFIG="/nonexistent/rules.json")
+        self.assertEqual(len(rules.plan("docx")), 4)
+
+    def test_signature_separates_cache(self):
+        full = file_scanner._cache_version("docx")
+        self.configure(DETECT_DISABLE_RULES="CMD")
+        self.assertEqual(rules.signature("docx"), "VBA,TEMPLATE,DDE")
+        self.assertNotEqual(file_scanner._cache_version("docx"), full)
+
+
+if __name__ == "__main__":
+    unittest.main()
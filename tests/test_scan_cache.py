@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+test_scan_cache.py
+- ScanCache: LRU 교체, sqlite 파일 저장/재시작 후 읽기, content_key (바이트/파일 객체 같은 키)
+- scan_file/scan_verdict 캐시: 두 번째 스캔은 적중, 규칙 버전이 바뀌면 새로 스캔, 실패 결과는 저장하지 않음
+"""
+
+import io
+import logging
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import file_scanner  # noqa: E402
+import scan_cache  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+DOCX = corpus.make_docx(document_kb=4, vba=True, seed=4)
+
+
+class ScanCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = scan_cache.ScanCache(max_entries=2)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        self.assertEqual(cache.get("a"), {"v": 1})   # a 가 최근 사용 → b 가 밀려난다
+        cache.put("c", {"v": 3})
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), ({"v": 1}, {"v": 3}))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_sqlite_persists(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "cache.db")
+            scan_cache.ScanCache(4, db).put("k", {"detections": [], "has_detection": False})
+            # 새 프로세스처럼 빈 메모리로 열어도 파일에서 읽는다
+            again = scan_cache.ScanCache(4, db)
+            self.assertEqual(again.get("k"), {"detections": [], "has_detection": False})
+            again.clear()
+            self.assertIsNone(scan_cache.ScanCache(4, db).get("k"))
+
+    def test_memory_off_uses_db_only(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = scan_cache.ScanCache(0, os.path.join(tmp, "c.db"))
+            cache.put("k", {"v": 1})
+            self.assertEqual(len(cache._mem), 0)
+            self.assertEqual(cache.get("k"), {"v": 1})
+
+    def test_content_key(self):
+        f = io.BytesIO(DOCX)
+        f.seek(10)
+        key = scan_cache.content_key(f, "docx", "1")
+        self.assertEqual(f.tell(), 0)
+        self.assertEqual(key, scan_cache.content_key(DOCX, "docx", "1"))
+        self.assertEqual(key, scan_cache.content_key(memoryview(DOCX), "docx", "1"))
+        self.assertNotEqual(key, scan_cache.content_key(DOCX, "docx", "2"))
+        self.assertNotEqual(key, scan_cache.content_key(DOCX, "hwp", "1"))
+
+    def test_disabled_by_env(self):
+        with mock.patch.dict(os.environ, {"DETECT_CACHE": "0"}):
+            self.assertIsNone(scan_cache.default_cache())
+
+
+class ScanFileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = scan_cache.ScanCache(16)
+        patcher = mock.patch.object(scan_cache, "_default", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        env = mock.patch.dict(os.environ, {"DETECT_CACHE": "1"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_second_scan_hits(self):
+        first = file_scanner.scan_file(DOCX, "a.docx", with_metrics=True)
+        second = file_scanner.scan_file(DOCX, "b.docx", with_metrics=True)
+        self.assertFalse(first["metrics"]["cache_hit"])
+        self.assertTrue(second["metrics"]["cache_hit"])
+        self.assertEqual(second["filename"], "b.docx")
+        self.assertEqual(second["detections"], first["detections"])
+        # 적중 결과를 고쳐도 캐시 안의 값은 그대로
+        second["detections"][0]["rule"] = "X"
+        self.assertEqual(file_scanner.scan_file(DOCX, "c.docx")["detections"][0]["rule"], "VBA")
+
+    def test_use_cache_false_bypasses(self):
+        file_scanner.scan_file(DOCX, "a.docx")
+        self.assertFalse(file_scanner.scan_file(DOCX, "a.docx", use_cache=False, with_metrics=True)
+                         ["metrics"]["cache_hit"])
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_version_change_misses(self):
+        file_scanner.scan_file(DOCX, "a.docx")
+        with mock.patch.dict(file_scanner.RULESET_VERSIONS, {"docx": "0.0.0"}):
+            self.assertFalse(file_scanner.scan_file(DOCX, "a.docx", with_metrics=True)["metrics"]["cache_hit"])
+        self.assertEqual(len(self.cache._mem), 2)
+
+    def test_verdict_cached_separately(self):
+        file_scanner.scan_file(DOCX, "a.docx")
+        res = file_scanner.scan_verdict(DOCX, "a.docx", with_metrics=True)
+        self.assertFalse(res["metrics"]["cache_hit"])
+        self.assertEqual((res["malicious"], res["rule"]), (True, "VBA"))
+        self.assertTrue(file_scanner.scan_verdict(DOCX, "a.docx", with_metrics=True)["metrics"]["cache_hit"])
+
+    def test_failures_not_cached(self):
+        def boom(_src):
+            raise RuntimeError("boom")
+
+        with mock.patch.dict(file_scanner.DETECTORS, {"docx": boom}):
+            self.assertEqual(file_scanner.scan_file(DOCX, "a.docx")["error"], "boom")
+        with mock.patch.dict(file_scanner.VERDICTS, {"docx": boom}):
+            self.assertEqual(file_scanner.scan_verdict(DOCX, "a.docx")["error"], "boom")
+        self.assertEqual(len(self.cache._mem), 0)
+        self.assertTrue(file_scanner.scan_file(DOCX, "a.docx")["has_detection"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+test_scan_tree.py
+- 디렉터리 스캔(scan_tree / --tree): 처음엔 "new", 다시 돌리면 파일을 열지 않음, touch 만 한 파일은 해시만 보고 "unchanged",
+  내용이 바뀌면 "changed", 문서가 아닌 파일은 건너뜀, 확장자가 틀려도 매직 바이트로 판별
+- 읽기 실패는 "error" 로 내고 색인에서 지워 다음에 다시 스캔, 색인 모드가 다르면 ValueError
+- walk_tree: 파일 root, 없는 root, 심볼릭 링크 순환
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import file_scanner  # noqa: E402
+import scan_index  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+HWP = corpus.make_hwp(bindata_mb=0.1, text_kb=4, payloads=("PE_MZ",), seed=5)
+DOCX = corpus.make_docx(document_kb=4, cmd=True, seed=5)
+CLEAN_DOCX = corpus.make_docx(document_kb=4, seed=6)
+
+
+class TreeBase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.root = Path(self._tmp.name) / "docs"
+        (self.root / "sub").mkdir(parents=True)
+        (self.root / "a.hwp").write_bytes(HWP)
+        (self.root / "sub" / "b.docx").write_bytes(DOCX)
+        (self.root / "sub" / "report.bin").write_bytes(DOCX)   # 확장자가 틀린 docx
+        (self.root / "note.txt").write_bytes(b"plain text")
+        self.index = scan_index.ScanIndex(str(Path(self._tmp.name) / "index.db"))
+        self.addCleanup(self.index.close)
+        env = mock.patch.dict(os.environ, {"DETECT_CACHE": "0"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def run_tree(self, **kwargs):
+        """ 순차 실행(timeout=0) → 워커 호출 수를 셀 수 있다 """
+        stats = {}
+        with mock.patch.object(file_scanner, "_tree_worker", wraps=file_scanner._tree_worker) as worker:
+            recs = list(file_scanner.scan_tree([self.root], self.index, workers=1, timeout=0, stats=stats,
+                                               **kwargs))
+        return {os.path.relpath(r["path"], self.root): r for r in recs}, stats, worker.call_count
+
+
+class IncrementalTest(TreeBase):
+    def test_first_and_second_run(self):
+        recs, stats, calls = self.run_tree()
+        self.assertEqual({p: r["status"] for p, r in recs.items()},
+                         {"a.hwp": "new", "sub/b.docx": "new", "sub/report.bin": "new"})
+        self.assertEqual(stats, {"seen": 4, "scanned": 3, "unchanged": 0, "skipped": 1, "errors": 0})
+        self.assertEqual(calls, 4)
+        self.assertEqual([d["rule"] for d in recs["a.hwp"]["detections"]], ["PE_MZ"])
+        self.assertEqual(recs["sub/report.bin"]["detections"], recs["sub/b.docx"]["detections"])
+        expected = file_scanner.scan_file(DOCX, "b.docx", use_cache=False)
+        self.assertEqual(recs["sub/b.docx"]["detections"], expected["detections"])
+        self.assertIsNone(self.index.get(str(self.root / "note.txt")).kind)
+
+        # 두 번째 실행: 크기/mtime 이 그대로면 워커로 보내지 않는다
+        again, stats, calls = self.run_tree()
+        self.assertEqual((again, calls), ({}, 0))
+        self.assertEqual(stats, {"seen": 4, "scanned": 0, "unchanged": 3, "skipped": 1, "errors": 0})
+
+        # --all: 색인 결과를 "unchanged" 로
+        again, _, calls = self.run_tree(include_unchanged=True)
+        self.assertEqual(calls, 0)
+        self.assertEqual({p: r["status"] for p, r in again.items()}, dict.fromkeys(recs, "unchanged"))
+        self.assertEqual(again["a.hwp"]["detections"], recs["a.hwp"]["detections"])
+
+    def test_touched_and_changed(self):
+        self.run_tree()
+        path = self.root / "a.hwp"
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        recs, stats, calls = self.run_tree()
+        # 내용이 같으면 해시만 구하고 스캔하지 않는다
+        self.assertEqual((recs, calls, stats["unchanged"], stats["scanned"]), ({}, 1, 3, 0))
+        self.assertEqual(self.index.get(str(path)).mtime_ns, st.st_mtime_ns + 10**9)
+
+        (self.root / "sub" / "b.docx").write_bytes(CLEAN_DOCX)
+        recs, stats, _ = self.run_tree()
+        self.assertEqual(list(recs), ["sub/b.docx"])
+        self.assertEqual((recs["sub/b.docx"]["status"], recs["sub/b.docx"]["has_detection"]), ("changed", False))
+        self.assertEqual(stats["scanned"], 1)
+
+    def test_error_forgotten(self):
+        real = file_scanner._tree_worker
+
+        def flaky(name, job, *args):
+            if name == "a.hwp":
+                raise OSError("read failed")
+            return real(name, job, *args)
+
+        with mock.patch.object(file_scanner, "_tree_worker", flaky):
+            recs = {os.path.basename(r["path"]): r
+                    for r in file_scanner.scan_tree([self.root], self.index, workers=1, timeout=0)}
+        self.assertEqual(recs["a.hwp"]["status"], "error")
+        self.assertIn("read failed", recs["a.hwp"]["error"])
+        self.assertIsNone(self.index.get(str(self.root / "a.hwp")))
+        recs, stats, calls = self.run_tree()
+        self.assertEqual((list(recs), recs["a.hwp"]["status"], calls), (["a.hwp"], "new", 1))
+
+    def test_index_mode_mismatch(self):
+        with self.assertRaises(ValueError):
+            next(file_scanner.scan_tree([self.root], self.index, workers=1, verdict=True))
+
+    def test_cli(self):
+        cmd = [sys.executable, str(ROOT / "detect_core" / "file_scanner.py"), "--tree", str(self.root),
+               "--index", str(Path(self._tmp.name) / "cli.db"), "--workers", "1"]
+        env = {**os.environ, "DETECT_CACHE": "0", "DETECT_LOG": "0"}
+        for expected in ({"seen": 4, "scanned": 3, "unchanged": 0, "skipped": 1, "errors": 0},
+                         {"seen": 4, "scanned": 0, "unchanged": 3, "skipped": 1, "errors": 0}):
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120, env=env)
+            self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+            lines = [json.loads(line) for line in proc.stdout.decode("utf-8").splitlines()]
+            self.assertEqual(lines[-1], {"summary": expected})
+            self.assertEqual(len(lines) - 1, expected["scanned"])
+
+
+class WalkTreeTest(TreeBase):
+    def test_roots(self):
+        got = sorted(p for p, _st in file_scanner.walk_tree([self.root / "a.hwp", self.root / "missing", self.root]))
+        self.assertEqual(got, sorted([str(self.root / "a.hwp")] * 2 + [
+            str(self.root / "note.txt"), str(self.root / "sub" / "b.docx"), str(self.root / "sub" / "report.bin")]))
+
+    def test_symlink_loop(self):
+        os.symlink(self.root, self.root / "sub" / "loop")
+        plain = [p for p, _st in file_scanner.walk_tree([self.root])]
+        self.assertEqual(len(plain), 4)   # 기본은 링크를 따라가지 않는다
+        followed = [p for p, _st in file_scanner.walk_tree([self.root], follow_symlinks=True)]
+        self.assertEqual(len(followed), 4)   # 같은 디렉터리는 한 번만
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+test_serve.py
+- 상주 모드(serve): 줄 단위 JSON 요청/응답 — ping, bytes_b64 / path 요청, verdict, 누적 계측,
+  깨진 줄·빠진 필드는 그 요청만 error 로 답하고 계속 처리, workers>1 이면 id 로 매칭
+- 프레임 전송(read_frame / write_frame, --serve --frames / --stdin-frames): 왕복, 깨진/잘린 프레임은 FrameError,
+  프레임 모드 serve 는 id 없으면 순번, 깨진 프레임 뒤로는 읽지 않는다
+"""
+
+import base64
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import file_scanner  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+HWP = corpus.make_hwp(bindata_mb=0.1, text_kb=4, payloads=("PE_MZ",), seed=3)
+DOCX = corpus.make_docx(document_kb=4, cmd=True, seed=3)
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _serve(lines: list, workers: int = 1, **kwargs) -> list:
+    """ 요청(dict 또는 원문 줄) 목록 → 응답 dict 목록 (출력 순서 그대로) """
+    stdin = io.StringIO("".join((s if isinstance(s, str) else json.dumps(s)) + "\n" for s in lines))
+    stdout = io.StringIO()
+    file_scanner.serve(stdin=stdin, stdout=stdout, workers=workers, **kwargs)
+    return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+
+class ServeLinesTest(unittest.TestCase):
+    def test_ping(self):
+        self.assertEqual(_serve([{"id": 1, "op": "ping"}]), [{"id": 1, "pong": True}])
+
+    def test_scan_bytes_and_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "p.hwp"
+            path.write_bytes(HWP)
+            out = _serve([{"id": "a", "name": "a.docx", "bytes_b64": _b64(DOCX)},
+                          {"id": "b", "path": str(path)}])
+        self.assertEqual([o["id"] for o in out], ["a", "b"])
+        self.assertEqual(out[0]["result"], file_scanner.scan_file(DOCX, "a.docx", use_cache=False))
+        self.assertEqual(out[1]["result"]["filename"], "p.hwp")   # name 이 없으면 경로의 파일 이름
+        self.assertEqual([d["rule"] for d in out[1]["result"]["detections"]], ["PE_MZ"])
+
+    def test_verdict(self):
+        out = _serve([{"id": 1, "name": "a.hwp", "bytes_b64": _b64(HWP), "verdict": True},
+                      {"id": 2, "name": "b.hwp", "bytes_b64": _b64(HWP)}], verdict=True)
+        for o in out:
+            self.assertEqual((o["result"]["malicious"], o["result"]["rule"]), (True, "PE_MZ"))
+
+    def test_bad_requests_do_not_stop_the_loop(self):
+        out = _serve(["{not json", {"id": 2, "bytes_b64": _b64(DOCX)}, {"id": 3, "name": "x.docx"},
+                      "", {"id": 4, "op": "ping"}])
+        self.assertEqual([o["id"] for o in out], [None, 2, 3, 4])
+        self.assertIn("error", out[0])
+        self.assertEqual(out[1]["error"], "missing name")
+        self.assertEqual(out[2]["error"], "missing path or bytes_b64")
+        self.assertTrue(out[3]["pong"])
+
+    def test_unsupported_and_missing_file(self):
+        out = _serve([{"id": 1, "name": "a.txt", "bytes_b64": _b64(b"x")},
+                      {"id": 2, "path": "/nonexistent/dir/a.hwp"}])
+        self.assertEqual(out[0]["result"]["error"], "unsupported_extension")
+        self.assertFalse(out[1]["result"]["has_detection"])
+        self.assertTrue(out[1]["result"]["error"])
+
+    def test_metrics_op(self):
+        out = _serve([{"id": 1, "name": "a.docx", "bytes_b64": _b64(DOCX), "metrics": True},
+                      {"id": 2, "op": "metrics"}])
+        self.assertIn("metrics", out[0]["result"])
+        self.assertEqual(set(out[1]), {"id", "metrics", "prometheus"})
+        self.assertIsInstance(out[1]["prometheus"], str)
+
+    def test_pool_replies_match_ids(self):
+        reqs = [{"id": i, "name": f"f{i}.{'hwp' if i % 2 else 'docx'}",
+                 "bytes_b64": _b64(HWP if i % 2 else DOCX)} for i in range(6)]
+        out = _serve(reqs, workers=2, max_inflight=2)
+        by_id = {o["id"]: o["result"] for o in out}
+        self.assertEqual(sorted(by_id), list(range(6)))
+        for i, res in by_id.items():
+            self.assertEqual(res["filename"], reqs[i]["name"])
+            self.assertTrue(res["has_detection"])
+
+
+def _frames(*frames) -> io.BytesIO:
+    buf = io.BytesIO()
+    for header, payload in frames:
+        file_scanner.write_frame(buf, header, payload)
+    buf.seek(0)
+    return buf
+
+
+def _read_all(buf: io.BytesIO) -> list:
+    buf.seek(0)
+    out = []
+    while True:
+        frame = file_scanner.read_frame(buf)
+        if frame is None:
+            return out
+        out.append(frame)
+
+
+class _Trickle(io.BytesIO):
+    """ 파이프처럼 한 번에 몇 바이트씩만 돌려주는 스트림 """
+    def read(self, n=-1):
+        return super().read(min(n, 3) if n and n > 0 else n)
+
+
+class FrameTest(unittest.TestCase):
+    def test_round_trip(self):
+        frames = [({"id": 1, "name": "가.hwp"}, HWP), ({"op": "ping"}, b""), ({"name": "b"}, b"\0" * 10)]
+        buf = _frames(*frames)
+        self.assertEqual(_read_all(buf), [({"id": 1, "name": "가.hwp", "size": len(HWP)}, HWP),
+                                          ({"op": "ping"}, None), ({"name": "b", "size": 10}, b"\0" * 10)])
+        # 조금씩 도착해도 같은 프레임
+        self.assertEqual(_read_all(_Trickle(buf.getvalue())), _read_all(buf))
+
+    def test_broken_frames(self):
+        good = _frames(({"name": "a"}, b"abc")).getvalue()
+        cases = {
+            "short_length": good[:2],
+            "short_header": good[:10],
+            "short_body": good[:-1],
+            "too_large": (file_scanner.FRAME_HEADER_MAX + 1).to_bytes(4, "big"),
+            "not_json": (3).to_bytes(4, "big") + b"{x}",
+            "not_object": (2).to_bytes(4, "big") + b"[]",
+            "bad_size": (13).to_bytes(4, "big") + b'{"size": -1}',
+        }
+        for label, data in cases.items():
+            with self.subTest(case=label):
+                with self.assertRaises(file_scanner.FrameError):
+                    file_scanner.read_frame(io.BytesIO(data))
+        self.assertIsNone(file_scanner.read_frame(io.BytesIO(b"")))
+
+    def test_serve_frames(self):
+        stdin = _frames(({"name": "a.hwp"}, HWP), ({"id": "x", "name": "b.docx", "verdict": True}, DOCX),
+                        ({"op": "ping"}, b""), ({"size": 3}, b"abc"))
+        stdout = io.BytesIO()
+        file_scanner.serve(stdin=stdin, stdout=stdout, workers=1, frames=True)
+        out = [h for h, _body in _read_all(stdout)]
+        self.assertEqual([o["id"] for o in out], [1, "x", 3, 4])   # id 가 없으면 순번
+        self.assertEqual(out[0]["result"], file_scanner.scan_file(HWP, "a.hwp", use_cache=False))
+        self.assertEqual(out[1]["result"]["rule"], "CMD")
+        self.assertTrue(out[2]["pong"])
+        self.assertEqual(out[3]["error"], "missing name")
+
+    def test_serve_stops_at_broken_frame(self):
+        data = _frames(({"name": "a.hwp"}, HWP)).getvalue() + b"\xff\xff\xff\xff" + _frames(({"op": "ping"}, b"")).getvalue()
+        stdout = io.BytesIO()
+        file_scanner.serve(stdin=io.BytesIO(data), stdout=stdout, workers=2, frames=True)
+        out = [h for h, _body in _read_all(stdout)]
+        self.assertEqual(len(out), 2)
+        self.assertTrue(next(o for o in out if "result" in o)["result"]["has_detection"])
+        self.assertIn("frame header too large", next(o for o in out if "error" in o)["error"])
+
+    def test_stdin_frames_cli(self):
+        stdin = _frames(({"name": "a.hwp"}, HWP), ({"name": "b.docx"}, DOCX)).getvalue()
+        proc = subprocess.run([sys.executable, str(ROOT / "detect_core" / "file_scanner.py"), "--stdin-frames",
+                               "--workers", "1"], input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              timeout=120, env={**os.environ, "DETECT_CACHE": "0", "DETECT_LOG": "0"})
+        self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+        out = [h for h, _body in _read_all(io.BytesIO(proc.stdout))]
+        self.assertEqual([(o["id"], o["result"]["has_detection"]) for o in out], [(1, True), (2, True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
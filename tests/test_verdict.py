@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+test_verdict.py
+- 판정 전용 모드(verdict_hwp / verdict_docx / scan_verdict): 전체 스캔과 같은 악성/정상 판정
+- 첫 적중에서 멈추는지 (HWP 는 작은 스트림부터, DOCX 는 싼 규칙부터)
+- 스캔 실패는 정상으로 판정하지 않고 error 로, 캐시에도 남기지 않는다
+"""
+
+import io
+import logging
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("detect_core", "bench"):
+    sys.path.insert(0, str(ROOT / sub))
+
+import corpus  # noqa: E402
+import doc_detect  # noqa: E402
+import file_scanner  # noqa: E402
+import hwp_detect  # noqa: E402
+import scan_cache  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+
+class _Unreadable(io.BytesIO):
+    """ 읽다가 I/O 오류가 나는 입력 (끊긴 네트워크 드라이브 등) """
+    def read(self, *args):
+        raise OSError("read failed")
+
+
+class VerdictTest(unittest.TestCase):
+    def test_same_verdict_as_full_scan(self):
+        files = [("clean.hwp", corpus.make_hwp(bindata_mb=0.1, text_kb=4, seed=1)),
+                 ("clean.docx", corpus.make_docx(document_kb=4, seed=1))]
+        for i, key in enumerate(("PE_MZ", "EPS_PS", "RAW_IP", "DOUBLE_EXT")):
+            files.append((f"{key}.hwp", corpus.make_hwp(bindata_mb=0.1, text_kb=4, payloads=(key,), seed=i)))
+        for i, opt in enumerate(("vba", "dde", "cmd")):
+            files.append((f"{opt}.docx", corpus.make_docx(document_kb=4, seed=i, **{opt: True})))
+        files.append(("tpl.docx", corpus.make_docx(document_kb=4, template="http://10.0.0.9/t.dotm", seed=9)))
+        for name, data in files:
+            with self.subTest(name=name):
+                full = file_scanner.scan_file(data, name, use_cache=False)
+                verdict = file_scanner.scan_verdict(data, name, use_cache=False)
+                self.assertEqual(verdict["malicious"], full["has_detection"])
+                self.assertNotIn("error", verdict)
+                if full["has_detection"]:
+                    self.assertIn(verdict["rule"], [d["rule"] for d in full["detections"]])
+                    self.assertTrue(verdict["keyword"])
+                else:
+                    self.assertIsNone(verdict["rule"])
+
+    def test_hwp_stops_at_first_hit(self):
+        data = corpus.make_hwp(bindata_mb=1, text_kb=4, payloads=("RAW_IP",), seed=1)
+        early = hwp_detect.scan_container(data, first_hit=True, want=["RAW_IP"])
+        self.assertEqual(early.hit_key(), "RAW_IP")
+        self.assertLess(early.bytes_scanned, hwp_detect.scan_container(data).bytes_scanned // 10)
+
+    def test_docx_cheap_rule_first(self):
+        # VBA(중앙 디렉터리 조회만)가 맞으면 본문 파트는 하나도 파싱하지 않는다
+        data = corpus.make_docx(document_kb=256, vba=True, cmd=True, dde=True, seed=3)
+        counted = []
+        with mock.patch.object(doc_detect.DocxContext, "_count", lambda ctx, name: counted.append(name)):
+            verdict = doc_detect.verdict_docx(data)
+        self.assertEqual((verdict["rule"], counted), ("VBA", []))
+
+    def test_unreadable_docx_is_error(self):
+        data = corpus.make_docx(document_kb=4, cmd=True, seed=1)
+        with self.assertRaises(Exception):
+            doc_detect.verdict_docx(data[:len(data) // 2])
+        res = file_scanner.scan_verdict(data[:len(data) // 2], "a.docx", use_cache=False)
+        self.assertEqual((res["malicious"], res["rule"]), (False, None))
+        self.assertTrue(res["error"])
+
+    def test_rule_failure_is_error(self):
+        data = corpus.make_docx(document_kb=4, seed=1)
+        rule = next(r for r in doc_detect.rules.plan("docx") if r.key == "CMD")
+        broken = rule.__class__(rule.fmt, rule.key, rule.func, rule.cost, rule.needs,
+                                mock.Mock(side_effect=RuntimeError("boom")), rule.seq)
+        with mock.patch.dict(doc_detect.rules._REGISTRY, {("docx", "CMD"): broken}):
+            res = doc_detect.verdict_docx(data)
+        self.assertEqual(res, {"malicious": False, "rule": None, "error": "CMD: boom"})
+
+    def test_errors_not_cached(self):
+        cache = scan_cache.ScanCache(16)
+        hwp = corpus.make_hwp(bindata_mb=0.1, text_kb=4, seed=1)
+        with mock.patch.object(scan_cache, "_default", cache), \
+                mock.patch.dict(os.environ, {"DETECT_CACHE": "1"}):
+            # 해시는 이미 구했다고 치고 (디렉터리 스캔처럼) 디텍터가 읽다가 실패
+            res = file_scanner.scan_verdict(_Unreadable(hwp), "a.hwp", digest=scan_cache.file_digest(hwp))
+            self.assertEqual(res["error"], "read failed")
+            self.assertEqual(len(cache._mem), 0)
+            # 같은 내용을 정상으로 읽으면 다시 스캔해서 저장한다
+            self.assertFalse(file_scanner.scan_verdict(io.BytesIO(hwp), "a.hwp", with_metrics=True)
+                             ["metrics"]["cache_hit"])
+            self.assertEqual(len(cache._mem), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()